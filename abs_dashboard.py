@@ -4,13 +4,7 @@ import select
 import time
 import os
 
-STATE_FILE = "/home/jathin/Desktop/CAN_LAB/global_state.txt"
-def is_paused():
-    try:
-        with open(STATE_FILE) as f:
-            return f.read().strip().lower() == "pause"
-    except FileNotFoundError:
-        return False
+import control_plane
 
 # Set terminal title
 sys.stdout.write("\033]0;ABS Dashboard\007")
@@ -18,6 +12,9 @@ sys.stdout.flush()
 
 bus = can.interface.Bus(channel="vcan0", bustype="socketcan")
 
+# Global pause is pushed by master_control.py (no per-loop file reads)
+control = control_plane.subscribe("ABS Dashboard")
+
 def decode_abs(msg):
     if msg.arbitration_id != 0x200 or len(msg.data) < 4:
         return None
@@ -48,7 +45,7 @@ print("ABS dashboard listening... Controls: p=pause, r=resume, q=quit (then Ente
 try:
     while True:
         state = check_commands(state)
-        if state["paused"] or is_paused():
+        if state["paused"] or control.paused:
             time.sleep(0.1)
             continue
 
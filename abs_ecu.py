@@ -1,30 +1,10 @@
 import can
-import time
 import sys
 import random
-import os
-import cantools
-
-# Set terminal title
-sys.stdout.write("\033]0;ABS ECU\007")
-sys.stdout.flush()
-
-bus = can.interface.Bus(channel="vcan0", bustype="socketcan")
-
-STATE_FILE = "/home/jathin/Desktop/CAN_LAB/global_state.txt"
-DB_PATH = "/home/jathin/Desktop/CAN_LAB/vehicle.dbc"
-db = cantools.database.load_file(DB_PATH)
 
 def clamp(v, lo, hi):
     return max(lo, min(v, hi))
 
-def is_paused():
-    try:
-        with open(STATE_FILE) as f:
-            return f.read().strip().lower() == "pause"
-    except FileNotFoundError:
-        return False
-
 def build_abs_frame(fl, fr, rl, rr):
     data = [
         clamp(int(fl), 0, 255),
@@ -39,28 +19,26 @@ def build_abs_frame(fl, fr, rl, rr):
         is_extended_id=False,
     )
 
-print("ABS ECU running, event-driven on EngineData (0x100) via DBC.")
-print("Each EngineData frame → one ABS frame.")
-print("Ctrl+C to stop.\n")
+def abs_task(bus, timeout=1.0, verbose=True):
+    """
+    ABS ECU as a cooperative task: each next() handles at most one frame.
 
-try:
+    With timeout=0 (lab_runtime.py) a call never blocks; the standalone
+    node blocks up to `timeout` seconds waiting for a frame.
+    """
     while True:
-        if is_paused():
-            time.sleep(0.1)
-            continue
-
         # Block until any frame comes
-        msg = bus.recv(1.0)
-        if msg is None:
-            continue
+        msg = bus.recv(timeout)
 
         # Only react to EngineData (0x100)
-        if msg.arbitration_id != 0x100:
+        if msg is None or msg.arbitration_id != 0x100:
+            yield
             continue
 
         # Decode engine speed directly from bytes to avoid any DBC mismatch
         d = msg.data
         if len(d) < 3:
+            yield
             continue
 
         rpm_raw = (d[0] << 8) | d[1]
@@ -81,10 +59,33 @@ try:
         msg_out = build_abs_frame(fl, fr, rl, rr)
         bus.send(msg_out)
 
-        print(
-            f"Engine Speed={veh_speed:5.1f} km/h | "
-            f"FL={fl:5.1f} FR={fr:5.1f} RL={rl:5.1f} RR={rr:5.1f}"
-        )
+        if verbose:
+            print(
+                f"Engine Speed={veh_speed:5.1f} km/h | "
+                f"FL={fl:5.1f} FR={fr:5.1f} RL={rl:5.1f} RR={rr:5.1f}"
+            )
+        yield
+
+def main():
+    # Set terminal title
+    sys.stdout.write("\033]0;ABS ECU\007")
+    sys.stdout.flush()
+
+    bus = can.interface.Bus(channel="vcan0", bustype="socketcan")
+
+    print("ABS ECU running, event-driven on EngineData (0x100) via DBC.")
+    print("Each EngineData frame → one ABS frame.")
+    print("Ctrl+C to stop.\n")
+
+    # No pause handling needed: ABS only reacts to EngineData, so it stops
+    # with the engine and answers every frame the engine sends while stepping.
+    task = abs_task(bus)
+    try:
+        while True:
+            next(task)
+
+    except KeyboardInterrupt:
+        print("\nABS ECU stopped.")
 
-except KeyboardInterrupt:
-    print("\nABS ECU stopped.")
+if __name__ == "__main__":
+    main()
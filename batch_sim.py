@@ -0,0 +1,287 @@
+"""Vectorized N-vehicle batch simulator for calibration sweeps.
+
+This module runs the sim_core engine + TCU model for many vehicles at once:
+- State for all vehicles lives in NumPy arrays and is advanced per step.
+- The engine mode branches and the TCU shift decision become boolean masks.
+- Each vehicle has its own calibration (gear ratios, final drive, A_MAX,
+  DRAG, sport shift factors, ...), built with sim_core.make_calibration().
+- run_sweep() splits very large sweeps across a process pool.
+
+Results are per-vehicle summary metrics (0-100 time, shift count, top speed)
+that can be ranked directly.
+"""
+
+import itertools
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+import sim_core
+from sim_core import (
+    BASE_IDLE_RPM, REDLINE_RPM, ENGINE_DT, TCU_DT, ENGINE_BRAKE_THROTTLE, SHIFT_TIME,
+)
+
+MAX_GEAR = 6
+
+# Calibration keys that are plain per-vehicle scalars
+SCALAR_KEYS = (
+    "A_MAX", "B_MAX", "DRAG", "FINAL_DRIVE", "TIRE_CIRC_M",
+    "ENGINE_BRAKE_DOWNSHIFT_FAC_DRIVE", "DRIVE_HIGH_GEAR_EXTRA_FAC",
+    "ENGINE_BRAKE_DOWNSHIFT_FAC_SPORT", "SPORT_UPSHIFT_FAC",
+    "SPORT_KICKDOWN_THROTTLE", "SPORT_KICKDOWN_FAC",
+)
+
+
+# ============================================
+# CALIBRATION PACKING
+# ============================================
+def calibration_grid(**axes):
+    """
+    Cartesian product of calibration overrides.
+
+    calibration_grid(FINAL_DRIVE=[3.0, 3.2], A_MAX=[3.5, 4.0]) returns four
+    full calibration dicts.
+    """
+    names = list(axes)
+    cals = []
+    for values in itertools.product(*(axes[n] for n in names)):
+        cals.append(sim_core.make_calibration(**dict(zip(names, values))))
+    return cals
+
+
+def pack_calibrations(cals):
+    """Turn a list of calibration dicts into per-vehicle NumPy arrays."""
+    n = len(cals)
+    packed = {k: np.array([c[k] for c in cals], dtype=float) for k in SCALAR_KEYS}
+
+    # Gear-indexed tables; row 0 unused so the gear number is the index.
+    # Missing gears use a ratio of 1.0, like GEAR_RATIOS.get(gear, 1.0).
+    ratios = np.ones((n, MAX_GEAR + 1))
+    up = np.full((n, MAX_GEAR + 1, 3), np.inf)     # no upshift from 6th
+    down = np.full((n, MAX_GEAR + 1, 3), -np.inf)  # no downshift from 1st
+    for i, c in enumerate(cals):
+        for g, r in c["GEAR_RATIOS"].items():
+            ratios[i, g] = r
+        for g, row in c["UPSHIFT"].items():
+            up[i, g] = row
+        for g, row in c["DOWNSHIFT"].items():
+            down[i, g] = row
+    packed["GEAR_RATIOS"] = ratios
+    packed["UPSHIFT"] = up
+    packed["DOWNSHIFT"] = down
+    return packed
+
+
+# ============================================
+# VECTORIZED MODEL
+# ============================================
+def simulate_batch(cals, driver, duration, sport=None):
+    """
+    Simulate len(cals) vehicles in lock-step for `duration` seconds.
+
+    `driver` is a sim_core driver profile shared by all vehicles.  `sport`
+    optionally forces the mode per vehicle (bool array); otherwise the mode
+    comes from the profile.
+
+    Returns a dict of arrays: time_0_100 (NaN if never reached),
+    shift_count, top_speed, final_speed, final_gear.
+    """
+    p = pack_calibrations(cals)
+    n = len(cals)
+    idx = np.arange(n)
+
+    speed_kph = np.zeros(n)
+    rpm = np.full(n, 900.0)
+    cool = np.full(n, 70.0)
+
+    gear = np.ones(n, dtype=np.int64)
+    target_gear = np.ones(n, dtype=np.int64)
+    shifting = np.zeros(n, dtype=bool)
+    shift_timer = np.zeros(n)
+
+    shifts = np.zeros(n, dtype=np.int64)
+    top_speed = np.zeros(n)
+    t_100 = np.full(n, np.nan)
+
+    ticks_per_engine = int(round(ENGINE_DT / TCU_DT))
+    n_engine = int(duration / ENGINE_DT)
+    force_sport = None if sport is None else np.asarray(sport, dtype=bool)
+
+    # Calibration columns used every tick
+    a_max, b_max, drag = p["A_MAX"], p["B_MAX"], p["DRAG"]
+    overall = p["GEAR_RATIOS"] * p["FINAL_DRIVE"][:, None]
+    rps_to_rpm = 60.0 / p["TIRE_CIRC_M"]
+    up_tab, down_tab = p["UPSHIFT"], p["DOWNSHIFT"]
+    up_fac_sport = p["SPORT_UPSHIFT_FAC"]
+    eb_drive = p["ENGINE_BRAKE_DOWNSHIFT_FAC_DRIVE"]
+    eb_drive_high = p["DRIVE_HIGH_GEAR_EXTRA_FAC"]
+    eb_sport = p["ENGINE_BRAKE_DOWNSHIFT_FAC_SPORT"]
+    kick_thr = p["SPORT_KICKDOWN_THROTTLE"]
+    kick_fac = p["SPORT_KICKDOWN_FAC"]
+
+    for k in range(n_engine):
+        t = k * ENGINE_DT
+        throttle, brake, mode = driver(t)
+        if force_sport is None:
+            is_sport = np.full(n, mode == "S")
+        else:
+            is_sport = force_sport
+
+        # -------------------------
+        # ENGINE (one tick, all cars)
+        # -------------------------
+        speed_ms = speed_kph / 3.6
+        accel = (throttle / 100.0) * a_max - (brake / 100.0) * b_max - drag * speed_ms
+        speed_ms = np.maximum(0.0, speed_ms + accel * ENGINE_DT)
+        speed_kph = speed_ms * 3.6
+
+        # The engine only knows the gear from the last GearboxData frame,
+        # which always equals the TCU's current gear.
+        rpm_from_speed = speed_ms * rps_to_rpm * overall[idx, gear]
+
+        off_throttle = throttle <= 2
+        if off_throttle:
+            high = rpm_from_speed
+            blend = np.clip((speed_kph - 3.0) / 7.0, 0.0, 1.0)
+            mid = BASE_IDLE_RPM + (rpm_from_speed - BASE_IDLE_RPM) * blend
+        else:
+            high = np.maximum(rpm_from_speed + sim_core.torque_converter_slip(throttle),
+                              BASE_IDLE_RPM)
+            mid = high
+        target_rpm = np.where(
+            speed_kph > 10.0, high,
+            np.where(speed_kph > 3.0, mid, BASE_IDLE_RPM + throttle * 10.0),
+        )
+
+        rpm = np.clip(rpm + 0.35 * (target_rpm - rpm), 600.0, REDLINE_RPM)
+
+        if throttle > 10:
+            cool = cool + 0.03
+        else:
+            cool = np.where(speed_kph > 10, cool + 0.01, cool - 0.02)
+        cool = np.clip(cool, 60.0, 110.0)
+
+        # What the TCU reads back from EngineData
+        frame_speed = np.clip(np.floor(speed_kph), 0, 255)
+
+        # -------------------------
+        # TCU (ten ticks, all cars)
+        # -------------------------
+        band = sim_core.get_band(throttle)
+        for _ in range(ticks_per_engine):
+            # Cars mid-shift advance their clutch ramp
+            shift_timer = np.where(shifting, shift_timer + TCU_DT, shift_timer)
+            done = shifting & (shift_timer >= SHIFT_TIME)
+            gear = np.where(done, target_gear, gear)
+            shift_timer = np.where(done, 0.0, shift_timer)
+            idle = ~shifting
+            shifting = shifting & ~done
+
+            # Everyone else evaluates the shift tables
+            up_limit = up_tab[idx, gear, band] * np.where(is_sport, up_fac_sport, 1.0)
+            up = idle & (throttle > ENGINE_BRAKE_THROTTLE) & (frame_speed > up_limit)
+
+            base_down = down_tab[idx, gear, band]
+            if throttle <= ENGINE_BRAKE_THROTTLE:
+                drive_fac = eb_drive * np.where(gear >= 5, eb_drive_high, 1.0)
+                limit = base_down * np.where(is_sport, eb_sport, drive_fac)
+            else:
+                kick = is_sport & (throttle >= kick_thr)
+                limit = base_down * np.where(kick, kick_fac, 1.0)
+            down = idle & ~up & (frame_speed < limit)
+
+            start = up | down
+            target_gear = np.where(up, gear + 1, np.where(down, gear - 1, target_gear))
+            shifting = shifting | start
+            shift_timer = np.where(start, 0.0, shift_timer)
+            shifts += start
+
+        np.maximum(top_speed, speed_kph, out=top_speed)
+        newly = np.isnan(t_100) & (speed_kph >= 100.0)
+        t_100[newly] = t + ENGINE_DT
+
+    return {
+        "time_0_100": t_100,
+        "shift_count": shifts,
+        "top_speed": top_speed,
+        "final_speed": speed_kph,
+        "final_gear": gear,
+    }
+
+
+# ============================================
+# PROCESS POOL SWEEPS
+# ============================================
+def _run_chunk(args):
+    cals, steps, duration, sport = args
+    driver = sim_core.cycle_profile(steps, repeat=False)
+    return simulate_batch(cals, driver, duration, sport)
+
+
+def run_sweep(cals, steps=None, duration=60.0, sport=None, workers=None, chunk_size=2000):
+    """
+    Simulate every calibration in `cals` and return merged metric arrays.
+
+    `steps` is a sim_core.cycle_profile step list (picklable, unlike a
+    closure); the default is a full-throttle launch.  Sweeps larger than one
+    chunk are fanned out over a process pool.
+    """
+    if steps is None:
+        steps = [(duration, 100, 0, "D")]
+    if sport is not None:
+        sport = np.asarray(sport, dtype=bool)
+
+    jobs = []
+    for lo in range(0, len(cals), chunk_size):
+        hi = lo + chunk_size
+        jobs.append((cals[lo:hi], steps, duration, None if sport is None else sport[lo:hi]))
+
+    if len(jobs) == 1 or workers == 1:
+        parts = [_run_chunk(j) for j in jobs]
+    else:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            parts = list(pool.map(_run_chunk, jobs))
+
+    return {k: np.concatenate([part[k] for part in parts]) for k in parts[0]}
+
+
+def rank(results, key="time_0_100", top=10):
+    """Indices of the best `top` vehicles (lowest key; NaN sorts last)."""
+    values = np.where(np.isnan(results[key]), np.inf, results[key])
+    return np.argsort(values, kind="stable")[:top]
+
+
+def main():
+    axes = {
+        "FINAL_DRIVE": np.linspace(2.8, 4.0, 7).tolist(),
+        "A_MAX": np.linspace(3.0, 5.0, 5).tolist(),
+        "DRAG": [0.05, 0.058, 0.066],
+        "SPORT_UPSHIFT_FAC": [1.0, 1.15, 1.25, 1.4],
+        "GEAR_RATIOS": [
+            sim_core.GEAR_RATIOS,
+            {1: 4.0, 2: 2.4, 3: 1.6, 4: 1.2, 5: 1.0, 6: 0.8},
+            {1: 3.3, 2: 1.9, 3: 1.3, 4: 1.0, 5: 0.85, 6: 0.75},
+        ],
+    }
+    cals = calibration_grid(**axes)
+    sport = np.ones(len(cals), dtype=bool)
+
+    print(f"Sweeping {len(cals)} calibrations (60 s full-throttle launch in S) "
+          f"on {os.cpu_count()} CPUs")
+    start = time.perf_counter()
+    res = run_sweep(cals, duration=60.0, sport=sport, chunk_size=256)
+    elapsed = time.perf_counter() - start
+    print(f"Done in {elapsed:.2f} s ({len(cals) / elapsed:.0f} vehicles/s)\n")
+
+    print(" rank  0-100 s  shifts  top km/h  FD    A_MAX  DRAG   UPFAC  1st")
+    for r, i in enumerate(rank(res), 1):
+        c = cals[i]
+        print(f" {r:4d}  {res['time_0_100'][i]:7.1f}  {res['shift_count'][i]:6d}  "
+              f"{res['top_speed'][i]:8.1f}  {c['FINAL_DRIVE']:.2f}  {c['A_MAX']:.2f}   "
+              f"{c['DRAG']:.3f}  {c['SPORT_UPSHIFT_FAC']:.2f}   {c['GEAR_RATIOS'][1]}")
+
+
+if __name__ == "__main__":
+    main()
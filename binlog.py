@@ -0,0 +1,230 @@
+"""Compact binary CAN log (.canlog) with a background writer.
+
+This module provides:
+- A fixed-size record format: one 24-byte record per raw frame, stamped with
+  the frame's receive timestamp (msg.timestamp, the kernel time on SocketCAN).
+- BinaryLogWriter: the receive side only enqueues frames; a writer thread
+  packs them in batches into a preallocated buffer and writes each batch with
+  one call, so disk stalls never block the CAN socket.
+- Readers for post-processing: iter_records(), load_array() (NumPy) and
+  to_csv(), which decodes through dbc_codec into the dbc_log_*.csv layout.
+
+File layout:
+    header  64 bytes  magic, version, record size, start time, channel
+    records 24 bytes  <d timestamp, I can_id, B dlc, B flags, 2x, 8s data
+
+Usage:
+    python binlog.py info  dbc_log_20251120_011229.canlog
+    python binlog.py csv   dbc_log_20251120_011229.canlog [out.csv]
+"""
+
+import collections
+import csv
+import os
+import struct
+import sys
+import threading
+import time
+
+import dbc_codec
+
+MAGIC = b"CANLOG\x00\x01"
+VERSION = 1
+HEADER = struct.Struct("<8sHHd32s12x")
+RECORD = struct.Struct("<dIBB2x8s")
+
+FLAG_EXTENDED = 0x01
+FLAG_REMOTE = 0x02
+FLAG_ERROR = 0x04
+FLAG_FD = 0x08
+
+BATCH_RECORDS = 4096        # records per write() call at most
+FLUSH_INTERVAL = 0.5        # seconds a partial batch may wait
+IDLE_POLL = 0.005           # writer sleep when the queue is empty
+
+# Same column order as dbc_logger.py's CSV output
+CSV_FIELDS = ["timestamp", "can_id", "name", "dlc", "raw_data"] + [
+    sig for fid in sorted(dbc_codec.SIGNALS) for sig in dbc_codec.SIGNALS[fid]
+]
+
+
+def write_header(f, channel="", start=None):
+    f.write(HEADER.pack(MAGIC, VERSION, RECORD.size,
+                        time.time() if start is None else start, channel.encode()[:32]))
+
+
+def frame_flags(msg):
+    return ((FLAG_EXTENDED if msg.is_extended_id else 0)
+            | (FLAG_REMOTE if msg.is_remote_frame else 0)
+            | (FLAG_ERROR if msg.is_error_frame else 0)
+            | (FLAG_FD if msg.is_fd else 0))
+
+
+# ============================================
+# WRITER
+# ============================================
+class BinaryLogWriter:
+    """
+    Append frames to a .canlog file from a background thread.
+
+    put() is called from the receive loop and only does a deque append (no
+    lock round trip); the writer polls the deque.  Call close() to drain the
+    queue and finish the file.
+    """
+
+    def __init__(self, path, channel="", max_queue=1_000_000):
+        self.path = path
+        self.queue = collections.deque()
+        self.max_queue = max_queue
+        self.closing = False
+        self.frames = 0          # records written
+        self.batches = 0         # write() calls
+        self.dropped = 0         # frames refused because the queue was full
+        self.max_depth = 0
+        self.buf = bytearray(RECORD.size * BATCH_RECORDS)
+        self.file = open(path, "wb")
+        write_header(self.file, channel)
+        self.thread = threading.Thread(target=self._run, name="binlog-writer", daemon=True)
+        self.thread.start()
+
+    def put(self, msg):
+        """Enqueue one can.Message (raw, undecoded)."""
+        q = self.queue
+        depth = len(q)
+        if depth >= self.max_queue:
+            self.dropped += 1
+            return
+        q.append((msg.timestamp, msg.arbitration_id, msg.dlc, frame_flags(msg), bytes(msg.data[:8])))
+        if depth >= self.max_depth:
+            self.max_depth = depth + 1
+
+    def _run(self):
+        pack_into = RECORD.pack_into
+        size = RECORD.size
+        q = self.queue
+        last_flush = time.monotonic()
+        while True:
+            # Check before draining so nothing put() before close() is lost
+            stop = self.closing
+            n = 0
+            while n < BATCH_RECORDS and q:
+                pack_into(self.buf, n * size, *q.popleft())
+                n += 1
+            if n:
+                self.file.write(memoryview(self.buf)[:n * size])
+                self.frames += n
+                self.batches += 1
+            if n == BATCH_RECORDS:
+                continue
+            if stop and not q:
+                return
+            now = time.monotonic()
+            if now - last_flush >= FLUSH_INTERVAL:
+                # Make what we have visible to readers
+                self.file.flush()
+                last_flush = now
+            time.sleep(IDLE_POLL)
+
+    def stats(self):
+        return (f"[binlog] {self.frames} frames in {self.batches} writes, "
+                f"queue max={self.max_depth} now={len(self.queue)}, dropped={self.dropped}")
+
+    def close(self):
+        self.closing = True
+        self.thread.join()
+        self.file.close()
+
+
+# ============================================
+# READERS
+# ============================================
+def read_header(f):
+    raw = f.read(HEADER.size)
+    if len(raw) < HEADER.size:
+        raise ValueError("not a .canlog file (short header)")
+    magic, version, rec_size, start, channel = HEADER.unpack(raw)
+    if magic != MAGIC or rec_size != RECORD.size:
+        raise ValueError(f"not a .canlog v{VERSION} file")
+    return {"version": version, "start": start, "channel": channel.rstrip(b"\x00").decode()}
+
+
+def iter_records(path):
+    """Yield (timestamp, can_id, dlc, flags, data) per frame."""
+    with open(path, "rb") as f:
+        read_header(f)
+        while True:
+            chunk = f.read(RECORD.size * BATCH_RECORDS)
+            if not chunk:
+                return
+            usable = len(chunk) - len(chunk) % RECORD.size   # ignore a torn tail
+            for ts, can_id, dlc, flags, data in RECORD.iter_unpack(chunk[:usable]):
+                yield ts, can_id, dlc, flags, data[:dlc]
+
+
+def load_array(path):
+    """Whole log as a NumPy structured array (timestamp, can_id, dlc, flags, data)."""
+    import numpy as np
+    dtype = np.dtype([("timestamp", "<f8"), ("can_id", "<u4"), ("dlc", "u1"),
+                      ("flags", "u1"), ("pad", "V2"), ("data", "u1", (8,))])
+    with open(path, "rb") as f:
+        read_header(f)
+        raw = f.read()
+    usable = len(raw) - len(raw) % RECORD.size
+    return np.frombuffer(raw[:usable], dtype=dtype)
+
+
+def to_csv(path, out_path=None):
+    """Decode a .canlog into the dbc_log_*.csv layout; returns the CSV path."""
+    out_path = out_path or os.path.splitext(path)[0] + ".csv"
+    with open(out_path, "w", newline="") as f:
+        writer = csv.DictWriter(f, fieldnames=CSV_FIELDS)
+        writer.writeheader()
+        for ts, can_id, dlc, flags, data in iter_records(path):
+            row = {
+                "timestamp": ts,
+                "can_id": hex(can_id),
+                "name": "",
+                "dlc": dlc,
+                "raw_data": data.hex().upper(),
+            }
+            try:
+                row["name"] = dbc_codec.NAMES[can_id]
+                row.update(dbc_codec.decode_message(can_id, data))
+            except (KeyError, ValueError):
+                pass
+            writer.writerow(row)
+    return out_path
+
+
+def info(path):
+    with open(path, "rb") as f:
+        hdr = read_header(f)
+    n = 0
+    first = last = None
+    counts = {}
+    for ts, can_id, dlc, flags, data in iter_records(path):
+        n += 1
+        first = ts if first is None else first
+        last = ts
+        counts[can_id] = counts.get(can_id, 0) + 1
+    ids = len(counts)
+    dur = (last - first) if n else 0.0
+    lines = [f"{path}: channel={hdr['channel'] or '-'} frames={n} ids={ids} "
+             f"duration={dur:.1f} s ({n / dur if dur else 0:.0f} frames/s)"]
+    for can_id in sorted(counts):
+        lines.append(f"  0x{can_id:03X} {dbc_codec.NAMES.get(can_id, ''):12} {counts[can_id]}")
+    return "\n".join(lines)
+
+
+def main():
+    if len(sys.argv) < 3 or sys.argv[1] not in ("info", "csv"):
+        print(__doc__.split("Usage:")[1].rstrip())
+        sys.exit(1)
+    if sys.argv[1] == "info":
+        print(info(sys.argv[2]))
+    else:
+        print(f"Wrote {to_csv(sys.argv[2], sys.argv[3] if len(sys.argv) > 3 else None)}")
+
+
+if __name__ == "__main__":
+    main()
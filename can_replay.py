@@ -0,0 +1,257 @@
+"""Replay recorded logs onto a CAN bus with their original timing.
+
+This tool:
+- Reads dbc_log_*.csv (raw_data column), engine_log_*.csv (re-encoded as
+  EngineData 0x100), .canlog (binlog.py) and .colog (colog.py, signals
+  re-encoded per message through dbc_codec).
+- Sends every frame at an absolute deadline, start + (t - t_first) / speed,
+  on the monotonic clock (scheduler.sleep_until), so a late frame never
+  shifts the ones after it and timing error does not accumulate.
+- --speed N replays N times faster; --afap sends as fast as the bus takes.
+- Reports achieved vs requested frame rate and how late frames went out.
+
+Typical use: put real traffic on vcan0 to benchmark gateway_ecu.py, the
+dashboards or the loggers without running the physics ECUs.
+
+Usage:
+    python can_replay.py dbc_log_20251120_113805.csv                # vcan0, 1x
+    python can_replay.py capture.canlog --speed 10 --channel vcan1
+    python can_replay.py engine_log_1763695204.csv --afap --loop 5
+    python can_replay.py run.colog --interface memory                # in-process MemoryBus
+"""
+
+import argparse
+import csv
+import heapq
+import sys
+import time
+
+import can
+
+import binlog
+import dbc_codec
+from scheduler import JITTER_EDGES_MS, RollingHistogram, sleep_until
+
+REPORT_EVERY = 5.0          # seconds between progress lines
+LEAD_TIME = 0.05            # first frame goes out this long after start
+
+
+# ============================================
+# LOG READERS
+# ============================================
+# Each reader yields (timestamp, can_id, data, flags) in time order.
+
+def read_dbc_csv(path):
+    with open(path, newline="") as f:
+        for row in csv.DictReader(f):
+            raw = row.get("raw_data") or ""
+            try:
+                ts = float(row["timestamp"])
+                can_id = int(row["can_id"], 16)
+                data = bytes.fromhex(raw)
+            except (TypeError, ValueError):
+                continue
+            dlc = int(row["dlc"]) if row.get("dlc") else len(data)
+            yield ts, can_id, data[:dlc], binlog.FLAG_EXTENDED if can_id > 0x7FF else 0
+
+
+def read_engine_csv(path):
+    with open(path, newline="") as f:
+        for row in csv.DictReader(f):
+            try:
+                data = bytes(dbc_codec.encode_engine_data(
+                    float(row["rpm"]), float(row["speed_kph"]), float(row["coolant_c"])))
+                yield float(row["timestamp"]), dbc_codec.ENGINEDATA_ID, data, 0
+            except (KeyError, TypeError, ValueError):
+                continue
+
+
+def read_canlog(path):
+    for ts, can_id, dlc, flags, data in binlog.iter_records(path):
+        yield ts, can_id, data[:dlc], flags
+
+
+def read_colog(path):
+    """Rebuild frames per DBC message; its signals share the same timestamps."""
+    import colog
+    log = colog.ColumnarLog(path)
+    streams = []
+    for frame_id, names in dbc_codec.SIGNALS.items():
+        if not all(n in log.directory for n in names):
+            continue
+        columns = [log.read(n) for n in names]
+        t = columns[0][0]
+        if any(len(c[0]) != len(t) for c in columns):
+            print(f"[replay] {dbc_codec.NAMES[frame_id]}: signal lengths differ, skipped")
+            continue
+        streams.append(_encode_rows(frame_id, t, [c[1] for c in columns]))
+    return heapq.merge(*streams, key=lambda frame: frame[0])
+
+
+def _encode_rows(frame_id, t, values):
+    encode = dbc_codec.ENCODERS[frame_id]
+    for i in range(len(t)):
+        try:
+            data = bytes(encode(*(float(v[i]) for v in values)))
+        except ValueError:
+            continue
+        yield float(t[i]), frame_id, data, 0
+
+
+def open_log(path):
+    """Frame iterator for any supported log, picked by extension / header."""
+    if path.endswith(".canlog"):
+        return read_canlog(path)
+    if path.endswith(".colog"):
+        return read_colog(path)
+    with open(path, newline="") as f:
+        header = f.readline()
+    if "raw_data" in header:
+        return read_dbc_csv(path)
+    if "rpm" in header:
+        return read_engine_csv(path)
+    raise ValueError(f"{path}: unknown log format")
+
+
+# ============================================
+# REPLAY
+# ============================================
+def make_message(can_id, data, flags):
+    return can.Message(
+        arbitration_id=can_id,
+        data=data,
+        is_extended_id=bool(flags & binlog.FLAG_EXTENDED),
+        is_remote_frame=bool(flags & binlog.FLAG_REMOTE),
+        is_fd=bool(flags & binlog.FLAG_FD),
+        check=False,
+    )
+
+
+def replay(frames, bus, speed=1.0, afap=False, verbose=True, report_every=REPORT_EVERY):
+    """
+    Send frames on bus at start + (t - t_first) / speed (or back to back
+    with afap).  Returns a stats dict: frames, send errors, elapsed, log
+    span, requested and achieved rates and the lateness histogram.
+    """
+    late = RollingHistogram(JITTER_EDGES_MS, window=100_000)
+    sent = errors = 0
+    t_first = t_last = None
+    # The lead time only gives a paced replay room to hit its first deadline
+    start = time.monotonic() + (0.0 if afap else LEAD_TIME)
+    next_report = start + report_every
+
+    for ts, can_id, data, flags in frames:
+        if t_first is None:
+            t_first = ts
+        t_last = ts
+        if not afap:
+            deadline = start + (ts - t_first) / speed
+            sleep_until(deadline)
+            late.add(max(0.0, time.monotonic() - deadline) * 1000.0)
+        try:
+            bus.send(make_message(can_id, data, flags))
+            sent += 1
+        except can.CanError:
+            errors += 1
+        if verbose and time.monotonic() >= next_report:
+            next_report += report_every
+            print(progress_line(sent, errors, time.monotonic() - start,
+                                (t_last - t_first) / speed, late))
+
+    elapsed = max(time.monotonic() - start, 1e-9)
+    span = (t_last - t_first) if t_first is not None else 0.0
+    frames_total = sent + errors
+    return {
+        "frames": sent,
+        "errors": errors,
+        "elapsed": elapsed,
+        "span": span,
+        "speed": None if afap else speed,
+        "requested_fps": frames_total / (span / speed) if span and not afap else None,
+        "achieved_fps": sent / elapsed,
+        "late": late,
+    }
+
+
+def progress_line(sent, errors, elapsed, log_elapsed, late):
+    line = f"[replay] {sent} frames in {elapsed:.1f} s ({sent / max(elapsed, 1e-9):.0f} fps)"
+    if len(late):
+        line += (f", log time {log_elapsed:.1f} s, late p50={late.percentile(50):g} ms "
+                 f"p99={late.percentile(99):g} ms max={late.max:.2f} ms")
+    if errors:
+        line += f", send errors={errors}"
+    return line
+
+
+def summary(stats):
+    if stats["speed"] is None:
+        head = (f"[replay] as fast as possible: {stats['frames']} frames in "
+                f"{stats['elapsed']:.2f} s = {stats['achieved_fps']:.0f} fps")
+    else:
+        requested = stats["span"] / stats["speed"]
+        head = (f"[replay] {stats['speed']:g}x: {stats['frames']} frames, "
+                f"requested {requested:.2f} s / {stats['requested_fps'] or 0:.0f} fps, "
+                f"achieved {stats['elapsed']:.2f} s / {stats['achieved_fps']:.0f} fps "
+                f"(timing error {(stats['elapsed'] - requested) * 1000:+.1f} ms)\n"
+                f"[replay] lateness {stats['late'].format()}")
+    if stats["errors"]:
+        head += f"\n[replay] send errors (bus full?): {stats['errors']}"
+    return head
+
+
+def open_bus(interface, channel):
+    if interface == "memory":
+        from mem_bus import MemoryBus
+        return MemoryBus(channel=channel)
+    return can.interface.Bus(channel=channel, bustype=interface)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Replay a CAN log with its original timing")
+    parser.add_argument("log", help="dbc_log / engine_log CSV, .canlog or .colog")
+    parser.add_argument("--channel", default="vcan0")
+    parser.add_argument("--interface", default="socketcan",
+                        help="python-can interface, or 'memory' for an in-process MemoryBus")
+    pace = parser.add_mutually_exclusive_group()
+    pace.add_argument("--speed", type=float, default=1.0, help="replay N times faster than recorded")
+    pace.add_argument("--afap", action="store_true", help="as fast as possible, no pacing")
+    parser.add_argument("--loop", type=int, default=1, help="replay the log N times")
+    parser.add_argument("-q", "--quiet", action="store_true", help="no progress lines")
+    args = parser.parse_args()
+    if args.speed <= 0:
+        parser.error("--speed must be > 0 (use --afap for no pacing)")
+
+    sys.stdout.write("\033]0;CAN Replay\007")
+    sys.stdout.flush()
+
+    bus = open_bus(args.interface, args.channel)
+    sink = None
+    if args.interface == "memory":
+        # Nobody else is on an in-process channel: count delivery ourselves
+        from mem_bus import MemoryBus
+        sink = MemoryBus(channel=args.channel)
+
+    pace = "as fast as possible" if args.afap else f"{args.speed:g}x"
+    print(f"Replaying {args.log} on {args.channel} ({args.interface}), {pace}. Ctrl+C to stop.")
+    try:
+        for n in range(args.loop):
+            if args.loop > 1:
+                print(f"[replay] pass {n + 1}/{args.loop}")
+            try:
+                frames = open_log(args.log)
+            except (OSError, ValueError) as e:
+                print(e)
+                return
+            stats = replay(frames, bus, speed=args.speed, afap=args.afap, verbose=not args.quiet)
+            print(summary(stats))
+    except KeyboardInterrupt:
+        print("\nReplay stopped.")
+    finally:
+        if sink is not None:
+            print(f"[replay] delivered to in-memory listener: {sink.rx_count + len(sink.queue)}")
+            sink.shutdown()
+        bus.shutdown()
+
+
+if __name__ == "__main__":
+    main()
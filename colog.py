@@ -0,0 +1,298 @@
+"""Columnar, chunk-compressed signal log (.colog).
+
+One timestamp array and one value array per DBC signal, instead of a wide
+CSV row per frame with most columns empty:
+- Samples are buffered per signal and written in chunks of CHUNK_SAMPLES.
+- Timestamps are stored as delta-encoded integer microseconds, values as
+  int32 when every value in the chunk is integral, float64 otherwise; both
+  are zlib-compressed per chunk.
+- Every chunk records its sample count, time span and value min/max, so
+  readers can skip chunks outside a time window or value range without
+  decompressing them.
+
+File layout:
+    magic                       8 bytes
+    chunk payloads              zlib blobs, back to back
+    directory                   JSON (signals -> chunk list with offsets/stats)
+    trailer                     <Q directory offset, 8-byte magic
+
+Usage:
+    python colog.py convert dbc_log_20251120_011229.csv [...]   # also .canlog
+    python colog.py info    dbc_log_20251120_011229.colog
+"""
+
+import csv
+import json
+import os
+import struct
+import sys
+import zlib
+
+import numpy as np
+
+import dbc_codec
+
+MAGIC = b"COLOG\x00\x00\x01"
+TRAILER = struct.Struct("<Q8s")
+CHUNK_SAMPLES = 4096
+ZLIB_LEVEL = 6
+
+# engine_logger.py columns -> DBC signal names
+ENGINE_LOG_COLUMNS = {"rpm": "RPM", "speed_kph": "Speed", "coolant_c": "Coolant"}
+# dbc_logger.py columns that are not signals
+FRAME_COLUMNS = ("timestamp", "can_id", "name", "dlc", "raw_data")
+
+
+def _pack_values(values):
+    v = np.asarray(values, dtype=np.float64)
+    if np.all(np.mod(v, 1.0) == 0) and np.all(np.abs(v) < 2**31):
+        return "<i4", v.astype("<i4")
+    return "<f8", v.astype("<f8")
+
+
+# ============================================
+# WRITER
+# ============================================
+class ColumnarWriter:
+    """
+    Append (timestamp, value) samples per signal; close() writes the
+    directory.  append_frame() decodes a raw CAN frame through dbc_codec.
+    """
+
+    def __init__(self, path, chunk_samples=CHUNK_SAMPLES, source=""):
+        self.path = path
+        self.chunk_samples = chunk_samples
+        self.file = open(path, "wb")
+        self.file.write(MAGIC)
+        self.t_base = None            # microsecond origin of all timestamps
+        self.buffers = {}             # signal -> ([t], [v])
+        self.directory = {}           # signal -> [chunk meta]
+        self.source = source
+
+    def append(self, signal, t, value):
+        if self.t_base is None:
+            self.t_base = int(t * 1e6)
+        buf = self.buffers.get(signal)
+        if buf is None:
+            buf = self.buffers[signal] = ([], [])
+            self.directory.setdefault(signal, [])
+        buf[0].append(t)
+        buf[1].append(value)
+        if len(buf[0]) >= self.chunk_samples:
+            self._flush(signal)
+
+    def append_frame(self, t, can_id, data):
+        """Decode one frame with the compiled DBC codec; unknown IDs are skipped."""
+        decoder = dbc_codec.DECODERS.get(can_id)
+        if decoder is None:
+            return
+        try:
+            values = decoder(data)
+        except ValueError:
+            return
+        for name, v in zip(dbc_codec.SIGNALS[can_id], values):
+            self.append(name, t, v)
+
+    def _flush(self, signal):
+        ts, vs = self.buffers[signal]
+        if not ts:
+            return
+        t_us = np.round(np.asarray(ts, dtype=np.float64) * 1e6).astype(np.int64) - self.t_base
+        dtype, v = _pack_values(vs)
+        t_blob = zlib.compress(np.diff(t_us, prepend=0).astype("<i8").tobytes(), ZLIB_LEVEL)
+        v_blob = zlib.compress(v.tobytes(), ZLIB_LEVEL)
+
+        offset = self.file.tell()
+        self.file.write(t_blob)
+        self.file.write(v_blob)
+        self.directory[signal].append({
+            "offset": offset,
+            "t_len": len(t_blob),
+            "v_len": len(v_blob),
+            "n": len(ts),
+            "dtype": dtype,
+            "t0": float(ts[0]),
+            "t1": float(ts[-1]),
+            "min": float(v.min()),
+            "max": float(v.max()),
+        })
+        ts.clear()
+        vs.clear()
+
+    def close(self):
+        for signal in list(self.buffers):
+            self._flush(signal)
+        offset = self.file.tell()
+        self.file.write(json.dumps({
+            "t_base_us": self.t_base or 0,
+            "source": self.source,
+            "signals": self.directory,
+        }, separators=(",", ":")).encode())
+        self.file.write(TRAILER.pack(offset, MAGIC))
+        self.file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+# ============================================
+# READER
+# ============================================
+class ColumnarLog:
+    """Random access to a .colog: directory in memory, chunks on demand."""
+
+    def __init__(self, path):
+        self.path = path
+        with open(path, "rb") as f:
+            if f.read(len(MAGIC)) != MAGIC:
+                raise ValueError(f"{path}: not a .colog file")
+            end = f.seek(-TRAILER.size, os.SEEK_END)
+            offset, magic = TRAILER.unpack(f.read(TRAILER.size))
+            if magic != MAGIC:
+                raise ValueError(f"{path}: truncated .colog (no directory)")
+            f.seek(offset)
+            meta = json.loads(f.read(end - offset))
+        self.t_base_us = meta["t_base_us"]
+        self.source = meta.get("source", "")
+        self.directory = meta["signals"]
+
+    @property
+    def signals(self):
+        return sorted(self.directory)
+
+    def chunks(self, signal):
+        return self.directory[signal]
+
+    def stats(self, signal):
+        """(samples, t_first, t_last, min, max) from chunk headers only."""
+        ch = self.directory[signal]
+        if not ch:
+            return 0, None, None, None, None
+        return (sum(c["n"] for c in ch), ch[0]["t0"], ch[-1]["t1"],
+                min(c["min"] for c in ch), max(c["max"] for c in ch))
+
+    def time_range(self):
+        spans = [self.stats(s)[1:3] for s in self.directory if self.directory[s]]
+        if not spans:
+            return None, None
+        return min(s[0] for s in spans), max(s[1] for s in spans)
+
+    def _load_chunk(self, f, c):
+        f.seek(c["offset"])
+        t_us = np.cumsum(np.frombuffer(zlib.decompress(f.read(c["t_len"])), dtype="<i8"))
+        v = np.frombuffer(zlib.decompress(f.read(c["v_len"])), dtype=c["dtype"])
+        return (t_us + self.t_base_us) / 1e6, v
+
+    def read(self, signal, t_start=None, t_end=None, vmin=None, vmax=None):
+        """
+        (timestamps, values) for one signal, optionally limited to a time
+        window.  Chunks are skipped by their stats when they cannot overlap
+        the window or the [vmin, vmax] value range.
+        """
+        ts, vs = [], []
+        with open(self.path, "rb") as f:
+            for c in self.directory.get(signal, []):
+                if t_start is not None and c["t1"] < t_start:
+                    continue
+                if t_end is not None and c["t0"] > t_end:
+                    continue
+                if vmin is not None and c["max"] < vmin:
+                    continue
+                if vmax is not None and c["min"] > vmax:
+                    continue
+                t, v = self._load_chunk(f, c)
+                ts.append(t)
+                vs.append(v)
+        if not ts:
+            return np.empty(0), np.empty(0)
+        t, v = np.concatenate(ts), np.concatenate(vs).astype(np.float64)
+        if t_start is not None or t_end is not None:
+            keep = np.ones(len(t), dtype=bool)
+            if t_start is not None:
+                keep &= t >= t_start
+            if t_end is not None:
+                keep &= t <= t_end
+            t, v = t[keep], v[keep]
+        return t, v
+
+
+# ============================================
+# CONVERTERS
+# ============================================
+def from_csv(csv_path, out_path=None, chunk_samples=CHUNK_SAMPLES):
+    """
+    Convert a dbc_log_*.csv (sparse wide rows) or engine_log_*.csv into a
+    .colog next to it.  Empty cells are simply not samples.
+    """
+    out_path = out_path or os.path.splitext(csv_path)[0] + ".colog"
+    with open(csv_path, newline="") as f, \
+            ColumnarWriter(out_path, chunk_samples, source=os.path.basename(csv_path)) as w:
+        reader = csv.reader(f)
+        header = next(reader, None)
+        if header is None:
+            return out_path
+        if "raw_data" in header:
+            columns = [(i, name) for i, name in enumerate(header) if name not in FRAME_COLUMNS]
+        else:
+            columns = [(i, ENGINE_LOG_COLUMNS.get(name, name))
+                       for i, name in enumerate(header) if name != "timestamp"]
+        ts_col = header.index("timestamp")
+
+        for row in reader:
+            if len(row) <= ts_col or row[ts_col] == "":
+                continue
+            t = float(row[ts_col])
+            for i, name in columns:
+                if i < len(row) and row[i] != "":
+                    w.append(name, t, float(row[i]))
+    return out_path
+
+
+def from_canlog(path, out_path=None, chunk_samples=CHUNK_SAMPLES):
+    """Decode a binlog.py .canlog into a .colog."""
+    import binlog
+    out_path = out_path or os.path.splitext(path)[0] + ".colog"
+    with ColumnarWriter(out_path, chunk_samples, source=os.path.basename(path)) as w:
+        for ts, can_id, dlc, flags, data in binlog.iter_records(path):
+            w.append_frame(ts, can_id, data)
+    return out_path
+
+
+def convert(path):
+    if path.endswith(".canlog"):
+        return from_canlog(path)
+    return from_csv(path)
+
+
+def info(path):
+    log = ColumnarLog(path)
+    t0, t1 = log.time_range()
+    size = os.path.getsize(path)
+    lines = [f"{path}: {size} bytes, {len(log.signals)} signals"
+             + (f", {t1 - t0:.1f} s" if t0 is not None else "")
+             + (f" (from {log.source})" if log.source else "")]
+    for s in log.signals:
+        n, a, b, lo, hi = log.stats(s)
+        lines.append(f"  {s:16} n={n:<8} chunks={len(log.chunks(s)):<4} min={lo:g} max={hi:g}")
+    return "\n".join(lines)
+
+
+def main():
+    if len(sys.argv) < 3 or sys.argv[1] not in ("convert", "info"):
+        print(__doc__.split("Usage:")[1].rstrip())
+        sys.exit(1)
+    for path in sys.argv[2:]:
+        if sys.argv[1] == "info":
+            print(info(path))
+            continue
+        out = convert(path)
+        before, after = os.path.getsize(path), os.path.getsize(out)
+        print(f"{path} -> {out}: {before} -> {after} bytes "
+              f"({before / after if after else 0:.1f}x smaller)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,298 @@
+"""Control plane for the virtual powertrain lab.
+
+Replaces polling global_state.txt on every loop iteration with a push
+model over a Unix socket:
+- ControlServer (hosted by master_control.py) owns the lab state and
+  broadcasts every change to all subscribers.
+- ControlClient (one per ECU / dashboard) receives those pushes on a
+  background thread into a ControlState, so checking "am I paused?" in a
+  100 Hz loop is an attribute read, not a file open.
+- send_command() lets any tool (prq_controller.py, scripts) issue commands.
+
+Commands: pause, resume, step N (run N ticks of STEP_TICK seconds of
+simulated time, then stay paused) and scale F (run loops F times faster
+than real time; physics dt is unchanged).
+
+A step is one tick of the slowest loop, the engine (ENGINE_DT = 0.1 s):
+step 1 runs one engine tick and ten TCU ticks, so all ECUs stay in sync
+after every step.
+
+Wire format: one JSON object per line in both directions.
+"""
+
+import json
+import os
+import selectors
+import socket
+import threading
+import time
+
+from sim_core import ENGINE_DT
+
+CONTROL_SOCKET = os.environ.get("CAN_LAB_CONTROL", "/tmp/can_lab_control.sock")
+
+# One "step" is one tick of the slowest loop (the engine); a step of the
+# TCU's 10 ms would never let the engine run a whole tick
+STEP_TICK = ENGINE_DT
+
+RECONNECT_DELAY = 1.0
+
+
+# ============================================
+# CLIENT SIDE STATE
+# ============================================
+class ControlState:
+    """Latest lab state as pushed by the server; safe to read from any thread."""
+
+    def __init__(self):
+        self.paused = False
+        self.time_scale = 1.0
+        self.step_budget = 0.0     # simulated seconds left to run while paused
+        self.connected = False
+        self._cond = threading.Condition()
+
+    def apply(self, update):
+        with self._cond:
+            if "paused" in update:
+                self.paused = bool(update["paused"])
+            if "time_scale" in update:
+                self.time_scale = float(update["time_scale"])
+            if "step" in update:
+                self.step_budget += int(update["step"]) * STEP_TICK
+            if not self.paused:
+                self.step_budget = 0.0
+            self._cond.notify_all()
+
+    def take_step(self, period, timeout=None):
+        """
+        While paused: block until a tick of `period` seconds may run.
+
+        Returns True once resumed or when `period` of step budget was
+        consumed, False on timeout.  Cheap to call when not paused.
+        """
+        if not self.paused:
+            return True
+        eps = 1e-9
+        with self._cond:
+            ok = self._cond.wait_for(
+                lambda: not self.paused or self.step_budget >= period - eps, timeout)
+            if not ok:
+                return False
+            if self.paused:
+                self.step_budget -= period
+            return True
+
+    def wait_running(self, timeout=None):
+        """Block while paused (no step handling); True if running."""
+        if not self.paused:
+            return True
+        with self._cond:
+            return self._cond.wait_for(lambda: not self.paused, timeout)
+
+
+class ControlClient(threading.Thread):
+    """Background subscriber feeding a ControlState; reconnects as needed."""
+
+    def __init__(self, name, path=CONTROL_SOCKET, state=None, verbose=True):
+        super().__init__(name=f"control-{name}", daemon=True)
+        self.client_name = name
+        self.path = path
+        self.state = state if state is not None else ControlState()
+        self.verbose = verbose
+
+    def run(self):
+        warned = False
+        while True:
+            try:
+                with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+                    sock.connect(self.path)
+                    sock.sendall(_encode({"hello": self.client_name}))
+                    self.state.connected = True
+                    warned = False
+                    if self.verbose:
+                        print(f"[control] {self.client_name} subscribed to {self.path}")
+                    with sock.makefile("r") as lines:
+                        for line in lines:
+                            try:
+                                self.state.apply(json.loads(line))
+                            except ValueError:
+                                continue
+            except OSError:
+                if self.verbose and not warned:
+                    print(f"[control] no control server at {self.path}; running, will retry")
+                    warned = True
+            # Keep the last known state; a restarted server re-sends its state
+            self.state.connected = False
+            time.sleep(RECONNECT_DELAY)
+
+
+def subscribe(name, path=CONTROL_SOCKET, verbose=True):
+    """Start a ControlClient and return its ControlState."""
+    client = ControlClient(name, path, verbose=verbose)
+    client.start()
+    return client.state
+
+
+# ============================================
+# SERVER
+# ============================================
+def _encode(obj):
+    return (json.dumps(obj) + "\n").encode()
+
+
+class ControlServer:
+    """Owns the lab state and pushes every change to all subscribers."""
+
+    def __init__(self, path=CONTROL_SOCKET, verbose=True):
+        self.path = path
+        self.verbose = verbose
+        self.paused = False
+        self.time_scale = 1.0
+        self._lock = threading.Lock()
+        self._clients = {}      # socket -> (name, buffer)
+        self._sel = selectors.DefaultSelector()
+        self._listener = None
+
+    # ---------- state changes ----------
+    def snapshot(self):
+        return {"paused": self.paused, "time_scale": self.time_scale}
+
+    def pause(self):
+        with self._lock:
+            self.paused = True
+            self._broadcast(self.snapshot())
+
+    def resume(self):
+        with self._lock:
+            self.paused = False
+            self._broadcast(self.snapshot())
+
+    def step(self, ticks):
+        ticks = int(ticks)
+        if ticks <= 0:
+            raise ValueError("step count must be positive")
+        with self._lock:
+            self.paused = True
+            self._broadcast(dict(self.snapshot(), step=ticks))
+
+    def scale(self, factor):
+        factor = float(factor)
+        if factor <= 0:
+            raise ValueError("time scale must be positive")
+        with self._lock:
+            self.time_scale = factor
+            self._broadcast(self.snapshot())
+
+    def handle(self, cmd):
+        """Apply a command dict ({"cmd": ..., ...}); returns the new state."""
+        name = cmd.get("cmd")
+        if name == "pause":
+            self.pause()
+        elif name == "resume":
+            self.resume()
+        elif name == "step":
+            self.step(cmd.get("ticks", 1))
+        elif name == "scale":
+            self.scale(cmd.get("factor", 1.0))
+        elif name != "status":
+            raise ValueError(f"unknown command {name!r}")
+        return self.snapshot()
+
+    def subscribers(self):
+        with self._lock:
+            return [name for name, _ in self._clients.values()]
+
+    # ---------- socket handling ----------
+    def _broadcast(self, update):
+        data = _encode(update)
+        for sock in list(self._clients):
+            try:
+                sock.sendall(data)
+            except OSError:
+                self._drop(sock)
+
+    def _drop(self, sock):
+        self._clients.pop(sock, None)
+        try:
+            self._sel.unregister(sock)
+        except (KeyError, ValueError):
+            pass
+        sock.close()
+
+    def start(self):
+        if os.path.exists(self.path):
+            os.unlink(self.path)   # stale socket from a previous run
+        self._listener = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self._listener.bind(self.path)
+        self._listener.listen()
+        self._listener.setblocking(False)
+        self._sel.register(self._listener, selectors.EVENT_READ)
+        threading.Thread(target=self._serve, name="control-server", daemon=True).start()
+
+    def _serve(self):
+        while True:
+            for key, _ in self._sel.select():
+                sock = key.fileobj
+                if sock is self._listener:
+                    conn, _ = sock.accept()
+                    with self._lock:
+                        self._clients[conn] = ("?", b"")
+                        self._sel.register(conn, selectors.EVENT_READ)
+                        conn.sendall(_encode(self.snapshot()))
+                    continue
+                try:
+                    chunk = sock.recv(4096)
+                except OSError:
+                    chunk = b""
+                if not chunk:
+                    with self._lock:
+                        self._drop(sock)
+                    continue
+                self._on_data(sock, chunk)
+
+    def _on_data(self, sock, chunk):
+        with self._lock:
+            name, buf = self._clients.get(sock, ("?", b""))
+            buf += chunk
+            lines = buf.split(b"\n")
+            self._clients[sock] = (name, lines[-1])
+        for line in lines[:-1]:
+            try:
+                msg = json.loads(line)
+            except ValueError:
+                continue
+            if "hello" in msg:
+                with self._lock:
+                    self._clients[sock] = (str(msg["hello"]), self._clients[sock][1])
+                if self.verbose:
+                    print(f"[control] subscriber: {msg['hello']}")
+                continue
+            try:
+                reply = self.handle(msg)
+            except (ValueError, TypeError) as e:
+                reply = {"error": str(e)}
+            # Commands get a direct reply (subscribers also got the broadcast)
+            try:
+                sock.sendall(_encode(dict(reply, reply=True)))
+            except OSError:
+                pass
+
+    def close(self):
+        if self._listener is not None:
+            self._listener.close()
+        if os.path.exists(self.path):
+            os.unlink(self.path)
+
+
+def send_command(cmd, path=CONTROL_SOCKET, timeout=1.0, **params):
+    """Send one command to a running server; returns its reply dict."""
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+        sock.settimeout(timeout)
+        sock.connect(path)
+        sock.sendall(_encode(dict(params, cmd=cmd)))
+        with sock.makefile("r") as lines:
+            for line in lines:
+                msg = json.loads(line)
+                if msg.get("reply"):
+                    return msg
+    raise ConnectionError("control server closed the connection")
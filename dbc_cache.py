@@ -0,0 +1,174 @@
+"""Cached DBC loading.
+
+Parsing a DBC with cantools is done once per file version, not once per
+process:
+- load_dbc() pickles the parsed database into CACHE_DIR, next to a header
+  holding the file's SHA-256, mtime and size.
+- On the next load a matching mtime/size is trusted; otherwise the file is
+  re-hashed, and only a content change triggers a re-parse (touching the file
+  just refreshes the header).
+- Cache files are written to a temp name and renamed, so ECUs starting at the
+  same time never read a half-written cache.
+
+Run `python dbc_cache.py` to compare load times with and without the cache.
+"""
+
+import hashlib
+import os
+import pickle
+import sys
+import time
+
+LAB_DIR = os.path.dirname(os.path.abspath(__file__))
+DBC_PATH = os.path.join(LAB_DIR, "vehicle.dbc")
+CACHE_DIR = os.environ.get("CAN_LAB_DBC_CACHE", os.path.join(LAB_DIR, ".dbc_cache"))
+
+CACHE_FORMAT = 1
+
+# Outcome of the most recent load_dbc() call, for startup logs
+last_load = {}
+
+
+def file_sha256(path):
+    with open(path, "rb") as f:
+        return hashlib.sha256(f.read()).hexdigest()
+
+
+def cache_path(path, cache_dir=None):
+    cache_dir = cache_dir or CACHE_DIR
+    name = os.path.basename(path)
+    # Same basename in two directories must not share a cache file
+    tag = hashlib.sha1(os.path.abspath(path).encode()).hexdigest()[:8]
+    return os.path.join(cache_dir, f"{name}.{tag}.pickle")
+
+
+def _read_cache(cpath):
+    """Return (header, payload bytes) or (None, None)."""
+    try:
+        with open(cpath, "rb") as f:
+            header = pickle.load(f)
+            if header.get("format") != CACHE_FORMAT:
+                return None, None
+            return header, f.read()
+    except (OSError, EOFError, pickle.UnpicklingError, AttributeError):
+        return None, None
+
+
+def _write_cache(cpath, header, payload):
+    os.makedirs(os.path.dirname(cpath), exist_ok=True)
+    tmp = f"{cpath}.{os.getpid()}.tmp"
+    try:
+        with open(tmp, "wb") as f:
+            pickle.dump(header, f, protocol=pickle.HIGHEST_PROTOCOL)
+            f.write(payload)
+        os.replace(tmp, cpath)
+    except OSError:
+        # Read-only checkout etc.: caching is an optimization, never an error
+        try:
+            os.remove(tmp)
+        except OSError:
+            pass
+
+
+def load_dbc(path=DBC_PATH, use_cache=True, cache_dir=None):
+    """
+    cantools.database.load_file(path), served from the on-disk cache when the
+    file has not changed.  Details of the load end up in `last_load`.
+    """
+    import cantools
+
+    t0 = time.perf_counter()
+    st = os.stat(path)
+    cpath = cache_path(path, cache_dir)
+
+    if use_cache:
+        header, payload = _read_cache(cpath)
+        if header is not None and header["cantools"] == cantools.__version__:
+            fresh = header["mtime_ns"] == st.st_mtime_ns and header["size"] == st.st_size
+            if not fresh and header["sha256"] == file_sha256(path):
+                # Touched but unchanged: keep the parse, refresh the stat key
+                header.update(mtime_ns=st.st_mtime_ns, size=st.st_size)
+                _write_cache(cpath, header, payload)
+                fresh = True
+            if fresh:
+                try:
+                    db = pickle.loads(payload)
+                except Exception:
+                    db = None
+                if db is not None:
+                    last_load.update(path=path, source="cache",
+                                     seconds=time.perf_counter() - t0)
+                    return db
+
+    db = cantools.database.load_file(path)
+    source = "parsed"
+    if use_cache:
+        header = {
+            "format": CACHE_FORMAT,
+            "cantools": cantools.__version__,
+            "sha256": file_sha256(path),
+            "mtime_ns": st.st_mtime_ns,
+            "size": st.st_size,
+        }
+        _write_cache(cpath, header, pickle.dumps(db, protocol=pickle.HIGHEST_PROTOCOL))
+        source = "parsed, cache written"
+    last_load.update(path=path, source=source, seconds=time.perf_counter() - t0)
+    return db
+
+
+def describe_last_load():
+    if not last_load:
+        return "DBC not loaded"
+    return (f"DBC {os.path.basename(last_load['path'])}: {last_load['source']} "
+            f"in {last_load['seconds'] * 1000:.1f} ms")
+
+
+def clear_cache(cache_dir=None):
+    cache_dir = cache_dir or CACHE_DIR
+    removed = 0
+    if os.path.isdir(cache_dir):
+        for name in os.listdir(cache_dir):
+            if name.endswith(".pickle"):
+                os.remove(os.path.join(cache_dir, name))
+                removed += 1
+    return removed
+
+
+# ============================================
+# LOAD-TIME REPORT
+# ============================================
+def main():
+    path = sys.argv[1] if len(sys.argv) > 1 and not sys.argv[1].startswith("-") else DBC_PATH
+    runs = 20
+
+    t0 = time.perf_counter()
+    import cantools
+    t_import = time.perf_counter() - t0
+
+    def best_of(fn):
+        best = float("inf")
+        for _ in range(runs):
+            t = time.perf_counter()
+            fn()
+            best = min(best, time.perf_counter() - t)
+        return best
+
+    t0 = time.perf_counter()
+    cantools.database.load_file(path)
+    t_first = time.perf_counter() - t0
+    t_parse = best_of(lambda: cantools.database.load_file(path))
+    load_dbc(path)   # make sure the cache exists
+    t_cache = best_of(lambda: load_dbc(path))
+
+    print(f"DBC load times for {path} (best of {runs}):")
+    print(f"  import cantools      {t_import * 1000:8.1f} ms  (once per process)")
+    print(f"  first parse          {t_first * 1000:8.2f} ms  (cold, what a new process pays)")
+    print(f"  parse (no cache)     {t_parse * 1000:8.2f} ms")
+    print(f"  load_dbc (cached)    {t_cache * 1000:8.2f} ms  ({t_parse / t_cache:.0f}x faster)")
+    print(f"  cache file           {cache_path(path)}")
+    print("Processes that only need encode/decode should import dbc_codec instead "
+          "and skip cantools entirely.")
+
+
+if __name__ == "__main__":
+    main()
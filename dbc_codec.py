@@ -0,0 +1,220 @@
+"""Compiled codec for vehicle.dbc.
+
+Generated by dbc_codegen.py -- do not edit; rerun the generator after
+changing the DBC.  Decoders return tuples in *_SIGNALS order; encoders
+take physical values and fill a preallocated buffer.  decode_message()
+and encode_message() are dict-based drop-ins for the cantools calls.
+"""
+
+import struct
+
+SOURCE_SHA256 = '8f5eeae18a3f7e3cac78799d1cf57ff991c7c9cd220d590f6370d0e6fc35ae2a'
+
+
+# ---------- EngineData (0x100, 8 bytes) ----------
+ENGINEDATA_ID = 0x100
+ENGINEDATA_SIGNALS = ('RPM', 'Speed', 'Coolant',)
+_BUF_ENGINEDATA = bytearray(8)
+_S_ENGINEDATA = struct.Struct('>HBB4x')
+
+
+def decode_engine_data(data):
+    """EngineData payload -> (RPM, Speed, Coolant)."""
+    if len(data) < 8:
+        raise ValueError(f"EngineData: {len(data)} bytes, expected 8")
+    RPM, Speed, Coolant = _S_ENGINEDATA.unpack_from(data)
+    return (RPM * 4, Speed, Coolant - 40,)
+
+
+def encode_engine_data(RPM, Speed, Coolant, buf=None):
+    """
+    Physical values -> EngineData payload, written into `buf`.
+
+    Without `buf` the message's preallocated buffer is reused and returned:
+    callers that keep the frame must copy it (bytes(...)); can.Message
+    keeps a bytearray as is.
+    """
+    if not 0 <= RPM <= 16383:
+        raise ValueError(f"RPM={RPM} outside [0, 16383]")
+    if not 0 <= Speed <= 255:
+        raise ValueError(f"Speed={Speed} outside [0, 255]")
+    if not -40 <= Coolant <= 215:
+        raise ValueError(f"Coolant={Coolant} outside [-40, 215]")
+    if buf is None:
+        buf = _BUF_ENGINEDATA
+    _S_ENGINEDATA.pack_into(buf, 0, round(RPM / 4), round(Speed), round(Coolant + 40))
+    return buf
+
+
+# ---------- WheelSpeeds (0x200, 8 bytes) ----------
+WHEELSPEEDS_ID = 0x200
+WHEELSPEEDS_SIGNALS = ('WheelSpeed_FL', 'WheelSpeed_FR', 'WheelSpeed_RL', 'WheelSpeed_RR',)
+_BUF_WHEELSPEEDS = bytearray(8)
+_S_WHEELSPEEDS = struct.Struct('<BBBB4x')
+
+
+def decode_wheel_speeds(data):
+    """WheelSpeeds payload -> (WheelSpeed_FL, WheelSpeed_FR, WheelSpeed_RL, WheelSpeed_RR)."""
+    if len(data) < 8:
+        raise ValueError(f"WheelSpeeds: {len(data)} bytes, expected 8")
+    WheelSpeed_FL, WheelSpeed_FR, WheelSpeed_RL, WheelSpeed_RR = _S_WHEELSPEEDS.unpack_from(data)
+    return (WheelSpeed_FL, WheelSpeed_FR, WheelSpeed_RL, WheelSpeed_RR,)
+
+
+def encode_wheel_speeds(WheelSpeed_FL, WheelSpeed_FR, WheelSpeed_RL, WheelSpeed_RR, buf=None):
+    """
+    Physical values -> WheelSpeeds payload, written into `buf`.
+
+    Without `buf` the message's preallocated buffer is reused and returned:
+    callers that keep the frame must copy it (bytes(...)); can.Message
+    keeps a bytearray as is.
+    """
+    if not 0 <= WheelSpeed_FL <= 255:
+        raise ValueError(f"WheelSpeed_FL={WheelSpeed_FL} outside [0, 255]")
+    if not 0 <= WheelSpeed_FR <= 255:
+        raise ValueError(f"WheelSpeed_FR={WheelSpeed_FR} outside [0, 255]")
+    if not 0 <= WheelSpeed_RL <= 255:
+        raise ValueError(f"WheelSpeed_RL={WheelSpeed_RL} outside [0, 255]")
+    if not 0 <= WheelSpeed_RR <= 255:
+        raise ValueError(f"WheelSpeed_RR={WheelSpeed_RR} outside [0, 255]")
+    if buf is None:
+        buf = _BUF_WHEELSPEEDS
+    _S_WHEELSPEEDS.pack_into(buf, 0, round(WheelSpeed_FL), round(WheelSpeed_FR), round(WheelSpeed_RL), round(WheelSpeed_RR))
+    return buf
+
+
+# ---------- GearboxData (0x300, 8 bytes) ----------
+GEARBOXDATA_ID = 0x300
+GEARBOXDATA_SIGNALS = ('Gear', 'TargetGear', 'Clutch1_Tq', 'Clutch2_Tq', 'OilTemp', 'ShiftInProgress',)
+_BUF_GEARBOXDATA = bytearray(8)
+
+
+def decode_gearbox_data(data):
+    """GearboxData payload -> (Gear, TargetGear, Clutch1_Tq, Clutch2_Tq, OilTemp, ShiftInProgress)."""
+    if len(data) < 8:
+        raise ValueError(f"GearboxData: {len(data)} bytes, expected 8")
+    le = int.from_bytes(data[:8], "little")
+    return (le & 0xF, (le >> 4) & 0xF, (le >> 8) & 0xFF, (le >> 16) & 0xFF, ((le >> 24) & 0xFF) - 40, (le >> 32) & 0x1,)
+
+
+def encode_gearbox_data(Gear, TargetGear, Clutch1_Tq, Clutch2_Tq, OilTemp, ShiftInProgress, buf=None):
+    """
+    Physical values -> GearboxData payload, written into `buf`.
+
+    Without `buf` the message's preallocated buffer is reused and returned:
+    callers that keep the frame must copy it (bytes(...)); can.Message
+    keeps a bytearray as is.
+    """
+    if not 0 <= Gear <= 15:
+        raise ValueError(f"Gear={Gear} outside [0, 15]")
+    if not 0 <= TargetGear <= 15:
+        raise ValueError(f"TargetGear={TargetGear} outside [0, 15]")
+    if not 0 <= Clutch1_Tq <= 255:
+        raise ValueError(f"Clutch1_Tq={Clutch1_Tq} outside [0, 255]")
+    if not 0 <= Clutch2_Tq <= 255:
+        raise ValueError(f"Clutch2_Tq={Clutch2_Tq} outside [0, 255]")
+    if not -40 <= OilTemp <= 215:
+        raise ValueError(f"OilTemp={OilTemp} outside [-40, 215]")
+    if not 0 <= ShiftInProgress <= 1:
+        raise ValueError(f"ShiftInProgress={ShiftInProgress} outside [0, 1]")
+    if buf is None:
+        buf = _BUF_GEARBOXDATA
+    le = (
+        (round(Gear) & 0xF) |
+        (round(TargetGear) & 0xF) << 4 |
+        (round(Clutch1_Tq) & 0xFF) << 8 |
+        (round(Clutch2_Tq) & 0xFF) << 16 |
+        (round(OilTemp + 40) & 0xFF) << 24 |
+        (round(ShiftInProgress) & 0x1) << 32
+    )
+    buf[:8] = le.to_bytes(8, "little")
+    return buf
+
+
+# ---------- DriverInputs (0x400, 8 bytes) ----------
+DRIVERINPUTS_ID = 0x400
+DRIVERINPUTS_SIGNALS = ('Throttle', 'Brake', 'SportMode', 'AliveCounter',)
+_BUF_DRIVERINPUTS = bytearray(8)
+
+
+def decode_driver_inputs(data):
+    """DriverInputs payload -> (Throttle, Brake, SportMode, AliveCounter)."""
+    if len(data) < 8:
+        raise ValueError(f"DriverInputs: {len(data)} bytes, expected 8")
+    le = int.from_bytes(data[:8], "little")
+    return (le & 0xFF, (le >> 8) & 0xFF, (le >> 16) & 0x1, (le >> 20) & 0xF,)
+
+
+def encode_driver_inputs(Throttle, Brake, SportMode, AliveCounter, buf=None):
+    """
+    Physical values -> DriverInputs payload, written into `buf`.
+
+    Without `buf` the message's preallocated buffer is reused and returned:
+    callers that keep the frame must copy it (bytes(...)); can.Message
+    keeps a bytearray as is.
+    """
+    if not 0 <= Throttle <= 100:
+        raise ValueError(f"Throttle={Throttle} outside [0, 100]")
+    if not 0 <= Brake <= 100:
+        raise ValueError(f"Brake={Brake} outside [0, 100]")
+    if not 0 <= SportMode <= 1:
+        raise ValueError(f"SportMode={SportMode} outside [0, 1]")
+    if not 0 <= AliveCounter <= 15:
+        raise ValueError(f"AliveCounter={AliveCounter} outside [0, 15]")
+    if buf is None:
+        buf = _BUF_DRIVERINPUTS
+    le = (
+        (round(Throttle) & 0xFF) |
+        (round(Brake) & 0xFF) << 8 |
+        (round(SportMode) & 0x1) << 16 |
+        (round(AliveCounter) & 0xF) << 20
+    )
+    buf[:8] = le.to_bytes(8, "little")
+    return buf
+
+
+# ---------- dispatch tables ----------
+NAMES = {
+    0x100: 'EngineData',
+    0x200: 'WheelSpeeds',
+    0x300: 'GearboxData',
+    0x400: 'DriverInputs',
+}
+SENDERS = {
+    0x100: ('EngineECU',),
+    0x200: ('ABSECU',),
+    0x300: ('TransECU',),
+    0x400: ('Dashboard',),
+}
+SIGNALS = {
+    0x100: ENGINEDATA_SIGNALS,
+    0x200: WHEELSPEEDS_SIGNALS,
+    0x300: GEARBOXDATA_SIGNALS,
+    0x400: DRIVERINPUTS_SIGNALS,
+}
+DECODERS = {
+    0x100: decode_engine_data,
+    0x200: decode_wheel_speeds,
+    0x300: decode_gearbox_data,
+    0x400: decode_driver_inputs,
+}
+ENCODERS = {
+    'EngineData': encode_engine_data,
+    0x100: encode_engine_data,
+    'WheelSpeeds': encode_wheel_speeds,
+    0x200: encode_wheel_speeds,
+    'GearboxData': encode_gearbox_data,
+    0x300: encode_gearbox_data,
+    'DriverInputs': encode_driver_inputs,
+    0x400: encode_driver_inputs,
+}
+
+
+def decode_message(frame_id, data):
+    """Like cantools' db.decode_message(); KeyError for unknown IDs."""
+    return dict(zip(SIGNALS[frame_id], DECODERS[frame_id](data)))
+
+
+def encode_message(name_or_id, signals):
+    """Like cantools' db.encode_message(); returns a new bytes object."""
+    return bytes(ENCODERS[name_or_id](**signals))
@@ -0,0 +1,393 @@
+"""Compile vehicle.dbc into specialized encode/decode functions.
+
+This tool reads the DBC with cantools once, at build time, and writes
+dbc_codec.py, which needs neither cantools nor the DBC at run time:
+- Messages whose signals are all byte-aligned 8/16/32/64-bit fields get a
+  precompiled struct.Struct (one unpack_from / pack_into per frame).
+- Everything else (nibbles, single bits, odd lengths) gets straight-line
+  integer shift-and-mask code.
+- Each message has a preallocated frame buffer that encoders fill in place.
+
+Usage:
+    python dbc_codegen.py            # regenerate dbc_codec.py
+    python dbc_codegen.py --check    # exit 1 if dbc_codec.py is stale
+    python dbc_codegen.py --bench    # equivalence check + speed vs cantools
+"""
+
+import hashlib
+import os
+import random
+import re
+import sys
+import time
+
+LAB_DIR = os.path.dirname(os.path.abspath(__file__))
+DBC_PATH = os.path.join(LAB_DIR, "vehicle.dbc")
+OUT_PATH = os.path.join(LAB_DIR, "dbc_codec.py")
+
+
+def file_sha256(path):
+    with open(path, "rb") as f:
+        return hashlib.sha256(f.read()).hexdigest()
+
+
+def snake(name):
+    """GearboxData -> gearbox_data"""
+    return re.sub(r"(?<=[a-z0-9])([A-Z])", r"_\1", name).lower()
+
+
+def _num(v):
+    """Literal for a scale / offset / limit: int when exact, else float."""
+    if float(v).is_integer():
+        return str(int(v))
+    return repr(float(v))
+
+
+# ============================================
+# LAYOUT ANALYSIS
+# ============================================
+STRUCT_CODES = {8: "B", 16: "H", 32: "I", 64: "Q"}
+
+
+def struct_layout(msg):
+    """
+    Return a struct format for `msg` if every signal is a byte-aligned
+    8/16/32/64-bit field and multi-byte fields agree on byte order, else None.
+    """
+    fields = []
+    orders = set()
+    for sig in msg.signals:
+        if sig.length not in STRUCT_CODES or sig.is_float:
+            return None
+        if sig.byte_order == "little_endian":
+            if sig.start % 8:
+                return None
+            first = sig.start // 8
+        else:
+            # Motorola: start bit is the MSB; byte-aligned when it is bit 7
+            if sig.start % 8 != 7:
+                return None
+            first = sig.start // 8
+        if sig.length > 8:
+            orders.add(sig.byte_order)
+        code = STRUCT_CODES[sig.length]
+        fields.append((first, sig.length // 8, code.lower() if sig.is_signed else code, sig))
+    if len(orders) > 1:
+        return None
+
+    prefix = ">" if orders == {"big_endian"} else "<"
+    fields.sort(key=lambda f: f[0])
+    fmt, pos, order = prefix, 0, []
+    for first, size, code, sig in fields:
+        if first < pos:
+            return None   # overlapping signals
+        if first > pos:
+            fmt += f"{first - pos}x"
+        fmt += code
+        pos = first + size
+        order.append(sig)
+    if pos > msg.length:
+        return None
+    if pos < msg.length:
+        fmt += f"{msg.length - pos}x"
+    return fmt, order
+
+
+def bit_position(sig, length_bytes):
+    """
+    Shift of the signal's LSB in the frame integer.
+
+    Intel signals are placed in int.from_bytes(data, "little"); Motorola
+    signals in int.from_bytes(data, "big").
+    """
+    if sig.byte_order == "little_endian":
+        return sig.start
+    msb = 8 * (sig.start // 8) + (7 - sig.start % 8)   # network bit number
+    return length_bytes * 8 - (msb + sig.length)
+
+
+# ============================================
+# CODE GENERATION
+# ============================================
+def gen_scale_decode(sig, raw):
+    expr = raw
+    if sig.scale != 1:
+        expr = f"{expr} * {_num(sig.scale)}"
+    if sig.offset != 0:
+        expr = f"{expr} + {_num(sig.offset)}" if sig.offset > 0 else f"{expr} - {_num(-sig.offset)}"
+    return expr
+
+
+def gen_scale_encode(sig, value):
+    expr = value
+    if sig.offset != 0:
+        expr = f"{expr} - {_num(sig.offset)}" if sig.offset > 0 else f"{expr} + {_num(-sig.offset)}"
+    if sig.scale != 1:
+        expr = f"({expr}) / {_num(sig.scale)}" if sig.offset != 0 else f"{expr} / {_num(sig.scale)}"
+    return f"round({expr})"
+
+
+def gen_range_check(sig, lines, indent="    "):
+    if sig.minimum is None or sig.maximum is None:
+        return
+    lines.append(f"{indent}if not {_num(sig.minimum)} <= {sig.name} <= {_num(sig.maximum)}:")
+    lines.append(f"{indent}    raise ValueError(f\"{sig.name}={{{sig.name}}} outside "
+                 f"[{_num(sig.minimum)}, {_num(sig.maximum)}]\")")
+
+
+def gen_message(msg):
+    name = msg.name
+    fn = snake(name)
+    upper = name.upper()
+    n = msg.length
+    lines = []
+    layout = struct_layout(msg)
+    sigs = layout[1] if layout else list(msg.signals)
+    names = ", ".join(s.name for s in sigs)
+
+    lines.append(f"# ---------- {name} (0x{msg.frame_id:03X}, {n} bytes) ----------")
+    lines.append(f"{upper}_ID = 0x{msg.frame_id:03X}")
+    lines.append(f"{upper}_SIGNALS = ({', '.join(repr(s.name) for s in sigs)},)")
+    lines.append(f"_BUF_{upper} = bytearray({n})")
+    if layout:
+        lines.append(f"_S_{upper} = struct.Struct({layout[0]!r})")
+    lines.append("")
+    lines.append("")
+
+    # ---- decode ----
+    lines.append(f"def decode_{fn}(data):")
+    lines.append(f"    \"\"\"{name} payload -> ({names}).\"\"\"")
+    lines.append(f"    if len(data) < {n}:")
+    lines.append(f"        raise ValueError(f\"{name}: {{len(data)}} bytes, expected {n}\")")
+    if layout:
+        lines.append(f"    {names}, = _S_{upper}.unpack_from(data)" if len(sigs) == 1
+                     else f"    {names} = _S_{upper}.unpack_from(data)")
+        outs = [gen_scale_decode(s, s.name) for s in sigs]
+    else:
+        if any(s.byte_order == "little_endian" for s in sigs):
+            lines.append(f"    le = int.from_bytes(data[:{n}], \"little\")")
+        if any(s.byte_order == "big_endian" for s in sigs):
+            lines.append(f"    be = int.from_bytes(data[:{n}], \"big\")")
+        outs = []
+        for s in sigs:
+            src = "le" if s.byte_order == "little_endian" else "be"
+            shift = bit_position(s, n)
+            mask = (1 << s.length) - 1
+            raw = f"({src} >> {shift}) & 0x{mask:X}" if shift else f"{src} & 0x{mask:X}"
+            if s.is_signed:
+                lines.append(f"    {s.name} = {raw}")
+                lines.append(f"    if {s.name} & 0x{1 << (s.length - 1):X}:")
+                lines.append(f"        {s.name} -= 0x{1 << s.length:X}")
+                outs.append(gen_scale_decode(s, s.name))
+            else:
+                outs.append(gen_scale_decode(s, f"({raw})") if (s.scale != 1 or s.offset != 0) else raw)
+    lines.append(f"    return ({', '.join(outs)},)")
+    lines.append("")
+    lines.append("")
+
+    # ---- encode ----
+    lines.append(f"def encode_{fn}({names}, buf=None):")
+    lines.append(f"    \"\"\"")
+    lines.append(f"    Physical values -> {name} payload, written into `buf`.")
+    lines.append(f"")
+    lines.append(f"    Without `buf` the message's preallocated buffer is reused and returned:")
+    lines.append(f"    callers that keep the frame must copy it (bytes(...)); can.Message")
+    lines.append(f"    keeps a bytearray as is.")
+    lines.append(f"    \"\"\"")
+    for s in sigs:
+        gen_range_check(s, lines)
+    lines.append(f"    if buf is None:")
+    lines.append(f"        buf = _BUF_{upper}")
+    if layout:
+        args = ", ".join(gen_scale_encode(s, s.name) for s in sigs)
+        lines.append(f"    _S_{upper}.pack_into(buf, 0, {args})")
+    else:
+        le_parts, be_parts = [], []
+        for s in sigs:
+            shift = bit_position(s, n)
+            mask = (1 << s.length) - 1
+            raw = f"({gen_scale_encode(s, s.name)} & 0x{mask:X})"
+            part = f"{raw} << {shift}" if shift else raw
+            (le_parts if s.byte_order == "little_endian" else be_parts).append(part)
+        if le_parts:
+            lines.append("    le = (")
+            for p in le_parts:
+                lines.append(f"        {p} |")
+            lines[-1] = lines[-1][:-2]
+            lines.append("    )")
+        if be_parts:
+            lines.append("    be = (")
+            for p in be_parts:
+                lines.append(f"        {p} |")
+            lines[-1] = lines[-1][:-2]
+            lines.append("    )")
+        if le_parts and be_parts:
+            value = f"le | int.from_bytes(be.to_bytes({n}, \"big\"), \"little\")"
+            lines.append(f"    buf[:{n}] = ({value}).to_bytes({n}, \"little\")")
+        elif le_parts:
+            lines.append(f"    buf[:{n}] = le.to_bytes({n}, \"little\")")
+        else:
+            lines.append(f"    buf[:{n}] = be.to_bytes({n}, \"big\")")
+    lines.append("    return buf")
+    lines.append("")
+    lines.append("")
+    return lines
+
+
+def generate(db, source_path):
+    sha = file_sha256(source_path)
+    out = [
+        f"\"\"\"Compiled codec for {os.path.basename(source_path)}.",
+        "",
+        "Generated by dbc_codegen.py -- do not edit; rerun the generator after",
+        "changing the DBC.  Decoders return tuples in *_SIGNALS order; encoders",
+        "take physical values and fill a preallocated buffer.  decode_message()",
+        "and encode_message() are dict-based drop-ins for the cantools calls.",
+        "\"\"\"",
+        "",
+        "import struct",
+        "",
+        f"SOURCE_SHA256 = {sha!r}",
+        "",
+        "",
+    ]
+    msgs = sorted(db.messages, key=lambda m: m.frame_id)
+    for msg in msgs:
+        out.extend(gen_message(msg))
+
+    out.append("# ---------- dispatch tables ----------")
+    out.append("NAMES = {")
+    for m in msgs:
+        out.append(f"    0x{m.frame_id:03X}: {m.name!r},")
+    out.append("}")
+    out.append("SENDERS = {")
+    for m in msgs:
+        out.append(f"    0x{m.frame_id:03X}: {tuple(m.senders)!r},")
+    out.append("}")
+    out.append("SIGNALS = {")
+    for m in msgs:
+        out.append(f"    0x{m.frame_id:03X}: {m.name.upper()}_SIGNALS,")
+    out.append("}")
+    out.append("DECODERS = {")
+    for m in msgs:
+        out.append(f"    0x{m.frame_id:03X}: decode_{snake(m.name)},")
+    out.append("}")
+    out.append("ENCODERS = {")
+    for m in msgs:
+        out.append(f"    {m.name!r}: encode_{snake(m.name)},")
+        out.append(f"    0x{m.frame_id:03X}: encode_{snake(m.name)},")
+    out.append("}")
+    out.append("")
+    out.append("")
+    out.extend([
+        "def decode_message(frame_id, data):",
+        "    \"\"\"Like cantools' db.decode_message(); KeyError for unknown IDs.\"\"\"",
+        "    return dict(zip(SIGNALS[frame_id], DECODERS[frame_id](data)))",
+        "",
+        "",
+        "def encode_message(name_or_id, signals):",
+        "    \"\"\"Like cantools' db.encode_message(); returns a new bytes object.\"\"\"",
+        "    return bytes(ENCODERS[name_or_id](**signals))",
+        "",
+    ])
+    return "\n".join(out)
+
+
+def load_dbc(path=DBC_PATH):
+    from dbc_cache import load_dbc as cached_load
+    return cached_load(path)
+
+
+def write_codec(dbc_path=DBC_PATH, out_path=OUT_PATH):
+    src = generate(load_dbc(dbc_path), dbc_path)
+    with open(out_path, "w") as f:
+        f.write(src)
+    return out_path
+
+
+def is_stale(dbc_path=DBC_PATH, out_path=OUT_PATH):
+    try:
+        with open(out_path) as f:
+            m = re.search(r"SOURCE_SHA256 = '([0-9a-f]+)'", f.read())
+    except FileNotFoundError:
+        return True
+    return m is None or m.group(1) != file_sha256(dbc_path)
+
+
+# ============================================
+# BENCHMARK
+# ============================================
+def random_values(msg, rng):
+    vals = {}
+    for s in msg.signals:
+        lo, hi = s.minimum, s.maximum
+        raw = rng.randint(0, (1 << s.length) - 1)
+        v = raw * s.scale + s.offset
+        if lo is not None and hi is not None:
+            v = min(max(v, lo), hi)
+        vals[s.name] = v
+    return vals
+
+
+def bench(n=20000):
+    import dbc_codec
+    db = load_dbc()
+    rng = random.Random(1)
+
+    print(f"Round-trip equivalence ({n} random frames per message):")
+    for msg in db.messages:
+        fid = msg.frame_id
+        enc = dbc_codec.ENCODERS[fid]
+        bad = 0
+        for _ in range(n):
+            vals = random_values(msg, rng)
+            a = bytes(db.encode_message(fid, vals))
+            b = bytes(enc(**vals))
+            if a != b or db.decode_message(fid, a) != dbc_codec.decode_message(fid, b):
+                bad += 1
+        print(f"  {msg.name:12} {'OK' if bad == 0 else f'{bad} MISMATCHES'}")
+
+    print("\nThroughput (frames/s):")
+    print(f"  {'message':12} {'cantools enc':>13} {'codec enc':>11} "
+          f"{'cantools dec':>13} {'codec dec':>11} {'codec dec->dict':>16}")
+    for msg in db.messages:
+        fid = msg.frame_id
+        vals = random_values(msg, rng)
+        data = bytes(db.encode_message(fid, vals))
+        enc = dbc_codec.ENCODERS[fid]
+        dec = dbc_codec.DECODERS[fid]
+
+        def rate(fn):
+            t0 = time.perf_counter()
+            for _ in range(n):
+                fn()
+            return n / (time.perf_counter() - t0)
+
+        r = [
+            rate(lambda: db.encode_message(fid, vals)),
+            rate(lambda: enc(**vals)),
+            rate(lambda: db.decode_message(fid, data)),
+            rate(lambda: dec(data)),
+            rate(lambda: dbc_codec.decode_message(fid, data)),
+        ]
+        print(f"  {msg.name:12} {r[0]:13,.0f} {r[1]:11,.0f} {r[2]:13,.0f} {r[3]:11,.0f} {r[4]:16,.0f}")
+
+
+def main():
+    if "--check" in sys.argv:
+        if is_stale():
+            print(f"{os.path.basename(OUT_PATH)} is stale; run python dbc_codegen.py")
+            sys.exit(1)
+        print(f"{os.path.basename(OUT_PATH)} is up to date")
+        return
+    if "--bench" in sys.argv:
+        if is_stale():
+            write_codec()
+        bench()
+        return
+    path = write_codec()
+    print(f"Wrote {path}")
+
+
+if __name__ == "__main__":
+    main()
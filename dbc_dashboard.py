@@ -1,15 +1,13 @@
 import can
-import cantools
 import sys
 import time
 
+import dbc_codec
+
 # Set terminal title
 sys.stdout.write("\033]0;DBC Dashboard\007")
 sys.stdout.flush()
 
-# Load DBC
-db = cantools.database.load_file("/home/jathin/Desktop/CAN_LAB/vehicle.dbc")
-
 bus = can.interface.Bus(channel="vcan0", bustype="socketcan")
 
 print("DBC dashboard listening on vcan0")
@@ -23,9 +21,9 @@ try:
             continue
 
         try:
-            decoded = db.decode_message(msg.arbitration_id, msg.data)
-        except KeyError:
-            # Message ID not in DBC
+            decoded = dbc_codec.decode_message(msg.arbitration_id, msg.data)
+        except (KeyError, ValueError):
+            # Message ID not in DBC, or short frame
             continue
 
         if msg.arbitration_id == 0x100:
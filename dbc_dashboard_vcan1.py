@@ -1,16 +1,13 @@
 import can
-import cantools
 import sys
 import time
 
+import dbc_codec
+
 # Set terminal title
 sys.stdout.write("\033]0;DBC Dashboard (vcan1)\007")
 sys.stdout.flush()
 
-# Load DBC
-DBC_PATH = "/home/jathin/Desktop/CAN_LAB/vehicle.dbc"
-db = cantools.database.load_file(DBC_PATH)
-
 # Use vcan1 (diagnostic side)
 bus = can.interface.Bus(channel="vcan1", bustype="socketcan")
 
@@ -25,7 +22,7 @@ try:
             continue
 
         try:
-            decoded = db.decode_message(msg.arbitration_id, msg.data)
+            decoded = dbc_codec.decode_message(msg.arbitration_id, msg.data)
         except Exception:
             continue
 
@@ -1,26 +1,38 @@
+"""DBC signal logger for the powertrain bus.
+
+Modes:
+- CSV (default): decodes every frame into one dbc_log_*.csv row.
+- --columnar: one compressed time/value column per signal (colog.py),
+  written in chunks with per-chunk min/max.
+- --binary: the receive loop only enqueues raw frames; binlog.py's writer
+  thread batches them into dbc_log_*.canlog.  Decoding is deferred to
+  post-processing (python binlog.py csv <file>), so the full bus can be
+  logged at high frame rates without loss.
+- --capture EXPR: flight recorder (flight_recorder.py); only the seconds
+  around each trigger are written, as dbc_capture_*.canlog.
+
+Every log is added to the log catalog (log_catalog.py) when it is closed.
+
+Rows and records carry the frame's receive timestamp (msg.timestamp, the
+kernel time on SocketCAN), not the time they were written.
+"""
+
+import argparse
 import can
-import cantools
 import csv
+import socket
 import time
 import sys
 
-# Set terminal title
-sys.stdout.write("\033]0;DBC Logger\007")
-sys.stdout.flush()
+# Decoders compiled from vehicle.dbc (regenerate with dbc_codegen.py)
+import dbc_codec
+import binlog
+import colog
+import flight_recorder
+import log_catalog
 
-# Load the DBC database
-db = cantools.database.load_file("vehicle.dbc")
-
-# Open CAN bus
-bus = can.interface.Bus(channel="vcan0", bustype="socketcan")
-
-# Output file name with timestamp
-timestamp_str = time.strftime("%Y%m%d_%H%M%S")
-filename = f"dbc_log_{timestamp_str}.csv"
-
-print(f"DBC logger started on vcan0")
-print(f"Logging decoded signals to {filename}")
-print("Press Ctrl+C to stop.\n")
+# Bigger socket receive buffer so bursts survive a slow consumer
+RCVBUF_BYTES = 4 * 1024 * 1024
 
 # Define all signals we care about from the DBC
 signal_fields = [
@@ -37,6 +49,10 @@ signal_fields = [
     "Clutch2_Tq",
     "OilTemp",
     "ShiftInProgress",
+    "Throttle",
+    "Brake",
+    "SportMode",
+    "AliveCounter",
 ]
 
 # CSV header fields
@@ -48,18 +64,28 @@ fieldnames = [
     "raw_data",
 ] + signal_fields
 
-with open(filename, "w", newline="") as csvfile:
-    writer = csv.DictWriter(csvfile, fieldnames=fieldnames)
-    writer.writeheader()
 
-    try:
+def grow_rcvbuf(bus, size=RCVBUF_BYTES):
+    sock = getattr(bus, "socket", None)
+    if sock is not None:
+        try:
+            sock.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, size)
+        except OSError:
+            pass
+
+
+def log_csv(bus, filename):
+    with open(filename, "w", newline="") as csvfile:
+        writer = csv.DictWriter(csvfile, fieldnames=fieldnames)
+        writer.writeheader()
+
         while True:
             msg = bus.recv(1.0)
             if msg is None:
                 continue
 
             row = {
-                "timestamp": time.time(),
+                "timestamp": msg.timestamp,
                 "can_id": hex(msg.arbitration_id),
                 "name": "",
                 "dlc": msg.dlc,
@@ -68,21 +94,106 @@ with open(filename, "w", newline="") as csvfile:
 
             try:
                 # Find DBC message definition
-                msg_def = db.get_message_by_frame_id(msg.arbitration_id)
-                decoded = db.decode_message(msg.arbitration_id, msg.data)
-                row["name"] = msg_def.name
+                name = dbc_codec.NAMES[msg.arbitration_id]
+                decoded = dbc_codec.decode_message(msg.arbitration_id, msg.data)
+                row["name"] = name
 
                 # Fill known signal fields; leave others blank
                 for sig in signal_fields:
                     row[sig] = decoded.get(sig, "")
 
-            except (KeyError, cantools.database.errors.DecodeError):
+            except (KeyError, ValueError):
                 # Message not in DBC or bad decode; log raw only
                 pass
 
             writer.writerow(row)
 
+
+def log_columnar(bus, writer):
+    while True:
+        msg = bus.recv(1.0)
+        if msg is not None:
+            writer.append_frame(msg.timestamp, msg.arbitration_id, msg.data)
+
+
+def log_binary(bus, writer, report_every=10.0):
+    next_report = time.monotonic() + report_every
+    while True:
+        msg = bus.recv(0.5)
+        if msg is not None:
+            writer.put(msg)
+        if time.monotonic() >= next_report:
+            next_report += report_every
+            print(writer.stats())
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Log vcan traffic decoded with vehicle.dbc")
+    parser.add_argument("--channel", default="vcan0")
+    mode = parser.add_mutually_exclusive_group()
+    mode.add_argument("--binary", action="store_true",
+                      help="raw frames to .canlog via a background writer (decode later)")
+    mode.add_argument("--columnar", action="store_true",
+                      help="per-signal compressed columns (.colog)")
+    flight_recorder.add_capture_args(parser)
+    args = parser.parse_args()
+    if args.capture and (args.binary or args.columnar):
+        parser.error("--capture writes its own .canlog captures; drop --binary/--columnar")
+
+    # Set terminal title
+    sys.stdout.write("\033]0;DBC Logger\007")
+    sys.stdout.flush()
+
+    # Open CAN bus
+    bus = can.interface.Bus(channel=args.channel, bustype="socketcan")
+    grow_rcvbuf(bus)
+
+    if args.capture:
+        print(f"DBC logger (flight recorder) on {args.channel}. Ctrl+C to stop.\n")
+        try:
+            flight_recorder.run_capture(bus, args, prefix="dbc_capture", channel=args.channel,
+                                        on_close=log_catalog.index_closed_log)
+        except ValueError as e:
+            print(e)
+        finally:
+            bus.shutdown()
+        return
+
+    # Output file name with timestamp
+    timestamp_str = time.strftime("%Y%m%d_%H%M%S")
+    ext = "canlog" if args.binary else "colog" if args.columnar else "csv"
+    filename = f"dbc_log_{timestamp_str}.{ext}"
+
+    print(f"DBC logger started on {args.channel}")
+    if args.binary:
+        print(f"Logging raw frames to {filename} (decode with: python binlog.py csv {filename})")
+    elif args.columnar:
+        print(f"Logging signal columns to {filename} (inspect with: python colog.py info {filename})")
+    else:
+        print(f"Logging decoded signals to {filename}")
+    print("Press Ctrl+C to stop.\n")
+
+    writer = None
+    try:
+        if args.binary:
+            writer = binlog.BinaryLogWriter(filename, channel=args.channel)
+            log_binary(bus, writer)
+        elif args.columnar:
+            writer = colog.ColumnarWriter(filename, source=args.channel)
+            log_columnar(bus, writer)
+        else:
+            log_csv(bus, filename)
     except KeyboardInterrupt:
         print("\nDBC logger stopped.")
-        print(f"Log saved to {filename}")
-
+    finally:
+        if writer:
+            writer.close()
+            if args.binary:
+                print(writer.stats())
+        bus.shutdown()
+    print(f"Log saved to {filename}")
+    log_catalog.index_closed_log(filename)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,144 @@
+"""DriverInputs (0x400) on the bus instead of driver_state.txt / tcu_mode.txt.
+
+This module provides:
+- DriverInputSender: the dashboard side; a background thread that sends
+  throttle, brake, D/S mode and a 4-bit alive counter every CYCLE seconds.
+  Slider callbacks only set attributes, nothing is written per callback.
+- DriverInputs: the ECU side; fed with received frames from the ECU's own
+  receive loop (no file I/O per tick).  If no frame arrives for TIMEOUT
+  seconds the pedals read as released (throttle 0, brake 0) until the
+  sender is back; alive-counter gaps are counted as lost frames.
+
+The dashboard sits on the DIAG bus (vcan1); the gateway's driver-inputs
+route forwards 0x400 to the ECUs on PT.
+"""
+
+import threading
+import time
+
+import can
+
+import dbc_codec
+from scheduler import sleep_until
+
+DRIVER_INPUTS_ID = dbc_codec.DRIVERINPUTS_ID
+CYCLE = 0.05            # 20 Hz
+TIMEOUT = 0.5           # pedals released after this long without a frame
+
+MODES = ("D", "S")      # SportMode signal value -> TCU mode
+
+
+def build_frame(throttle, brake, mode, counter):
+    # Copy: the encoder reuses one buffer and can.Message keeps a bytearray as is
+    data = bytes(dbc_codec.encode_driver_inputs(
+        max(0, min(int(throttle), 100)), max(0, min(int(brake), 100)),
+        1 if mode == "S" else 0, counter & 0xF))
+    return can.Message(arbitration_id=DRIVER_INPUTS_ID, data=data, is_extended_id=False)
+
+
+# ============================================
+# SENDER (dashboard)
+# ============================================
+class DriverInputSender(threading.Thread):
+    """Cyclic DriverInputs transmitter; set throttle / brake / mode at will."""
+
+    def __init__(self, bus, cycle=CYCLE):
+        super().__init__(name="driver-inputs", daemon=True)
+        self.bus = bus
+        self.cycle = cycle
+        self.throttle = 0
+        self.brake = 0
+        self.mode = "D"
+        self.counter = 0
+        self.sent = 0
+        self.errors = 0
+        self._halt = threading.Event()
+
+    def run(self):
+        deadline = time.monotonic()
+        while not self._halt.is_set():
+            try:
+                self.bus.send(build_frame(self.throttle, self.brake, self.mode, self.counter))
+                self.sent += 1
+            except can.CanError:
+                self.errors += 1
+            self.counter = (self.counter + 1) & 0xF
+            deadline += self.cycle
+            if deadline < time.monotonic():
+                deadline = time.monotonic()     # fell behind: do not burst
+            sleep_until(deadline)
+
+    def stop(self):
+        self._halt.set()
+        self.join(timeout=1.0)
+
+
+def driver_task(bus, profile, clock):
+    """
+    Dashboard stand-in for lab_runtime.py: each next() sends one
+    DriverInputs frame from a sim_core driver profile at time clock().
+    """
+    counter = 0
+    while True:
+        throttle, brake, mode = profile(clock())
+        bus.send(build_frame(throttle, brake, mode, counter))
+        counter = (counter + 1) & 0xF
+        yield
+
+
+# ============================================
+# RECEIVER (ECUs)
+# ============================================
+class DriverInputs:
+    """Latest driver inputs as seen on the bus, with timeout and alive check."""
+
+    def __init__(self, timeout=TIMEOUT):
+        self.timeout = timeout
+        self.throttle = 0
+        self.brake = 0
+        self.mode = "D"
+        self.counter = None
+        self.age = float("inf")     # seconds since the last frame (advanced by tick())
+        self.received = 0
+        self.lost = 0               # frames missing according to the alive counter
+        self.timeouts = 0
+
+    def update(self, msg):
+        """Feed a received frame; returns True if it was a DriverInputs frame."""
+        if msg.arbitration_id != DRIVER_INPUTS_ID:
+            return False
+        try:
+            throttle, brake, sport, counter = dbc_codec.decode_driver_inputs(msg.data)
+        except ValueError:
+            return True
+        if self.counter is not None:
+            self.lost += (counter - self.counter - 1) & 0xF
+        self.counter = counter
+        self.throttle, self.brake, self.mode = throttle, brake, MODES[sport]
+        self.age = 0.0
+        self.received += 1
+        return True
+
+    def tick(self, dt):
+        """Advance the frame age by one ECU tick; detects a silent sender."""
+        was_alive = self.alive
+        self.age += dt
+        if was_alive and not self.alive:
+            self.timeouts += 1
+
+    @property
+    def alive(self):
+        return self.age <= self.timeout
+
+    def pedals(self):
+        """(throttle %, brake %); released while the sender is timed out."""
+        if not self.alive:
+            return 0, 0
+        return self.throttle, self.brake
+
+    def current_mode(self):
+        return self.mode
+
+    def report(self):
+        return (f"[driver inputs] received={self.received} lost={self.lost} "
+                f"timeouts={self.timeouts} alive={'yes' if self.alive else 'no'}")
@@ -0,0 +1,347 @@
+"""Incremental DTC monitor: compiled fault rules with debounce and fault lifecycle.
+
+This module replaces the old hard-coded inject_faults() checks:
+- Rules come from dtc_rules.json.  A condition is an expression over DBC
+  signal names ("RPM > 2500 and Speed < 15", "abs(WheelSpeed_FL - Speed) >
+  15", "abs(RPM - rpm_from_speed(Speed, Gear)) > 600") compiled once to a
+  code object.  Only arithmetic, comparisons, and/or/not and a few helper
+  functions are allowed.
+- Rules are indexed by the CAN IDs of the signals they read, so a frame
+  decodes once and only re-evaluates the rules that depend on it.
+  "silent" rules (lost communication) are checked from tick(); their
+  timeout only runs once the message has been seen (enable condition), so
+  start-up does not report every node as lost.
+- Each rule keeps a time-based debounce counter: the condition must hold
+  for `for` seconds to fail the test and be false for `heal` seconds to pass
+  it again.
+- Fault lifecycle per DTC: ok -> pending (first failure) -> confirmed
+  (after `confirm` failures) -> aged (no failure for `age` seconds).  A
+  pending DTC that does not fail again for `pending_clear` seconds goes back
+  to ok.  Status changes are reported to a callback (the OBD ECU stores
+  them with a freeze frame in its NVM, dtc_nvm.py, for Mode 02/03/07) and
+  restore() picks the stored status up again after a restart.
+
+Usage:
+    python dtc_monitor.py check LOG          # run the rules over a recorded log
+    python dtc_monitor.py bench --copies 4   # per-frame cost of N x the rule set
+"""
+
+import argparse
+import ast
+import json
+import os
+import time
+
+import dbc_codec
+from sim_core import GEAR_RATIOS, FINAL_DRIVE, TIRE_CIRC_M
+
+LAB_DIR = os.path.dirname(os.path.abspath(__file__))
+RULES_PATH = os.path.join(LAB_DIR, "dtc_rules.json")
+
+# Defaults for keys a rule may leave out (seconds / counts)
+DEFAULTS = {
+    "for": 0.0,             # condition true this long -> test failed
+    "heal": 1.0,            # condition false this long -> test passed
+    "confirm": 2,           # failures (while pending) before confirmed
+    "pending_clear": 60.0,  # pending with no failure this long -> ok
+    "age": 600.0,           # confirmed with no failure this long -> aged
+}
+
+STATES = ("ok", "pending", "confirmed", "aged")
+
+# Signal name -> CAN ID of the message carrying it
+SIGNAL_IDS = {name: fid for fid, names in dbc_codec.SIGNALS.items() for name in names}
+MESSAGE_IDS = {name: fid for fid, name in dbc_codec.NAMES.items()}
+
+
+def rpm_from_speed(speed_kph, gear):
+    """Engine RPM the wheels imply in `gear` (no converter slip)."""
+    ratio = GEAR_RATIOS.get(int(gear), 0.0) * FINAL_DRIVE
+    return speed_kph / 3.6 / TIRE_CIRC_M * 60.0 * ratio
+
+
+FUNCTIONS = {"abs": abs, "min": min, "max": max, "rpm_from_speed": rpm_from_speed}
+
+_ALLOWED = (ast.Expression, ast.BoolOp, ast.And, ast.Or, ast.UnaryOp, ast.Not, ast.USub,
+            ast.BinOp, ast.Add, ast.Sub, ast.Mult, ast.Div, ast.Compare, ast.Eq, ast.NotEq,
+            ast.Lt, ast.LtE, ast.Gt, ast.GtE, ast.Call, ast.Name, ast.Load, ast.Constant)
+
+
+def compile_condition(text):
+    """(code object, signal names) for a rule expression; ValueError if not allowed."""
+    try:
+        tree = ast.parse(text, mode="eval")
+    except SyntaxError as e:
+        raise ValueError(f"bad condition {text!r}: {e.msg}") from None
+    signals = set()
+    for node in ast.walk(tree):
+        if not isinstance(node, _ALLOWED):
+            raise ValueError(f"condition {text!r}: {type(node).__name__} not allowed")
+        if isinstance(node, ast.Call) and not (isinstance(node.func, ast.Name)
+                                               and node.func.id in FUNCTIONS):
+            raise ValueError(f"condition {text!r}: only {', '.join(FUNCTIONS)} can be called")
+        if isinstance(node, ast.Name) and node.id not in FUNCTIONS:
+            if node.id not in SIGNAL_IDS:
+                raise ValueError(f"condition {text!r}: unknown signal {node.id!r}")
+            signals.add(node.id)
+    return compile(tree, f"<rule {text}>", "eval"), signals
+
+
+def load_rules(path=RULES_PATH):
+    with open(path) as f:
+        return json.load(f)["rules"]
+
+
+# ============================================
+# RULES
+# ============================================
+class Rule:
+    """One DTC rule: compiled condition, debounce counter and fault status."""
+
+    def __init__(self, spec):
+        self.dtc = spec["dtc"]
+        self.name = spec.get("name", "")
+        cfg = {k: spec.get(k, v) for k, v in DEFAULTS.items()}
+        self.qualify = float(cfg["for"])
+        self.heal = float(cfg["heal"])
+        self.confirm = int(cfg["confirm"])
+        self.pending_clear = float(cfg["pending_clear"])
+        self.age = float(cfg["age"])
+
+        self.silent = spec.get("silent")
+        if self.silent is not None:
+            if self.silent not in MESSAGE_IDS:
+                raise ValueError(f"{self.dtc}: unknown message {self.silent!r}")
+            self.code, self.signals = None, set()
+            self.ids = {MESSAGE_IDS[self.silent]}
+            # `for` is the silence timeout itself; no extra debounce on top
+            self.timeout, self.qualify = self.qualify, 0.0
+        else:
+            self.code, self.signals = compile_condition(spec["when"])
+            self.ids = {SIGNAL_IDS[s] for s in self.signals}
+
+        self.cond = False           # condition at the last evaluation
+        self.t_last = None
+        self.counter = 0.0          # > 0: seconds failing, < 0: seconds passing
+        self.failed = False         # debounced test result
+        self.status = "ok"
+        self.failures = 0           # failures while pending (towards confirm)
+        self.occurrences = 0        # failures ever (until cleared)
+        self.last_fail = None
+
+    def update(self, cond, ts, monitor):
+        """Feed one evaluation of the condition at time ts."""
+        if self.t_last is not None:
+            # The previous condition held from t_last to ts
+            dt = ts - self.t_last
+            if self.cond:
+                self.counter = min(self.qualify, max(self.counter, 0.0) + dt)
+            else:
+                self.counter = max(-self.heal, min(self.counter, 0.0) - dt)
+        self.t_last = ts
+        self.cond = cond
+
+        if cond and not self.failed and self.counter >= self.qualify:
+            self.failed = True
+            self._fail(ts, monitor)
+        elif not cond and self.failed and self.counter <= -self.heal:
+            self.failed = False
+        if self.failed:
+            self.last_fail = ts
+
+    def _fail(self, ts, monitor):
+        self.occurrences += 1
+        old = self.status
+        if old in ("ok", "aged"):
+            self.failures = 0
+        self.failures += 1
+        if old != "confirmed":
+            self.status = "confirmed" if self.failures >= self.confirm else "pending"
+        self.last_fail = ts
+        if self.status != old or old == "confirmed":
+            monitor._changed(self, old, ts)
+
+    def expire(self, now, monitor):
+        """Pending -> ok and confirmed -> aged once the DTC stayed healthy long enough."""
+        if self.failed or self.last_fail is None:
+            return
+        quiet = now - self.last_fail
+        if self.status == "pending" and quiet >= self.pending_clear:
+            self.status = "ok"
+            monitor._changed(self, "pending", now)
+        elif self.status == "confirmed" and quiet >= self.age:
+            self.status = "aged"
+            monitor._changed(self, "confirmed", now)
+
+    def clear(self):
+        self.counter = 0.0
+        self.failed = False
+        self.status = "ok"
+        self.failures = self.occurrences = 0
+        self.last_fail = None
+
+
+class DtcMonitor:
+    """Evaluates a rule set incrementally, one CAN frame at a time."""
+
+    def __init__(self, rules=None, on_change=None, expire_every=1.0):
+        specs = load_rules() if rules is None else rules
+        self.rules = [Rule(r) for r in specs]
+        self.on_change = on_change          # callback(rule, old status, ts) on changes / new failures
+        self.env = {}                       # latest value of every signal seen
+        self.by_id = {}                     # CAN ID -> rules to evaluate
+        self.silent = [r for r in self.rules if r.silent is not None]
+        for r in self.rules:
+            if r.silent is None:
+                for fid in r.ids:
+                    self.by_id.setdefault(fid, []).append(r)
+        self.watched = {fid for r in self.rules for fid in r.ids}
+        self.globals = {"__builtins__": {}, **FUNCTIONS}
+        self.last_seen = {}
+        self.expire_every = expire_every
+        self.next_expire = None
+        self.frames = 0
+        self.evaluations = 0
+        self.errors = 0
+
+    def on_frame(self, can_id, data, ts):
+        """Decode one frame (if any rule reads it) and re-evaluate those rules."""
+        if can_id not in self.watched:
+            return
+        self.frames += 1
+        self.last_seen[can_id] = ts
+        rules = self.by_id.get(can_id)
+        if not rules:
+            return
+        try:
+            values = dbc_codec.DECODERS[can_id](data)
+        except ValueError:
+            self.errors += 1
+            return
+        env = self.env
+        env.update(zip(dbc_codec.SIGNALS[can_id], values))
+        for rule in rules:
+            try:
+                cond = bool(eval(rule.code, self.globals, env))
+            except NameError:
+                continue                    # an input has not been received yet
+            except ZeroDivisionError:
+                cond = False
+            rule.update(cond, ts, self)
+            self.evaluations += 1
+
+    def tick(self, now):
+        """Check lost-communication rules and age DTCs; cheap, call every loop."""
+        if self.next_expire is None:
+            self.next_expire = now + self.expire_every
+        for rule in self.silent:
+            seen = self.last_seen.get(next(iter(rule.ids)))
+            if seen is not None:
+                rule.update(now - seen > rule.timeout, now, self)
+        if now >= self.next_expire:
+            self.next_expire = now + self.expire_every
+            for rule in self.rules:
+                rule.expire(now, self)
+
+    def _changed(self, rule, old, ts):
+        if self.on_change is not None:
+            self.on_change(rule, old, ts)
+
+    def codes(self, status):
+        return sorted(r.dtc for r in self.rules if r.status == status)
+
+    def restore(self, entries, now):
+        """
+        Seed rule status and occurrences from stored DTCs (dtc_nvm entries)
+        after a restart; aging restarts from `now`.
+        """
+        stored = {e["code"]: e for e in entries}
+        for rule in self.rules:
+            entry = stored.get(rule.dtc)
+            if entry is not None:
+                rule.status = entry["status"]
+                rule.occurrences = entry["occurrences"]
+                rule.failures = rule.confirm if rule.status == "confirmed" else 1
+                rule.last_fail = now
+
+    def clear(self):
+        """Mode 04: forget every DTC's status and counters."""
+        for rule in self.rules:
+            rule.clear()
+
+    def report(self):
+        counts = {s: len(self.codes(s)) for s in STATES if s != "ok"}
+        return (f"[DTC] rules={len(self.rules)} frames={self.frames} evaluations={self.evaluations} "
+                f"errors={self.errors} | " + " ".join(f"{k}={v}" for k, v in counts.items()))
+
+
+# ============================================
+# CLI
+# ============================================
+def print_change(rule, old, ts):
+    print(f"{ts:14.3f}  {rule.dtc}  {old:>9} -> {rule.status:9}  "
+          f"(occurrences={rule.occurrences})  {rule.name}")
+
+
+def check_log(path, rules_path):
+    """Run the rules over a recorded log (any format can_replay.py reads)."""
+    import can_replay
+    monitor = DtcMonitor(load_rules(rules_path), on_change=print_change)
+    start = time.perf_counter()
+    for ts, can_id, data, _ in can_replay.open_log(path):
+        monitor.on_frame(can_id, data, ts)
+        monitor.tick(ts)
+    secs = time.perf_counter() - start
+    print(monitor.report())
+    print(f"{monitor.frames} frames in {secs:.2f} s ({monitor.frames / max(secs, 1e-9):.0f} frames/s)")
+    for status in ("confirmed", "pending", "aged"):
+        print(f"{status:>9}: {', '.join(monitor.codes(status)) or '-'}")
+
+
+def bench(rules_path, copies, seconds):
+    """Per-frame cost with `copies` x the rule set on a lab_runtime traffic recording."""
+    import lab_runtime
+    rt = lab_runtime.LabRuntime()
+    lab_runtime.build_lab(rt, driver="launch")
+    tap = rt.bus("vcan0")
+    frames = []
+    for _ in range(int(seconds / rt.tick)):
+        rt.step()
+        while tap.queue:
+            msg = tap.recv(0.0)
+            frames.append((msg.timestamp, msg.arbitration_id, bytes(msg.data)))
+    rt.shutdown()
+
+    specs = load_rules(rules_path)
+    rules = [dict(r, dtc=f"{r['dtc']}.{i}") for i in range(copies) for r in specs]
+    monitor = DtcMonitor(rules)
+    start = time.perf_counter()
+    for ts, can_id, data in frames:
+        monitor.on_frame(can_id, data, ts)
+        monitor.tick(ts)
+    secs = time.perf_counter() - start
+    per_frame = secs / len(frames) * 1e6
+    print(f"{len(monitor.rules)} rules, {len(frames)} frames ({seconds:g} s of lab traffic)")
+    print(f"{per_frame:.1f} us/frame, {monitor.evaluations / len(frames):.1f} evaluations/frame, "
+          f"capacity {len(frames) / secs:.0f} frames/s")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="DTC rule engine tools")
+    parser.add_argument("--rules", default=RULES_PATH)
+    sub = parser.add_subparsers(dest="cmd", required=True)
+    p = sub.add_parser("check", help="run the rules over a log")
+    p.add_argument("log")
+    p = sub.add_parser("bench", help="per-frame evaluation cost")
+    p.add_argument("--copies", type=int, default=4, help="replicate the rule set N times")
+    p.add_argument("--seconds", type=float, default=60.0, help="simulated traffic")
+    args = parser.parse_args()
+
+    if args.cmd == "check":
+        check_log(args.log, args.rules)
+    else:
+        bench(args.rules, args.copies, args.seconds)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,240 @@
+"""Emulated ECU non-volatile memory for DTCs and Mode 02 freeze frames.
+
+This module gives the OBD ECU an NVM that survives restarts:
+- A fixed-layout file (dtc_nvm.bin) mapped with mmap: a header and SLOTS
+  fixed-size records, one per stored DTC, with its status, occurrence
+  counter, first/last failure time and the freeze frame captured when the
+  fault was first stored.
+- Writes are a struct.pack_into() into the mapping: no syscall and no
+  fsync on the receive path.  The kernel writes the dirty page back (a
+  crash of the ECU process loses nothing); flush() / close() force it.
+- FREEZE is the freeze frame record, already in OBD encoding (PID 0C, 0D,
+  05 data bytes and the gear).  The ECU keeps it current in a preallocated
+  buffer on every EngineData/GearboxData frame, so storing a fault copies
+  bytes instead of sampling anything.
+- Freeze frame numbers (Mode 02) count stored DTCs in the order they were
+  first stored: frame 0 is the oldest.
+
+Usage:
+    python dtc_nvm.py show           # stored DTCs and freeze frames
+    python dtc_nvm.py clear          # erase the NVM (like Mode 04)
+    python dtc_nvm.py bench          # cost of one record() on the receive path
+"""
+
+import argparse
+import mmap
+import os
+import struct
+import time
+
+LAB_DIR = os.path.dirname(os.path.abspath(__file__))
+NVM_PATH = os.environ.get("CAN_LAB_NVM", os.path.join(LAB_DIR, "dtc_nvm.bin"))
+
+MAGIC = b"CANLBNVM"
+VERSION = 1
+SLOTS = 32
+
+# magic, version, slot count, next freeze frame sequence number
+HEADER = struct.Struct("<8sHHI")
+# code, status, flags, occurrences, sequence, first / last failure (unix time), freeze frame
+SLOT = struct.Struct("<5sBBxHIdd8s")
+# RPM x 4 (PID 0C), speed (0D), coolant + 40 (05), gear
+FREEZE = struct.Struct(">HBBB3x")
+
+STATUS_CODES = {"pending": 1, "confirmed": 2, "aged": 3}
+STATUS_NAMES = {v: k for k, v in STATUS_CODES.items()}
+FLAG_FREEZE = 0x01
+EVICT_ORDER = ("aged", "pending")   # statuses a full NVM may overwrite, first choice first
+
+
+def encode_freeze(rpm, speed, coolant, gear):
+    """Freeze frame bytes from physical values (clamped like the Mode 01 PIDs)."""
+    return FREEZE.pack(max(0, min(int(rpm), 16383)) * 4,
+                       max(0, min(int(speed), 255)),
+                       max(0, min(int(coolant) + 40, 255)),
+                       int(gear) & 0xFF)
+
+
+def decode_freeze(data):
+    rpm_raw, speed, coolant, gear = FREEZE.unpack(data)
+    return {"rpm": rpm_raw / 4, "speed": speed, "coolant": coolant - 40, "gear": gear}
+
+
+class DtcNvm:
+    """DTC records in a memory-mapped file (path=None: anonymous, nothing persists)."""
+
+    def __init__(self, path=NVM_PATH, slots=SLOTS):
+        self.path = path
+        self.slots = slots
+        size = HEADER.size + slots * SLOT.size
+        if path is None:
+            self.file = None
+            self.mm = mmap.mmap(-1, size)
+        else:
+            fresh = not os.path.exists(path) or os.path.getsize(path) != size
+            self.file = open(path, "w+b" if fresh else "r+b")
+            if fresh:
+                self.file.truncate(size)
+            self.mm = mmap.mmap(self.file.fileno(), size)
+        magic, version, count, self.seq = HEADER.unpack_from(self.mm, 0)
+        if (magic, version, count) != (MAGIC, VERSION, slots):
+            self.format()
+        self.index = {}             # code -> slot number
+        for i in range(slots):
+            code, status = SLOT.unpack_from(self.mm, self._offset(i))[:2]
+            if status:
+                self.index[code.decode("ascii")] = i
+        self.writes = 0
+        self.dropped = 0
+
+    def _offset(self, slot):
+        return HEADER.size + slot * SLOT.size
+
+    def format(self):
+        """Erase every slot and write a fresh header."""
+        self.mm[:] = bytes(len(self.mm))
+        self.seq = 0
+        HEADER.pack_into(self.mm, 0, MAGIC, VERSION, self.slots, self.seq)
+        self.index = {}
+
+    def _free_slot(self):
+        used = set(self.index.values())
+        for i in range(self.slots):
+            if i not in used:
+                return i
+        # Full: overwrite the oldest aged (then pending) DTC, never a confirmed one
+        for status in EVICT_ORDER:
+            victims = [e for e in self.entries() if e["status"] == status]
+            if victims:
+                victim = min(victims, key=lambda e: e["seq"])
+                del self.index[victim["code"]]
+                return victim["slot"]
+        return None
+
+    def record(self, code, status, occurrences, freeze, ts=None):
+        """
+        Store a DTC's status and occurrence counter.  A new DTC (or one that
+        fails again after aging) also takes the freeze frame bytes `freeze`.
+        Returns False if the NVM is full of confirmed DTCs.
+        """
+        ts = time.time() if ts is None else ts
+        slot = self.index.get(code)
+        if slot is None:
+            slot = self._free_slot()
+            if slot is None:
+                self.dropped += 1
+                return False
+            self.index[code] = slot
+            old = None
+        else:
+            old = SLOT.unpack_from(self.mm, self._offset(slot))
+
+        if old is None or (STATUS_NAMES[old[1]] == "aged" and status != "aged"):
+            # New fault episode: new freeze frame, at the end of the frame order
+            seq, first_ts, frozen = self.seq, ts, freeze
+            self.seq += 1
+            HEADER.pack_into(self.mm, 0, MAGIC, VERSION, self.slots, self.seq)
+        else:
+            seq, first_ts, frozen = old[4], old[5], old[7]
+        SLOT.pack_into(self.mm, self._offset(slot), code.encode("ascii"), STATUS_CODES[status],
+                       FLAG_FREEZE, min(occurrences, 0xFFFF), seq, first_ts, ts, bytes(frozen))
+        self.writes += 1
+        return True
+
+    def erase(self, code):
+        """Forget one DTC and its freeze frame (a pending DTC that healed)."""
+        slot = self.index.pop(code, None)
+        if slot is not None:
+            self.mm[self._offset(slot):self._offset(slot) + SLOT.size] = bytes(SLOT.size)
+            self.writes += 1
+
+    def clear(self):
+        """Mode 04: erase every DTC and freeze frame."""
+        self.format()
+        self.writes += 1
+
+    def entries(self):
+        """Stored DTCs as dicts, oldest first."""
+        out = []
+        for code, slot in self.index.items():
+            _, status, flags, occ, seq, first_ts, last_ts, freeze = SLOT.unpack_from(
+                self.mm, self._offset(slot))
+            out.append({"code": code, "slot": slot, "status": STATUS_NAMES[status], "seq": seq,
+                        "occurrences": occ, "first": first_ts, "last": last_ts,
+                        "freeze": freeze if flags & FLAG_FREEZE else None})
+        return sorted(out, key=lambda e: e["seq"])
+
+    def codes(self, status):
+        return sorted(code for code, slot in self.index.items()
+                      if self.mm[self._offset(slot) + 5] == STATUS_CODES[status])
+
+    def freeze_frames(self):
+        """[(code, freeze bytes)] in Mode 02 frame number order."""
+        return [(e["code"], e["freeze"]) for e in self.entries() if e["freeze"] is not None]
+
+    def flush(self):
+        if self.file is not None:
+            self.mm.flush()
+
+    def close(self):
+        self.flush()
+        self.mm.close()
+        if self.file is not None:
+            self.file.close()
+
+
+# ============================================
+# CLI
+# ============================================
+def show(nvm):
+    entries = nvm.entries()
+    print(f"{nvm.path}: {len(entries)}/{nvm.slots} slots used")
+    for frame, e in enumerate(entries):
+        first = time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(e["first"]))
+        ff = decode_freeze(e["freeze"])
+        print(f"  frame {frame}: {e['code']} {e['status']:9} occurrences={e['occurrences']:<4} "
+              f"first={first}  rpm={ff['rpm']:.0f} speed={ff['speed']} "
+              f"coolant={ff['coolant']} gear={ff['gear']}")
+
+
+def bench(count):
+    """Per-call cost of record() as the ECU loop sees it (anonymous mapping)."""
+    nvm = DtcNvm(None)
+    freeze = bytearray(encode_freeze(2500, 80, 90, 4))
+    codes = [f"P{i:04d}" for i in range(nvm.slots)]
+    start = time.perf_counter()
+    for i in range(count):
+        nvm.record(codes[i % len(codes)], "confirmed", i, freeze)
+    secs = time.perf_counter() - start
+    print(f"record(): {secs / count * 1e6:.2f} us/call over {count} calls ({nvm.slots} slots)")
+    start = time.perf_counter()
+    for _ in range(count // 100):
+        nvm.freeze_frames()
+    secs = time.perf_counter() - start
+    print(f"freeze_frames() with {nvm.slots} DTCs: {secs / (count // 100) * 1e6:.1f} us/call")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Emulated DTC NVM tools")
+    parser.add_argument("--path", default=NVM_PATH)
+    sub = parser.add_subparsers(dest="cmd", required=True)
+    sub.add_parser("show", help="list stored DTCs and freeze frames")
+    sub.add_parser("clear", help="erase the NVM")
+    p = sub.add_parser("bench", help="cost of one write")
+    p.add_argument("--count", type=int, default=200000)
+    args = parser.parse_args()
+
+    if args.cmd == "bench":
+        bench(args.count)
+        return
+    nvm = DtcNvm(args.path)
+    if args.cmd == "clear":
+        nvm.clear()
+        print(f"{args.path}: erased")
+    else:
+        show(nvm)
+    nvm.close()
+
+
+if __name__ == "__main__":
+    main()
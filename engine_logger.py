@@ -1,12 +1,11 @@
+import argparse
 import can
 import csv
 import time
 import sys
 
-sys.stdout.write("\033]0;Logger\007")
-sys.stdout.flush()
-
-bus = can.interface.Bus(channel="vcan0", bustype="socketcan")
+import flight_recorder
+import log_catalog
 
 def decode(msg):
     if msg.arbitration_id != 0x100:
@@ -17,18 +16,46 @@ def decode(msg):
     cool = d[3] - 40
     return rpm, speed, cool
 
-filename = f"engine_log_{int(time.time())}.csv"
-print(f"Logging to {filename} ... Ctrl+C to stop")
+def log_csv(bus):
+    filename = f"engine_log_{int(time.time())}.csv"
+    print(f"Logging to {filename} ... Ctrl+C to stop")
+
+    with open(filename, "w", newline="") as f:
+        writer = csv.writer(f)
+        writer.writerow(["timestamp","rpm","speed_kph","coolant_c"])
+
+        try:
+            for msg in bus:
+                frame = decode(msg)
+                if not frame:
+                    continue
+                writer.writerow([msg.timestamp, *frame])
+        except KeyboardInterrupt:
+            print("\nLogger stopped.")
+
+    log_catalog.index_closed_log(filename)
 
-with open(filename, "w", newline="") as f:
-    writer = csv.writer(f)
-    writer.writerow(["timestamp","rpm","speed_kph","coolant_c"])
+def main():
+    parser = argparse.ArgumentParser(description="Log EngineData (0x100) from vcan0")
+    # Capture mode records every frame on the bus around each trigger
+    flight_recorder.add_capture_args(parser)
+    args = parser.parse_args()
+
+    sys.stdout.write("\033]0;Logger\007")
+    sys.stdout.flush()
+
+    bus = can.interface.Bus(channel="vcan0", bustype="socketcan")
 
     try:
-        for msg in bus:
-            frame = decode(msg)
-            if not frame:
-                continue
-            writer.writerow([time.time(), *frame])
-    except KeyboardInterrupt:
-        print("\nLogger stopped.")
+        if args.capture:
+            flight_recorder.run_capture(bus, args, prefix="engine_capture", channel="vcan0",
+                                        on_close=log_catalog.index_closed_log)
+        else:
+            log_csv(bus)
+    except ValueError as e:
+        print(e)
+    finally:
+        bus.shutdown()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,256 @@
+"""Triggered flight recorder for the logging tools.
+
+Instead of logging everything, keep the last few seconds of raw frames in
+memory and only write a capture when something interesting happens:
+- FrameRing: a preallocated ring of binlog.py 24-byte records; recording a
+  frame is one struct.pack_into, nothing is allocated per frame.
+- Triggers are small expressions checked against each frame:
+      RPM>6500                 DBC signal (decoded only for its message)
+      ShiftInProgress==1
+      0x7E8[1]==0x43           raw byte: CAN ID, byte index, value
+      mode03                   alias for an OBD Mode 03 response
+  They fire on the rising edge (false -> true), so a long RPM>6500 stretch
+  gives one capture, not thousands.
+- FlightRecorder: after a trigger it keeps recording for the post window,
+  then writes [trigger - pre, trigger + post] as a .canlog capture
+  (readable with binlog.py / colog.py convert).
+
+Used by dbc_logger.py --capture and engine_logger.py --capture.
+"""
+
+import operator
+import re
+import time
+
+import binlog
+import dbc_codec
+
+RECORD = binlog.RECORD
+
+TRIGGER_ALIASES = {
+    "mode03": "0x7E8[1]==0x43",     # OBD Mode 03 (stored DTCs) response
+}
+
+OPS = {
+    "==": operator.eq,
+    "!=": operator.ne,
+    ">=": operator.ge,
+    "<=": operator.le,
+    ">": operator.gt,
+    "<": operator.lt,
+}
+
+_EXPR = re.compile(r"^\s*(?:(?P<id>0x[0-9A-Fa-f]+|\d+)\[(?P<byte>\d+)\]|(?P<sig>\w+))"
+                   r"\s*(?P<op>==|!=|>=|<=|>|<)\s*(?P<val>[-+]?(?:0x[0-9A-Fa-f]+|[\d.]+))\s*$")
+
+# Signal name -> (frame ID, index in the decoder's tuple)
+SIGNAL_INDEX = {name: (fid, i)
+                for fid, names in dbc_codec.SIGNALS.items()
+                for i, name in enumerate(names)}
+
+
+# ============================================
+# TRIGGERS
+# ============================================
+class Trigger:
+    """One compiled trigger expression with rising-edge detection."""
+
+    def __init__(self, text):
+        self.text = text
+        m = _EXPR.match(TRIGGER_ALIASES.get(text.strip(), text))
+        if m is None:
+            raise ValueError(f"bad trigger {text!r} (want e.g. RPM>6500, 0x7E8[1]==0x43)")
+        self.op = OPS[m["op"]]
+        try:
+            self.value = int(m["val"], 0)
+        except ValueError:
+            self.value = float(m["val"])
+        if m["sig"]:
+            if m["sig"] not in SIGNAL_INDEX:
+                raise ValueError(f"trigger {text!r}: unknown signal {m['sig']!r}")
+            self.can_id, self.index = SIGNAL_INDEX[m["sig"]]
+            self.decoder = dbc_codec.DECODERS[self.can_id]
+            self.byte = None
+        else:
+            self.can_id = int(m["id"], 0)
+            self.byte = int(m["byte"])
+            self.decoder = None
+        self.active = False
+        self.fired = 0
+
+    def check(self, can_id, data):
+        """True on the frame where the condition becomes true."""
+        if can_id != self.can_id:
+            return False
+        if self.decoder is not None:
+            try:
+                v = self.decoder(data)[self.index]
+            except ValueError:
+                return False
+        elif self.byte < len(data):
+            v = data[self.byte]
+        else:
+            return False
+        now = self.op(v, self.value)
+        rising = now and not self.active
+        self.active = now
+        if rising:
+            self.fired += 1
+        return rising
+
+
+# ============================================
+# RING BUFFER
+# ============================================
+class FrameRing:
+    """Fixed-capacity ring of raw frame records, oldest overwritten first."""
+
+    def __init__(self, capacity):
+        self.capacity = capacity
+        self.buf = bytearray(capacity * RECORD.size)
+        self.head = 0          # next slot to write
+        self.count = 0         # valid records (<= capacity)
+        self.total = 0         # records ever written
+
+    def append(self, ts, can_id, dlc, flags, data):
+        RECORD.pack_into(self.buf, self.head * RECORD.size, ts, can_id, dlc, flags, data)
+        self.head = (self.head + 1) % self.capacity
+        if self.count < self.capacity:
+            self.count += 1
+        self.total += 1
+
+    def oldest_timestamp(self):
+        if self.count == 0:
+            return None
+        first = (self.head - self.count) % self.capacity
+        return RECORD.unpack_from(self.buf, first * RECORD.size)[0]
+
+    def window(self, t_start, t_end):
+        """Raw record bytes with t_start <= timestamp <= t_end, oldest first."""
+        size = RECORD.size
+        first = (self.head - self.count) % self.capacity
+        out = bytearray()
+        # Timestamps are non-decreasing around the ring, so a linear scan
+        # from the oldest record is enough (a capture happens rarely).
+        for k in range(self.count):
+            off = ((first + k) % self.capacity) * size
+            ts = RECORD.unpack_from(self.buf, off)[0]
+            if ts < t_start:
+                continue
+            if ts > t_end:
+                break
+            out += self.buf[off:off + size]
+        return out
+
+
+# ============================================
+# RECORDER
+# ============================================
+class FlightRecorder:
+    """
+    Feed every frame to on_frame(); captures are written as
+    <prefix>_<time>_<n>.canlog once the post-trigger window has passed.
+    """
+
+    def __init__(self, triggers, pre=10.0, post=5.0, capacity=200_000,
+                 prefix="capture", channel="", verbose=True, on_close=None):
+        self.triggers = [t if isinstance(t, Trigger) else Trigger(t) for t in triggers]
+        self.pre = pre
+        self.post = post
+        self.ring = FrameRing(capacity)
+        self.prefix = prefix
+        self.channel = channel
+        self.verbose = verbose
+        self.pending = None        # (trigger time, trigger text)
+        self.merged = 0            # triggers that fired inside a pending capture
+        self.captures = []         # written file paths
+        self.on_close = on_close   # called with each capture path once written
+
+    def on_frame(self, msg):
+        ts = msg.timestamp
+        data = bytes(msg.data[:8])
+        self.ring.append(ts, msg.arbitration_id, msg.dlc, binlog.frame_flags(msg), data)
+
+        for trig in self.triggers:
+            if trig.check(msg.arbitration_id, data):
+                if self.pending is None:
+                    self.pending = (ts, trig.text)
+                    if self.verbose:
+                        print(f"[recorder] trigger {trig.text} at {ts:.3f}")
+                else:
+                    self.merged += 1
+
+        self.poll(ts)
+
+    def poll(self, now=None):
+        """Write the pending capture once its post window is over."""
+        if self.pending is None:
+            return None
+        now = time.time() if now is None else now
+        t_trig, _ = self.pending
+        if now < t_trig + self.post:
+            return None
+        return self.flush()
+
+    def flush(self):
+        """Write the pending capture now (e.g. at shutdown)."""
+        if self.pending is None:
+            return None
+        t_trig, text = self.pending
+        self.pending = None
+        oldest = self.ring.oldest_timestamp()
+        if self.verbose and oldest is not None and oldest > t_trig - self.pre and \
+                self.ring.count == self.ring.capacity:
+            print(f"[recorder] ring too small: only {t_trig - oldest:.1f} s of pre-trigger history")
+
+        records = self.ring.window(t_trig - self.pre, t_trig + self.post)
+        stamp = time.strftime("%Y%m%d_%H%M%S", time.localtime(t_trig))
+        path = f"{self.prefix}_{stamp}_{len(self.captures) + 1}.canlog"
+        with open(path, "wb") as f:
+            binlog.write_header(f, self.channel, start=t_trig)
+            f.write(records)
+        self.captures.append(path)
+        if self.verbose:
+            print(f"[recorder] {text}: wrote {len(records) // RECORD.size} frames "
+                  f"({self.pre:g} s before, {self.post:g} s after) to {path}")
+        if self.on_close is not None:
+            self.on_close(path)
+        return path
+
+    def stats(self):
+        fired = ", ".join(f"{t.text}={t.fired}" for t in self.triggers)
+        return (f"[recorder] frames seen={self.ring.total} captures={len(self.captures)} "
+                f"merged={self.merged} | triggers: {fired}")
+
+
+def add_capture_args(parser):
+    """--capture / --pre / --post / --ring options shared by the loggers."""
+    parser.add_argument("--capture", action="append", metavar="EXPR",
+                        help="flight-recorder mode: write a capture when EXPR fires "
+                             "(e.g. 'RPM>6500', 'ShiftInProgress==1', mode03); repeatable")
+    parser.add_argument("--pre", type=float, default=10.0, help="seconds kept before a trigger")
+    parser.add_argument("--post", type=float, default=5.0, help="seconds recorded after a trigger")
+    parser.add_argument("--ring", type=int, default=200_000,
+                        help="ring capacity in frames (must cover pre + post at bus rate)")
+
+
+def run_capture(bus, args, prefix, channel="", on_close=None):
+    """Blocking capture loop used by the logger scripts (Ctrl+C to stop)."""
+    rec = FlightRecorder(args.capture, pre=args.pre, post=args.post, capacity=args.ring,
+                         prefix=prefix, channel=channel, on_close=on_close)
+    print(f"Flight recorder: {', '.join(t.text for t in rec.triggers)} | "
+          f"pre={args.pre:g} s post={args.post:g} s ring={args.ring} frames "
+          f"({args.ring * RECORD.size / 1e6:.1f} MB)")
+    try:
+        while True:
+            msg = bus.recv(0.5)
+            if msg is None:
+                rec.poll()
+                continue
+            rec.on_frame(msg)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        rec.flush()
+        print(rec.stats())
+    return rec
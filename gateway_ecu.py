@@ -3,62 +3,457 @@
 This node:
 - Bridges messages between PT (vcan0) and DIAG (vcan1) buses.
 - Forwards OBD-style request/response frames for diagnostics.
+- Waits on both CAN sockets with one selector (epoll on Linux) and drains
+  everything that is ready on each wakeup, so neither bus waits behind the
+  other's idle timeout.
+- Measures forwarding latency (kernel receive timestamp -> sent) as a
+  rolling histogram, reported every few seconds and on exit.
+- Opens the PT / DIAG channels named in gateway_routes.json ("buses",
+  vcan0 / vcan1 by default).
+- Routes by table (gateway_routes.json): explicit IDs and/or every DBC
+  message sent by given nodes.  Matching SocketCAN filters are installed on
+  each side so the kernel drops unrouted IDs before they reach Python.
+- Keeps frame / byte / drop counters per route.
+- Optional OBD proxy (--proxy): keeps the latest EngineData / GearboxData
+  from PT and answers single-frame Mode 01 requests for the engine (0x7E0)
+  and TCU (0x7E1) PIDs directly on DIAG while that data is younger than
+  --max-age.  Anything else (other modes, functional requests, stale data,
+  multi-frame responses) is forwarded to the ECU as before.
+
+Run it directly for the standalone SocketCAN node, or import gateway_task()
+to host it in lab_runtime.py.
 """
 
+import argparse
 import can
+import json
+import os
+import selectors
 import sys
 import time
+from collections import Counter
+
+import dbc_codec
+import isotp
+import obd_pids
+from scheduler import RollingHistogram
+
+LAB_DIR = os.path.dirname(os.path.abspath(__file__))
+ROUTES_PATH = os.path.join(LAB_DIR, "gateway_routes.json")
+SIDES = ("PT", "DIAG")
+DEFAULT_CHANNELS = {"PT": "vcan0", "DIAG": "vcan1"}
+
+# Matches (almost) nothing: an empty filter list would mean "accept all"
+NO_FRAMES_FILTER = {"can_id": 0, "can_mask": 0x1FFFFFFF, "extended": True}
+
+# Finer than the scheduler's jitter buckets: the target is well under 1 ms
+LATENCY_EDGES_MS = (0.02, 0.05, 0.1, 0.2, 0.5, 1.0, 2.0, 5.0, 10.0, 20.0)
+LATENCY_TARGET_MS = 1.0
+
+# OBD proxy: EngineData comes every 0.1 s, so one lost frame is still fresh
+PROXY_MAX_AGE = 0.25
+
+# ============================================
+# ROUTING TABLE
+# ============================================
+def _parse_id(v):
+    return int(v, 0) if isinstance(v, str) else int(v)
+
+def load_routes(path=ROUTES_PATH):
+    """
+    Read the route list from JSON.  Each route has name / src / dst and
+    `ids` (explicit list) and/or `dbc_senders` (every DBC message whose
+    transmitter is one of these nodes).
+    """
+    with open(path) as f:
+        cfg = json.load(f)
+
+    routes = []
+    for r in cfg["routes"]:
+        if r["src"] not in SIDES or r["dst"] not in SIDES or r["src"] == r["dst"]:
+            raise ValueError(f"route {r.get('name')!r}: src/dst must be two of {SIDES}")
+        ids = [_parse_id(v) for v in r.get("ids", [])]
+        senders = set(r.get("dbc_senders", []))
+        ids += [fid for fid, tx in dbc_codec.SENDERS.items() if senders & set(tx)]
+        routes.append({
+            "name": r["name"],
+            "src": r["src"],
+            "dst": r["dst"],
+            "ids": sorted(set(ids)),
+            "frames": 0,
+            "bytes": 0,
+            "drops": 0,
+        })
+    return routes
+
+def load_channels(path=ROUTES_PATH):
+    """{side: CAN channel} from the "buses" mapping; sides it omits keep the default."""
+    with open(path) as f:
+        buses = json.load(f).get("buses", {})
+    unknown = set(buses) - set(SIDES)
+    if unknown:
+        raise ValueError(f"buses: unknown side(s) {sorted(unknown)}, expected {SIDES}")
+    return dict(DEFAULT_CHANNELS, **buses)
+
+def build_table(routes):
+    """{side: {arbitration_id: route}}; one route per ID and source side."""
+    table = {side: {} for side in SIDES}
+    for r in routes:
+        for aid in r["ids"]:
+            other = table[r["src"]].get(aid)
+            if other is not None:
+                raise ValueError(f"0x{aid:03X} on {r['src']} routed twice "
+                                 f"({other['name']}, {r['name']})")
+            table[r["src"]][aid] = r
+    return table
+
+def kernel_filters(side_table):
+    """SocketCAN filters accepting exactly the routed IDs of one side."""
+    if not side_table:
+        return [NO_FRAMES_FILTER]
+    return [{"can_id": aid, "can_mask": 0x7FF, "extended": False}
+            for aid in sorted(side_table)]
+
+def install_filters(buses, table):
+    for side, bus in buses.items():
+        bus.set_filters(kernel_filters(table[side]))
+
+def describe_routes(routes):
+    lines = []
+    for r in routes:
+        ids = ", ".join(f"0x{aid:03X}" for aid in r["ids"]) or "-"
+        lines.append(f"  {r['name']:14} {r['src']:>4} -> {r['dst']:4} : {ids}")
+    return "\n".join(lines)
+
+def route_counters(routes, unrouted):
+    cells = [f"{r['name']}={r['frames']}f/{r['bytes']}B/{r['drops']}d" for r in routes]
+    cells.append(f"unrouted={unrouted['PT']}+{unrouted['DIAG']}")
+    return " ".join(cells)
+
+# ============================================
+# OBD PROXY
+# ============================================
+def engine_pids(d):
+    """Mode 01 data the engine ECU would send for EngineData bytes d."""
+    rpm = min(((d[0] << 8) | d[1]) * 4, 16383) * 4
+    return {0x05: [d[3]], 0x0C: [rpm >> 8, rpm & 0xFF], 0x0D: [d[2]]}
+
+def gearbox_pids(d):
+    """Mode 01 data the TCU would send for GearboxData bytes d."""
+    return {0xA4: obd_pids.encode_gear(int(dbc_codec.decode_gearbox_data(d)[0]))}
+
+class ObdProxy:
+    """Mode 01 answers from the latest PT broadcast data instead of a round trip to the ECU."""
+
+    # PT frame ID -> (physical request ID of the ECU it stands in for, PID encoder)
+    SOURCES = {0x100: (0x7E0, engine_pids), 0x300: (0x7E1, gearbox_pids)}
+
+    def __init__(self, max_age=PROXY_MAX_AGE, clock=time.monotonic):
+        self.max_age = max_age
+        self.clock = clock
+        self.encoders = {node: enc for node, enc in self.SOURCES.values()}
+        self.latest = {}            # request ID -> (time seen, frame data)
+        self.stats = Counter()
 
-sys.stdout.write("\033]0;CAN Gateway\007")
-sys.stdout.flush()
+    def observe(self, msg):
+        """Remember a PT frame; decoding waits until a request needs it."""
+        src = self.SOURCES.get(msg.arbitration_id)
+        if src is not None:
+            self.latest[src[0]] = (self.clock(), bytes(msg.data))
 
-# Two buses: powertrain and diagnostics/tools
-bus_pt = can.interface.Bus(channel="vcan0", bustype="socketcan")  # Powertrain
-bus_diag = can.interface.Bus(channel="vcan1", bustype="socketcan")  # Diagnostic
+    def lookup(self, node, req):
+        """Response payload for a Mode 01 request to `node`, or None to forward it."""
+        if len(req) < 2 or req[0] != 0x01:
+            self.stats["forwarded"] += 1
+            return None
+        entry = self.latest.get(node)
+        if entry is None or self.clock() - entry[0] > self.max_age:
+            self.stats["stale"] += 1
+            return None
+        try:
+            data = self.encoders[node](entry[1])
+        except (ValueError, IndexError):
+            self.stats["stale"] += 1
+            return None
+        if not all(pid in data for pid in req[1:]):
+            # Range PIDs and PIDs the broadcast does not carry: the ECU knows
+            self.stats["forwarded"] += 1
+            return None
+        payload = [0x41]
+        for pid in req[1:]:
+            payload += [pid] + data[pid]
+        if len(payload) > 7:
+            # Would need ISO-TP flow control from the tester; leave it to the ECU
+            self.stats["forwarded"] += 1
+            return None
+        return payload
 
-print("CAN Gateway running:")
-print("  vcan0 = Powertrain (Engine/ABS/Trans/OBD_ECU)")
-print("  vcan1 = Diagnostic (OBD Tester / Tools)")
-print()
-print("Forwarding rules:")
-print("  vcan0 -> vcan1 : 0x100, 0x200, 0x300, 0x7E8 (OBD response)")
-print("  vcan1 -> vcan0 : 0x7E0 (OBD request)")
-print("Ctrl+C to stop.\n")
+    def answer(self, msg, diag_bus, verbose=True):
+        """Answer a DIAG request on the ECU's behalf; False if it must be forwarded."""
+        node = msg.arbitration_id
+        if node not in self.encoders:
+            return False
+        req = isotp.single_frame_payload(msg.data)
+        if req is None:
+            # Flow control / multi-frame request parts: not a request of their own
+            return False
+        payload = self.lookup(node, req)
+        if payload is None:
+            return False
+        resp = can.Message(arbitration_id=node + 8, data=isotp.single_frame(payload),
+                           is_extended_id=False)
+        try:
+            diag_bus.send(resp)
+        except can.CanError as e:
+            print(f"proxy: failed to send 0x{resp.arbitration_id:03X}: {e}")
+            self.stats["forwarded"] += 1
+            return False
+        self.stats["answered"] += 1
+        if verbose:
+            print(f"proxy->DIAG: ID=0x{resp.arbitration_id:03X} data={resp.data.hex().upper()}")
+        return True
 
-def forward(msg, dst_bus, direction):
-    """Forward a CAN message and log it."""
+    def report(self):
+        asked = self.stats["answered"] + self.stats["stale"] + self.stats["forwarded"]
+        share = self.stats["answered"] / asked * 100 if asked else 0.0
+        return (f"[Gateway] proxy: answered={self.stats['answered']} ({share:.1f}%) "
+                f"stale={self.stats['stale']} forwarded={self.stats['forwarded']} "
+                f"max_age={self.max_age:g} s")
+
+# ============================================
+# FORWARDING
+# ============================================
+def forward(msg, dst_bus, direction, verbose=True, latency=None):
+    """Forward a CAN message and log it; True if it was sent."""
     try:
         dst_bus.send(msg)
-        print(f"{direction}: ID=0x{msg.arbitration_id:03X} data={msg.data.hex().upper()}")
+        if latency is not None:
+            latency.add((time.time() - msg.timestamp) * 1000.0)
+        if verbose:
+            print(f"{direction}: ID=0x{msg.arbitration_id:03X} data={msg.data.hex().upper()}")
+        return True
     except can.CanError as e:
         print(f"{direction}: failed to send 0x{msg.arbitration_id:03X}: {e}")
+        return False
 
-try:
+def drain(side, buses, table, unrouted, verbose=True, latency=None, proxy=None):
+    """Route every frame already queued on one side; returns (received, forwarded)."""
+    src_bus = buses[side]
+    side_table = table[side]
+    received = forwarded = 0
     while True:
-        # Check powertrain bus (vcan0)
-        msg0 = bus_pt.recv(0.01)
-        if msg0 is not None:
-            aid = msg0.arbitration_id
+        msg = src_bus.recv(0.0)
+        if msg is None:
+            return received, forwarded
+        received += 1
+        if proxy is not None:
+            if side == "PT":
+                proxy.observe(msg)
+            elif proxy.answer(msg, src_bus, verbose):
+                continue
+        r = side_table.get(msg.arbitration_id)
+        if r is None:
+            # Only reaches us when the bus cannot filter in the kernel
+            unrouted[side] += 1
+            continue
+        if forward(msg, buses[r["dst"]], f"{side}->{r['dst']}", verbose, latency):
+            r["frames"] += 1
+            r["bytes"] += msg.dlc
+            forwarded += 1
+        else:
+            r["drops"] += 1
+
+def gateway_task(bus_pt, bus_diag, routes=None, verbose=True, latency=None, proxy=None):
+    """
+    Gateway as a cooperative task: each next() drains both buses.
+
+    Never blocks; lab_runtime.py calls it whenever either bus has frames.
+    Pass an ObdProxy to answer Mode 01 requests from the cached PT data.
+    """
+    routes = load_routes() if routes is None else routes
+    table = build_table(routes)
+    buses = {"PT": bus_pt, "DIAG": bus_diag}
+    install_filters(buses, table)
+    unrouted = {side: 0 for side in SIDES}
+    while True:
+        drain("PT", buses, table, unrouted, verbose, latency, proxy)
+        drain("DIAG", buses, table, unrouted, verbose, latency, proxy)
+        yield
+
+def latency_report(latency, received, forwarded):
+    return (
+        f"[Gateway] received={received} forwarded={forwarded} | latency mean={latency.mean():.3f} "
+        f"p50<{latency.percentile(50):g} p99<{latency.percentile(99):g} "
+        f"max={latency.max:.3f} ms | <{LATENCY_TARGET_MS:g} ms: "
+        f"{latency.share_below(LATENCY_TARGET_MS) * 100:.2f}% | {latency.format()}"
+    )
+
+def run_event_loop(bus_pt, bus_diag, routes, verbose=True, report_every=10.0, window=10000,
+                   proxy=None):
+    """
+    Block on both sockets at once and forward whatever is ready.
+
+    Returns the latency histogram when interrupted with Ctrl+C.
+    """
+    latency = RollingHistogram(LATENCY_EDGES_MS, window)
+    table = build_table(routes)
+    buses = {"PT": bus_pt, "DIAG": bus_diag}
+    install_filters(buses, table)
+    unrouted = {side: 0 for side in SIDES}
+
+    sel = selectors.DefaultSelector()
+    for side, bus in buses.items():
+        sel.register(bus.fileno(), selectors.EVENT_READ, side)
+
+    received = forwarded = 0
+    next_report = time.monotonic() + report_every
+    try:
+        while True:
+            for key, _ in sel.select(timeout=max(0.0, next_report - time.monotonic())):
+                rx, fwd = drain(key.data, buses, table, unrouted, verbose, latency, proxy)
+                received += rx
+                forwarded += fwd
 
-            # EngineData, WheelSpeeds, GearboxData from PT -> DIAG
-            if aid in (0x100, 0x200, 0x300):
-                forward(msg0, bus_diag, "PT->DG")
+            if time.monotonic() >= next_report:
+                next_report += report_every
+                print(latency_report(latency, received, forwarded))
+                print(f"[Gateway] routes: {route_counters(routes, unrouted)}")
+                if proxy is not None:
+                    print(proxy.report())
+    except KeyboardInterrupt:
+        pass
+    finally:
+        sel.close()
+    print(latency_report(latency, received, forwarded))
+    print(f"[Gateway] routes: {route_counters(routes, unrouted)}")
+    if proxy is not None:
+        print(proxy.report())
+    return latency
 
-            # OBD response 7E8 from PT -> DIAG
-            elif aid == 0x7E8:
-                forward(msg0, bus_diag, "PT->DG")
+# ============================================
+# BENCHMARK (in-process ECU and tester on MemoryBus)
+# ============================================
+def bench_proxy(requests, delay, max_age):
+    """
+    Blocking Mode 01 round trips tester -> gateway -> ECU with and without
+    the proxy; the ECU answers `delay` s late (obd_async_tester.DelayedBus).
+    """
+    import threading
+    import obd_async_tester
+    from mem_bus import MemoryBus
+    from scheduler import sleep_until
 
-        # Check diagnostic bus (vcan1)
-        msg1 = bus_diag.recv(0.01)
-        if msg1 is not None:
-            aid = msg1.arbitration_id
+    def run(proxy):
+        tag = f"gw-bench-{time.monotonic_ns()}"
+        pt, diag = f"{tag}-pt", f"{tag}-diag"
+        halt = obd_async_tester.start_ecu(pt, delay)
+        feeder, gw_pt, gw_diag, tester = MemoryBus(pt), MemoryBus(pt), MemoryBus(diag), MemoryBus(diag)
+        routes = load_routes()
+        stop = threading.Event()
 
-            # OBD request 7E0 from DIAG -> PT
-            if aid == 0x7E0:
-                forward(msg1, bus_pt, "DG->PT")
+        def broadcast():
+            # EngineData every 0.1 s, GearboxData every 0.01 s, like the ECUs
+            engine = bytes(dbc_codec.encode_engine_data(2500, 80, 90))
+            gearbox = bytes(dbc_codec.encode_gearbox_data(4, 4, 0, 0, 80, 0))
+            due = time.monotonic()
+            n = 0
+            while not stop.is_set():
+                if n % 10 == 0:
+                    feeder.send(can.Message(arbitration_id=0x100, data=engine, is_extended_id=False))
+                feeder.send(can.Message(arbitration_id=0x300, data=gearbox, is_extended_id=False))
+                n += 1
+                due += 0.01
+                sleep_until(due)
 
-        # Small sleep to avoid 100% CPU
-        time.sleep(0.001)
+        def gateway():
+            task = gateway_task(gw_pt, gw_diag, routes, verbose=False, proxy=proxy)
+            while not stop.is_set():
+                next(task)
+                time.sleep(0.0001)
 
-except KeyboardInterrupt:
+        threading.Thread(target=broadcast, daemon=True).start()
+        threading.Thread(target=gateway, daemon=True).start()
+        time.sleep(0.2)
+        channel = isotp.IsoTpChannel(tester, tx_id=0x7E0, rx_id=0x7E8)
+        rtts = []
+        try:
+            for _ in range(requests):
+                start = time.perf_counter()
+                resp = channel.request([0x01, 0x0C, 0x0D], 0.5, accept=lambda r: r[:1] == b"\x41")
+                if resp is not None:
+                    rtts.append((time.perf_counter() - start) * 1000.0)
+        finally:
+            stop.set()
+            halt.set()
+            time.sleep(0.05)
+            for b in (feeder, gw_pt, gw_diag, tester):
+                b.shutdown()
+        to_pt = next(r["frames"] for r in routes if r["name"] == "obd-request")
+        rtts.sort()
+        return rtts, to_pt
+
+    print(f"{requests} blocking Mode 01 requests (0C 0D) tester -> gateway -> ECU, "
+          f"ECU response delay {delay * 1000:g} ms")
+    for label, proxy in (("forwarded", None), (f"proxy, max age {max_age:g} s", ObdProxy(max_age))):
+        rtts, to_pt = run(proxy)
+        if not rtts:
+            print(f"{label:26}: no responses")
+            continue
+        print(f"{label:26}: rtt p50={rtts[len(rtts) // 2]:.2f} ms p99={rtts[int(len(rtts) * 0.99)]:.2f} ms, "
+              f"{len(rtts)}/{requests} answered, {to_pt} requests on PT")
+        if proxy is not None:
+            print(f"  {proxy.report()}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="CAN gateway between vcan0 (PT) and vcan1 (DIAG)")
+    parser.add_argument("-q", "--quiet", action="store_true",
+                        help="no per-frame prints (use when measuring latency)")
+    parser.add_argument("--report", type=float, default=10.0,
+                        help="seconds between latency reports")
+    parser.add_argument("--routes", default=ROUTES_PATH,
+                        help="routing table (JSON)")
+    parser.add_argument("--proxy", action="store_true",
+                        help="answer Mode 01 requests from the latest EngineData/GearboxData")
+    parser.add_argument("--max-age", type=float, default=PROXY_MAX_AGE,
+                        help="seconds cached PT data may be old before requests are forwarded")
+    parser.add_argument("--bench", action="store_true",
+                        help="in-process round trips with and without --proxy, then exit")
+    parser.add_argument("--requests", type=int, default=500, help="--bench: requests per run")
+    parser.add_argument("--delay", type=float, default=2.0, help="--bench: ECU response delay in ms")
+    args = parser.parse_args()
+
+    if args.bench:
+        bench_proxy(args.requests, args.delay / 1000.0, args.max_age)
+        return
+
+    sys.stdout.write("\033]0;CAN Gateway\007")
+    sys.stdout.flush()
+
+    routes = load_routes(args.routes)
+    channels = load_channels(args.routes)
+
+    # Two buses: powertrain and diagnostics/tools
+    bus_pt = can.interface.Bus(channel=channels["PT"], bustype="socketcan")  # Powertrain
+    bus_diag = can.interface.Bus(channel=channels["DIAG"], bustype="socketcan")  # Diagnostic
+
+    print("CAN Gateway running:")
+    print(f"  {channels['PT']} = Powertrain (Engine/ABS/Trans/OBD_ECU)")
+    print(f"  {channels['DIAG']} = Diagnostic (OBD Tester / Tools)")
+    print()
+    print(f"Forwarding rules ({os.path.basename(args.routes)}, kernel-filtered):")
+    print(describe_routes(routes))
+    proxy = ObdProxy(args.max_age) if args.proxy else None
+    if proxy is not None:
+        print(f"OBD proxy: Mode 01 PIDs 05,0C,0D (0x7E0) and A4 (0x7E1) answered on "
+              f"{channels['DIAG']} from data up to {args.max_age:g} s old")
+    print("Ctrl+C to stop.\n")
+
+    run_event_loop(bus_pt, bus_diag, routes, verbose=not args.quiet, report_every=args.report,
+                   proxy=proxy)
     print("\nCAN Gateway stopped.")
+    bus_pt.shutdown()
+    bus_diag.shutdown()
+
+if __name__ == "__main__":
+    main()
@@ -3,14 +3,34 @@
 This module opens a graphical window that:
 - Subscribes to CAN messages from engine and transmission ECUs.
 - Displays RPM, vehicle speed, gear, throttle, and drive mode.
+- Sends the throttle / brake sliders and the D/S mode as the cyclic
+  DriverInputs frame (0x400, driver_inputs.py) for the engine and TCU.
 - Helps visualize and tune the control logic in real time.
+
+CAN reception and decoding run on a python-can Notifier thread that writes
+into a latest-value SignalStore (signal_store.py); the Tk loop only takes
+snapshots, so a busy bus cannot starve the UI or the driver controls.
+
+Live strip charts (strip_chart.py) show the last STRIP_SECONDS of RPM,
+speeds, gear and clutch torque from fixed-size NumPy rings that the
+receive thread fills at the full bus rate, so shift transients are visible
+and memory stays flat over long sessions.
+
+Rendering is retained-mode: the gauge arcs, hubs and captions are created
+once and each frame only moves the needle (canvas.coords) when its pixel
+position changes; labels and bars are reconfigured only when their text /
+value changes.  Frame time and redraw counters are shown under the driver
+controls.
 """
 import sys
 import time
 import math
 import os
 import can
-import cantools
+import driver_inputs
+import signal_store
+import strip_chart
+from scheduler import RollingHistogram
 import tkinter as tk
 import pygame
 from tkinter import ttk
@@ -19,14 +39,20 @@ from tkinter import ttk
 sys.stdout.write("\033]0;GUI Dashboard\007")
 sys.stdout.flush()
 
-MODE_FILE = "/home/jathin/Desktop/CAN_LAB/tcu_mode.txt"
-DBC_PATH = "/home/jathin/Desktop/CAN_LAB/vehicle.dbc"
-DRIVER_STATE_PATH = "/home/jathin/Desktop/CAN_LAB/driver_state.txt"
-
 # Use diagnostic bus (vcan1) so it works via the gateway
 bus = can.interface.Bus(channel="vcan1", bustype="socketcan")
 
-db = cantools.database.load_file(DBC_PATH)
+# Strip chart window; the rings hold every sample of the whole window even
+# if a message comes at the 1 kHz the store is built for (TCU frames: 100 Hz)
+STRIP_SECONDS = 20.0
+MAX_MESSAGE_RATE = 1000
+CHART_SIGNALS = ("RPM", "Speed", "WheelSpeed_FL", "WheelSpeed_FR", "WheelSpeed_RL",
+                 "WheelSpeed_RR", "Gear", "TargetGear", "Clutch1_Tq", "Clutch2_Tq")
+
+# Frames are received and decoded (dbc_codec.py) on a Notifier thread;
+# the GUI reads the newest values (and chart history) from this store
+store = signal_store.SignalStore(history=CHART_SIGNALS,
+                                 capacity=int(STRIP_SECONDS * MAX_MESSAGE_RATE))
 
 state = {
     "RPM": 0.0,
@@ -50,54 +76,25 @@ driver_state = {
 }
 
 # ============================
-# === MODE HELPERS (D / S) ===
+# === DRIVER INPUTS (0x400) ===
 # ============================
-current_mode = "D"  # default; will be overwritten by read_mode()
-
-
-def read_mode():
-    """Read mode from MODE_FILE. Returns 'D' or 'S'."""
-    global current_mode
-    try:
-        with open(MODE_FILE, "r") as f:
-            m = f.read().strip().upper()
-            if m in ("D", "S"):
-                current_mode = m
-            else:
-                current_mode = "D"
-    except FileNotFoundError:
-        current_mode = "D"
-    except Exception as e:
-        print(f"Failed to read mode file: {e}")
-        current_mode = "D"
-    return current_mode
-
-
-def write_mode(mode):
-    """Write mode ('D' or 'S') to MODE_FILE."""
-    try:
-        with open(MODE_FILE, "w") as f:
-            f.write(mode)
-    except Exception as e:
-        print(f"Failed to write mode file: {e}")
+# Sent every driver_inputs.CYCLE s on vcan1; the gateway forwards it to PT
+driver_sender = driver_inputs.DriverInputSender(bus)
+current_mode = "D"
 
 
 def toggle_mode():
-    """Toggle between D and S, write to file, update GUI label."""
+    """Toggle between D and S; the next DriverInputs frame carries it."""
     global current_mode, mode_var
     current_mode = "S" if current_mode == "D" else "D"
-    write_mode(current_mode)
+    driver_sender.mode = current_mode
     mode_var.set(f"Mode: {current_mode}")
 
 
-def write_driver_state():
-    """Write throttle/brake to a simple text file for the engine ECU."""
-    try:
-        with open(DRIVER_STATE_PATH, "w") as f:
-            f.write(f"THROTTLE={driver_state['throttle']}\n")
-            f.write(f"BRAKE={driver_state['brake']}\n")
-    except Exception as e:
-        print(f"Failed to write driver_state: {e}")
+def send_driver_inputs():
+    """Hand the slider values to the DriverInputs sender (no I/O here)."""
+    driver_sender.throttle = driver_state["throttle"]
+    driver_sender.brake = driver_state["brake"]
 
 
 # ---------------- GUI SETUP ---------------- #
@@ -105,7 +102,7 @@ def write_driver_state():
 root = tk.Tk()
 root.title("CAN Virtual Dashboard")
 
-root.geometry("1000x550")
+root.geometry("1000x700")
 root.configure(bg="#20252b")
 
 root.columnconfigure(0, weight=3)
@@ -113,6 +110,7 @@ root.columnconfigure(1, weight=2)
 root.columnconfigure(2, weight=1)
 root.rowconfigure(0, weight=3)
 root.rowconfigure(1, weight=2)
+root.rowconfigure(2, weight=1)
 
 # ==== Engine sound setup ====
 engine_channel = None
@@ -195,6 +193,33 @@ wheel_label = tk.Label(bottom_frame, text="Wheel Speeds: --", fg="white", bg="#2
 wheel_label.grid(row=0, column=1, rowspan=4, sticky="n", padx=20)
 
 
+# Bottom row: live strip charts
+chart_frame = tk.Frame(root, bg="#20252b")
+chart_frame.grid(row=2, column=0, columnspan=3, sticky="nsew", padx=10, pady=(0, 10))
+
+charts = [
+    strip_chart.StripChart(chart_frame, "RPM", [("RPM", "#ffcc00", "RPM")],
+                           0, 7000, seconds=STRIP_SECONDS),
+    strip_chart.StripChart(chart_frame, "Speed km/h", [
+        ("Speed", "#ffffff", "veh"),
+        ("WheelSpeed_FL", "#4caf50", "FL"),
+        ("WheelSpeed_FR", "#2196f3", "FR"),
+        ("WheelSpeed_RL", "#ff9800", "RL"),
+        ("WheelSpeed_RR", "#e91e63", "RR"),
+    ], 0, 250, seconds=STRIP_SECONDS),
+    strip_chart.StripChart(chart_frame, "Gear", [
+        ("Gear", "#ffffff", "gear"),
+        ("TargetGear", "#ffcc00", "target"),
+    ], 0, 7, seconds=STRIP_SECONDS, steps=True),
+    strip_chart.StripChart(chart_frame, "Clutch torque %", [
+        ("Clutch1_Tq", "#4caf50", "C1"),
+        ("Clutch2_Tq", "#2196f3", "C2"),
+    ], 0, 100, seconds=STRIP_SECONDS),
+]
+for i, chart in enumerate(charts):
+    chart.grid(row=0, column=i, padx=4)
+
+
 # Rightmost: driver controls (Throttle / Brake / Mode)
 ctrl_frame = tk.Frame(root, bg="#20252b")
 ctrl_frame.grid(row=0, column=2, rowspan=2, sticky="nsew", padx=10, pady=10)
@@ -205,7 +230,6 @@ ctrl_title.pack(pady=(0, 10))
 # ============================
 # === MODE WIDGETS (D / S) ===
 # ============================
-current_mode = read_mode()  # sync from file at startup
 mode_var = tk.StringVar(value=f"Mode: {current_mode}")
 
 mode_label = tk.Label(
@@ -234,7 +258,7 @@ throttle_label.pack(pady=(5, 0))
 def on_throttle_change(val):
     try:
         driver_state["throttle"] = int(float(val))
-        write_driver_state()
+        send_driver_inputs()
     except ValueError:
         pass
 
@@ -260,7 +284,7 @@ brake_label.pack(pady=(5, 0))
 def on_brake_change(val):
     try:
         driver_state["brake"] = int(float(val))
-        write_driver_state()
+        send_driver_inputs()
     except ValueError:
         pass
 
@@ -285,33 +309,39 @@ style.theme_use("default")
 style.configure("TProgressbar", troughcolor="#3a3f46", background="#4caf50")
 
 
+# Frame time / redraw counters (shown in stats_label, printed on exit)
+FRAME_EDGES_MS = (0.5, 1.0, 2.0, 5.0, 10.0, 20.0, 50.0)
+gui_stats = {
+    "frames": 0,            # update_gui() runs
+    "needle_moves": 0,      # canvas.coords() calls
+    "label_updates": 0,     # widget reconfigures
+    "idle_frames": 0,       # ticks with no new CAN data (nothing redrawn)
+    "coalesced": 0,         # signal updates overwritten before being shown
+    "frame_ms": RollingHistogram(FRAME_EDGES_MS, window=200),
+    "chart_ms": RollingHistogram(FRAME_EDGES_MS, window=100),
+}
+
+stats_var = tk.StringVar(value="")
+stats_label = tk.Label(ctrl_frame, textvariable=stats_var, fg="#888888", bg="#20252b",
+                       font=("Arial", 8), justify="left")
+stats_label.pack(side="bottom", pady=(10, 0))
+
+
 # ---------------- DRAW FUNCTIONS ---------------- #
 
-def draw_gauge(canvas, center_x, center_y, radius, min_val, max_val, value, label):
-    canvas.delete("all")
+GAUGE_START = 135
+GAUGE_EXTENT = -270
 
-    start_angle = 135
-    extent = -270
 
+def make_gauge(canvas, center_x, center_y, radius, min_val, max_val, label):
+    """Create the static gauge items once; returns the gauge dict for set_gauge()."""
     canvas.create_arc(center_x - radius, center_y - radius,
                       center_x + radius, center_y + radius,
-                      start=start_angle, extent=extent,
+                      start=GAUGE_START, extent=GAUGE_EXTENT,
                       style="arc", width=10, outline="#555555")
 
-    if value < min_val:
-        value = min_val
-    if value > max_val:
-        value = max_val
-
-    frac = (value - min_val) / (max_val - min_val + 1e-6)
-    angle = start_angle + extent * frac
-
-    angle_rad = math.radians(angle)
-    x_end = center_x + radius * 0.8 * math.cos(angle_rad)
-    y_end = center_y - radius * 0.8 * math.sin(angle_rad)
-
-    canvas.create_line(center_x, center_y, x_end, y_end,
-                       fill="#ffcc00", width=4)
+    needle = canvas.create_line(center_x, center_y, center_x, center_y,
+                                fill="#ffcc00", width=4)
 
     canvas.create_oval(center_x - 5, center_y - 5,
                        center_x + 5, center_y + 5,
@@ -321,66 +351,128 @@ def draw_gauge(canvas, center_x, center_y, radius, min_val, max_val, value, labe
                        text=label, fill="white",
                        font=("Arial", 10))
 
+    gauge = {
+        "canvas": canvas,
+        "needle": needle,
+        "cx": center_x,
+        "cy": center_y,
+        "radius": radius,
+        "min": min_val,
+        "max": max_val,
+        "tip": None,        # last needle end point in whole pixels
+    }
+    set_gauge(gauge, min_val)
+    return gauge
+
+
+def set_gauge(gauge, value):
+    """Move the needle; nothing is touched unless its tip moves a pixel."""
+    value = max(gauge["min"], min(value, gauge["max"]))
+    frac = (value - gauge["min"]) / (gauge["max"] - gauge["min"] + 1e-6)
+    angle_rad = math.radians(GAUGE_START + GAUGE_EXTENT * frac)
+    tip = (round(gauge["cx"] + gauge["radius"] * 0.8 * math.cos(angle_rad)),
+           round(gauge["cy"] - gauge["radius"] * 0.8 * math.sin(angle_rad)))
+    if tip == gauge["tip"]:
+        return
+    gauge["tip"] = tip
+    gauge["canvas"].coords(gauge["needle"], gauge["cx"], gauge["cy"], *tip)
+    gui_stats["needle_moves"] += 1
 
-# ---------------- CAN PROCESSING ---------------- #
 
-def process_message(msg):
-    global state
+# Last value pushed to each widget option, so unchanged ones are skipped
+_shown = {}
 
-    try:
-        decoded = db.decode_message(msg.arbitration_id, msg.data)
-    except Exception:
+
+def set_widget(widget, option, value):
+    key = (str(widget), option)
+    if _shown.get(key) == value:
         return
+    _shown[key] = value
+    widget[option] = value
+    gui_stats["label_updates"] += 1
+
+
+def set_label(label, text):
+    set_widget(label, "text", text)
+
 
-    if msg.arbitration_id == 0x100:
-        state["RPM"] = float(decoded.get("RPM", 0.0))
-        state["Speed"] = float(decoded.get("Speed", 0.0))
-        state["Coolant"] = float(decoded.get("Coolant", 0.0))
-
-    elif msg.arbitration_id == 0x200:
-        state["Wheel_FL"] = float(decoded.get("WheelSpeed_FL", 0.0))
-        state["Wheel_FR"] = float(decoded.get("WheelSpeed_FR", 0.0))
-        state["Wheel_RL"] = float(decoded.get("WheelSpeed_RL", 0.0))
-        state["Wheel_RR"] = float(decoded.get("WheelSpeed_RR", 0.0))
-
-    elif msg.arbitration_id == 0x300:
-        state["Gear"] = int(decoded.get("Gear", 0))
-        state["TargetGear"] = int(decoded.get("TargetGear", 0))
-        state["Clutch1_Tq"] = float(decoded.get("Clutch1_Tq", 0.0))
-        state["Clutch2_Tq"] = float(decoded.get("Clutch2_Tq", 0.0))
-        state["OilTemp"] = float(decoded.get("OilTemp", 0.0))
-        state["ShiftInProgress"] = int(decoded.get("ShiftInProgress", 0))
-
-
-def poll_can():
-    while True:
-        msg = bus.recv(0.0)
-        if msg is None:
-            break
-        process_message(msg)
-    root.after(20, poll_can)
-
-def update_clutch_bars_simple(gear, shifting):
+rpm_gauge = make_gauge(rpm_canvas, 150, 100, 80, 0, 7000, "RPM")
+speed_gauge = make_gauge(speed_canvas, 150, 100, 80, 0, 200, "km/h")
+
+
+# ---------------- CAN PROCESSING ---------------- #
+
+# DBC signal name -> state key (only where they differ)
+STATE_KEYS = {
+    "WheelSpeed_FL": "Wheel_FL",
+    "WheelSpeed_FR": "Wheel_FR",
+    "WheelSpeed_RL": "Wheel_RL",
+    "WheelSpeed_RR": "Wheel_RR",
+}
+
+last_seqs = {}
+
+
+def read_store():
+    """Copy new values from the store into state; False if nothing changed."""
+    global last_seqs
+    values, seqs, _, _ = store.snapshot()
+    fresh = signal_store.changed(seqs, last_seqs)
+    if not fresh:
+        return False
+    for name in fresh:
+        gui_stats["coalesced"] += seqs[name] - last_seqs.get(name, 0) - 1
+        key = STATE_KEYS.get(name, name)
+        if key in state:
+            state[key] = values[name]
+    last_seqs = seqs
+    return True
+
+def clutch_bar_values(gear, shifting, c1, c2):
     # If shifting, do NOT override — the TCU already updates real torque
     if shifting:
-        return
+        return max(0, min(c1, 100)), max(0, min(c2, 100))
 
     # Odd gears = C1 on, C2 off
     if gear in (1, 3, 5):
-        c1_bar['value'] = 100
-        c2_bar['value'] = 0
+        return 100, 0
 
     # Even gears = C2 on, C1 off
     elif gear in (2, 4, 6):
-        c1_bar['value'] = 0
-        c2_bar['value'] = 100
+        return 0, 100
 
     # Neutral
     else:
-        c1_bar['value'] = 0
-        c2_bar['value'] = 0
+        return 0, 0
+
+def update_charts():
+    start = time.perf_counter()
+    _, _, stamps, _ = store.snapshot()
+    if stamps:
+        now = max(stamps.values())
+        for chart in charts:
+            chart.refresh(store, now)
+    gui_stats["chart_ms"].add((time.perf_counter() - start) * 1000.0)
+    root.after(100, update_charts)
+
+def show_stats():
+    ft = gui_stats["frame_ms"]
+    stats_var.set(f"frame {ft.mean():.2f} ms avg, {ft.max:.1f} max\n"
+                  f"frames {gui_stats['frames']} (idle {gui_stats['idle_frames']})  "
+                  f"needle moves {gui_stats['needle_moves']}\n"
+                  f"widget updates {gui_stats['label_updates']}\n"
+                  f"CAN frames {store.frames}  coalesced {gui_stats['coalesced']}\n"
+                  f"charts {gui_stats['chart_ms'].mean():.2f} ms avg, "
+                  f"{sum(c.redraws for c in charts)} line updates")
+    root.after(1000, show_stats)
 
 def update_gui():
+    frame_start = time.perf_counter()
+    if not read_store():
+        gui_stats["idle_frames"] += 1
+        root.after(50, update_gui)
+        return
+
     rpm = state["RPM"]
     speed = state["Speed"]
     coolant = state["Coolant"]
@@ -391,11 +483,11 @@ def update_gui():
     oil = state["OilTemp"]
     shifting = state["ShiftInProgress"]
 
-    rpm_label.config(text=f"RPM: {rpm:5.0f}")
-    speed_label.config(text=f"Speed: {speed:3.0f} km/h")
-    coolant_label.config(text=f"Coolant: {coolant:3.0f} °C")
-    oil_label.config(text=f"Oil: {oil:3.0f} °C")
-    shift_label.config(text=f"Shifting: {'Yes' if shifting else 'No'}")
+    set_label(rpm_label, f"RPM: {rpm:5.0f}")
+    set_label(speed_label, f"Speed: {speed:3.0f} km/h")
+    set_label(coolant_label, f"Coolant: {coolant:3.0f} °C")
+    set_label(oil_label, f"Oil: {oil:3.0f} °C")
+    set_label(shift_label, f"Shifting: {'Yes' if shifting else 'No'}")
 
     # ==== Improved engine sound ====
     try:
@@ -441,36 +533,49 @@ def update_gui():
     else:
         gear_text = str(gear)
     if tgt_gear != gear:
-        gear_label.config(text=f"Gear: {gear_text} → {tgt_gear}")
+        set_label(gear_label, f"Gear: {gear_text} → {tgt_gear}")
     else:
-        gear_label.config(text=f"Gear: {gear_text}")
+        set_label(gear_label, f"Gear: {gear_text}")
 
-    c1_bar["value"] = max(0, min(c1, 100))
-    c2_bar["value"] = max(0, min(c2, 100))
-    update_clutch_bars_simple(gear, shifting)
+    c1_val, c2_val = clutch_bar_values(gear, shifting, c1, c2)
+    set_widget(c1_bar, "value", round(c1_val))
+    set_widget(c2_bar, "value", round(c2_val))
 
     fl = state["Wheel_FL"]
     fr = state["Wheel_FR"]
     rl = state["Wheel_RL"]
     rr = state["Wheel_RR"]
-    wheel_label.config(
-        text=f"Wheel Speeds:\n"
-             f"FL={fl:4.1f}  FR={fr:4.1f}\n"
-             f"RL={rl:4.1f}  RR={rr:4.1f}"
-    )
+    set_label(wheel_label,
+              f"Wheel Speeds:\n"
+              f"FL={fl:4.1f}  FR={fr:4.1f}\n"
+              f"RL={rl:4.1f}  RR={rr:4.1f}")
 
-    draw_gauge(rpm_canvas, 150, 100, 80, 0, 7000, rpm, "RPM")
-    draw_gauge(speed_canvas, 150, 100, 80, 0, 200, speed, "km/h")
+    set_gauge(rpm_gauge, rpm)
+    set_gauge(speed_gauge, speed)
 
+    gui_stats["frames"] += 1
+    gui_stats["frame_ms"].add((time.perf_counter() - frame_start) * 1000.0)
     root.after(50, update_gui)
 
 
 # Start everything
-write_driver_state()
-poll_can()
+send_driver_inputs()
+driver_sender.start()
+_, notifier = signal_store.start(bus, store)
 update_gui()
+update_charts()
+show_stats()
 
 try:
     root.mainloop()
 except KeyboardInterrupt:
     print("GUI Dashboard closed.")
+finally:
+    driver_sender.stop()
+    notifier.stop()
+    bus.shutdown()
+    print(f"[GUI] DriverInputs sent={driver_sender.sent} errors={driver_sender.errors}")
+    print(f"[GUI] CAN frames={store.frames} coalesced={gui_stats['coalesced']}")
+    print(f"[GUI] frames={gui_stats['frames']} needle moves={gui_stats['needle_moves']} "
+          f"widget updates={gui_stats['label_updates']} | frame time "
+          f"{gui_stats['frame_ms'].format()}")
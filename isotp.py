@@ -0,0 +1,409 @@
+"""ISO-TP (ISO 15765-2) transport for the diagnostic services.
+
+This module provides IsoTpChannel, one end of a tx_id / rx_id pair:
+- Payloads up to 7 bytes go out as a single frame (SF), which is exactly
+  the [length, mode, pid, ...] layout the lab's OBD frames always had.
+- Longer payloads (up to 4095 bytes) are segmented into a first frame (FF)
+  and consecutive frames (CF); the receiver answers with flow control (FC)
+  carrying its block size (BS) and minimum separation time (STmin), and
+  the sender honours both.
+- Everything is non-blocking: feed received frames to on_frame(), call
+  poll() to send consecutive frames that are due, and take finished
+  payloads with receive().  request() wraps that into a blocking call for
+  testers.  N_Bs / N_Cr timeouts abort stuck transfers.
+
+The gateway forwards ISO-TP frames like any other frame (the obd-request /
+obd-response routes), so transfers work across PT <-> DIAG unchanged.
+
+Usage:
+    python isotp.py bench                     # BS / STmin grid, in-process MemoryBus
+    python isotp.py bench --gateway           # same, through gateway_task
+    python isotp.py bench --size 1024 --bs 0 8 --stmin 0 1
+"""
+
+import argparse
+import collections
+import time
+
+import can
+
+from scheduler import sleep_until
+
+# Protocol control information (high nibble of byte 0)
+PCI_SF, PCI_FF, PCI_CF, PCI_FC = 0x0, 0x1, 0x2, 0x3
+FC_CTS, FC_WAIT, FC_OVERFLOW = 0, 1, 2
+
+MAX_PAYLOAD = 4095          # 12-bit FF length (classic CAN)
+N_BS = 1.0                  # s the sender waits for flow control
+N_CR = 1.0                  # s the receiver waits for the next CF
+MAX_WAIT_FRAMES = 10        # FC WAITs accepted before giving up
+TX_QUEUE = 16               # payloads queued behind a running transfer
+PADDING = 0xCC
+
+
+def stmin_seconds(st):
+    """STmin byte -> seconds (0x00-0x7F ms, 0xF1-0xF9 100-900 us, else 127 ms)."""
+    if st <= 0x7F:
+        return st / 1000.0
+    if 0xF1 <= st <= 0xF9:
+        return (st - 0xF0) / 10000.0
+    return 0.127
+
+
+def stmin_byte(seconds):
+    """Seconds -> the nearest STmin byte that is not shorter."""
+    if seconds <= 0:
+        return 0
+    if seconds < 0.001:
+        return 0xF0 + min(9, max(1, round(seconds * 10000)))
+    return min(0x7F, round(seconds * 1000))
+
+
+class IsoTpError(Exception):
+    pass
+
+
+def single_frame(payload, padding=PADDING):
+    """Data bytes of a single frame (functional requests are SF-only)."""
+    payload = bytes(payload)
+    if len(payload) > 7:
+        raise IsoTpError(f"{len(payload)} bytes do not fit a single frame")
+    data = bytes([len(payload)]) + payload
+    if padding is not None:
+        data += bytes([padding]) * (8 - len(data))
+    return data
+
+
+def single_frame_payload(data):
+    """Payload of a single frame, or None if `data` is not a valid SF."""
+    if not data or data[0] >> 4 != PCI_SF:
+        return None
+    n = data[0] & 0x0F
+    if not 0 < n <= len(data) - 1:
+        return None
+    return bytes(data[1:1 + n])
+
+
+class IsoTpChannel:
+    """One ISO-TP connection end (send on tx_id, receive on rx_id)."""
+
+    def __init__(self, bus, tx_id, rx_id, block_size=0, st_min=0,
+                 clock=time.monotonic, padding=PADDING):
+        self.bus = bus
+        self.tx_id = tx_id
+        self.rx_id = rx_id
+        self.block_size = block_size      # BS we ask senders for (0 = no limit)
+        self.st_min = st_min              # STmin byte we ask senders for
+        self.clock = clock
+        self.padding = padding
+
+        self.rx_done = collections.deque()
+        self.rx_buf = None                # bytearray being reassembled
+        self.rx_len = 0
+        self.rx_seq = 0
+        self.rx_block = 0                 # CFs received in the current block
+        self.rx_deadline = None
+
+        self.tx_buf = None                # payload being sent
+        self.tx_pos = 0
+        self.tx_seq = 0
+        self.tx_state = "idle"            # idle / wait_fc / sending
+        self.tx_block_left = 0
+        self.tx_gap = 0.0                 # receiver's STmin in seconds
+        self.tx_next = 0.0                # earliest time for the next CF
+        self.tx_deadline = None
+        self.tx_waits = 0
+        self.tx_queue = collections.deque()   # payloads waiting for the current transfer
+        self.last_error = None
+
+        self.stats = collections.Counter()
+
+    # ------------------------------------------------------------
+    # sending
+    # ------------------------------------------------------------
+    def _send(self, data):
+        if self.padding is not None and len(data) < 8:
+            data = data + bytes([self.padding]) * (8 - len(data))
+        self.bus.send(can.Message(arbitration_id=self.tx_id, data=data, is_extended_id=False))
+        self.stats["frames_tx"] += 1
+
+    def send(self, payload):
+        """
+        Send payload: short ones go out immediately as a SF, long ones start
+        a segmented transfer.  While a transfer is running further payloads
+        wait in a small FIFO and follow in order.
+        """
+        payload = bytes(payload)
+        if len(payload) > MAX_PAYLOAD:
+            raise IsoTpError(f"payload of {len(payload)} bytes exceeds {MAX_PAYLOAD}")
+        if self.tx_state != "idle" or self.tx_queue:
+            if len(self.tx_queue) >= TX_QUEUE:
+                raise IsoTpError("transmit queue full")
+            self.tx_queue.append(payload)
+            return
+        self._start(payload)
+
+    def _start(self, payload):
+        if len(payload) <= 7:
+            self._send(bytes([len(payload)]) + payload)
+            self.stats["tx_payloads"] += 1
+            return
+        self.tx_buf = payload
+        self._send(bytes([(PCI_FF << 4) | (len(payload) >> 8), len(payload) & 0xFF]) + payload[:6])
+        self.tx_pos = 6
+        self.tx_seq = 1
+        self.tx_state = "wait_fc"
+        self.tx_waits = 0
+        self.tx_deadline = self.clock() + N_BS
+
+    def _start_queued(self):
+        while self.tx_state == "idle" and self.tx_queue:
+            self._start(self.tx_queue.popleft())
+
+    @property
+    def busy(self):
+        return self.tx_state != "idle" or bool(self.tx_queue) or self.rx_buf is not None
+
+    def _send_flow_control(self, status=FC_CTS):
+        self._send(bytes([(PCI_FC << 4) | status, self.block_size, self.st_min]))
+
+    def poll(self):
+        """
+        Send consecutive frames that are due and check timeouts.  Returns
+        the time of the next scheduled action (None if nothing pending).
+        """
+        now = self.clock()
+        if self.tx_state == "wait_fc" and now > self.tx_deadline:
+            self._abort_tx("N_Bs timeout (no flow control)")
+        if self.rx_buf is not None and now > self.rx_deadline:
+            self.stats["rx_timeouts"] += 1
+            self.rx_buf = None
+
+        while self.tx_state == "sending" and now >= self.tx_next:
+            chunk = self.tx_buf[self.tx_pos:self.tx_pos + 7]
+            self._send(bytes([(PCI_CF << 4) | self.tx_seq]) + chunk)
+            self.tx_pos += len(chunk)
+            self.tx_seq = (self.tx_seq + 1) & 0xF
+            if self.tx_pos >= len(self.tx_buf):
+                self.tx_state = "idle"
+                self.tx_buf = None
+                self.stats["tx_payloads"] += 1
+                self._start_queued()
+                break
+            if self.tx_block_left:
+                self.tx_block_left -= 1
+                if self.tx_block_left == 0:
+                    self.tx_state = "wait_fc"
+                    self.tx_deadline = now + N_BS
+                    break
+            if self.tx_gap:
+                self.tx_next = now + self.tx_gap
+                break
+
+        deadlines = []
+        if self.tx_state == "sending":
+            deadlines.append(self.tx_next)
+        elif self.tx_state == "wait_fc":
+            deadlines.append(self.tx_deadline)
+        if self.rx_buf is not None:
+            deadlines.append(self.rx_deadline)
+        return min(deadlines) if deadlines else None
+
+    def _abort_tx(self, reason):
+        self.stats["tx_aborted"] += 1
+        self.tx_state = "idle"
+        self.tx_buf = None
+        self.last_error = reason
+        self._start_queued()
+
+    # ------------------------------------------------------------
+    # receiving
+    # ------------------------------------------------------------
+    def on_frame(self, msg):
+        """Feed one received frame; returns True if it belonged to this channel."""
+        if msg.arbitration_id != self.rx_id or not msg.data:
+            return False
+        d = msg.data
+        pci = d[0] >> 4
+        self.stats["frames_rx"] += 1
+
+        if pci == PCI_SF:
+            payload = single_frame_payload(d)
+            if payload is not None:
+                self.rx_done.append(payload)
+                self.stats["rx_payloads"] += 1
+
+        elif pci == PCI_FF and len(d) >= 8:
+            if self.rx_buf is not None:
+                self.stats["rx_interrupted"] += 1
+            self.rx_len = ((d[0] & 0x0F) << 8) | d[1]
+            self.rx_buf = bytearray(d[2:8])
+            self.rx_seq = 1
+            self.rx_block = 0
+            self.rx_deadline = self.clock() + N_CR
+            self._send_flow_control()
+
+        elif pci == PCI_CF:
+            if self.rx_buf is None:
+                return True                          # stray CF
+            if d[0] & 0x0F != self.rx_seq:
+                self.stats["rx_seq_errors"] += 1
+                self.rx_buf = None
+                return True
+            self.rx_buf += d[1:1 + min(7, self.rx_len - len(self.rx_buf))]
+            self.rx_seq = (self.rx_seq + 1) & 0xF
+            self.rx_deadline = self.clock() + N_CR
+            if len(self.rx_buf) >= self.rx_len:
+                self.rx_done.append(bytes(self.rx_buf))
+                self.rx_buf = None
+                self.stats["rx_payloads"] += 1
+            elif self.block_size:
+                self.rx_block += 1
+                if self.rx_block >= self.block_size:
+                    self.rx_block = 0
+                    self._send_flow_control()
+
+        elif pci == PCI_FC and self.tx_state == "wait_fc":
+            status = d[0] & 0x0F
+            if status == FC_CTS:
+                bs = d[1] if len(d) > 1 else 0
+                self.tx_block_left = bs
+                self.tx_gap = stmin_seconds(d[2] if len(d) > 2 else 0)
+                self.tx_state = "sending"
+                self.tx_next = self.clock()
+                self.poll()
+            elif status == FC_WAIT:
+                self.tx_waits += 1
+                if self.tx_waits > MAX_WAIT_FRAMES:
+                    self._abort_tx("too many FC WAIT frames")
+                else:
+                    self.tx_deadline = self.clock() + N_BS
+            else:
+                self._abort_tx("receiver overflow")
+        return True
+
+    def receive(self):
+        """Next complete payload, or None."""
+        return self.rx_done.popleft() if self.rx_done else None
+
+    # ------------------------------------------------------------
+    # blocking helper (testers)
+    # ------------------------------------------------------------
+    def request(self, payload, timeout=1.0, accept=None):
+        """
+        Send payload and wait for a response payload (optionally the first
+        one for which accept(payload) is true).  Returns None on timeout.
+        Other traffic on the bus is ignored.
+        """
+        self.rx_done.clear()
+        self.send(payload)
+        end = time.monotonic() + timeout
+        while True:
+            nxt = self.poll()
+            while self.rx_done:
+                resp = self.rx_done.popleft()
+                if accept is None or accept(resp):
+                    return resp
+            now = time.monotonic()
+            if now >= end:
+                return None
+            wait = end - now
+            if nxt is not None:
+                wait = min(wait, max(0.0, nxt - self.clock()))
+            msg = self.bus.recv(wait)
+            if msg is not None:
+                self.on_frame(msg)
+
+
+# ============================================
+# BENCHMARK
+# ============================================
+def _pump(channels, buses, extra=()):
+    """Deliver everything queued on the buses and run due CFs; cooperative."""
+    for task in extra:
+        next(task)
+    for ch, bus in zip(channels, buses):
+        while True:
+            msg = bus.recv(0.0)
+            if msg is None:
+                break
+            ch.on_frame(msg)
+    return [ch.poll() for ch in channels]
+
+
+def bench_transfer(size, block_size, st_min, gateway=False, repeats=3):
+    """(average seconds, frames) to echo `size` bytes tester -> ECU -> tester."""
+    from mem_bus import MemoryBus
+    tag = f"bench{time.monotonic_ns()}"
+    if gateway:
+        import gateway_ecu
+        pt, diag = f"{tag}-pt", f"{tag}-diag"
+        ecu_bus, tester_bus = MemoryBus(pt), MemoryBus(diag)
+        gw_pt, gw_diag = MemoryBus(pt), MemoryBus(diag)
+        gw = [gateway_ecu.gateway_task(gw_pt, gw_diag, verbose=False)]
+        extra_buses = [gw_pt, gw_diag]
+    else:
+        ecu_bus, tester_bus = MemoryBus(tag), MemoryBus(tag)
+        gw, extra_buses = [], []
+
+    # Both ends ask for the same BS / STmin from their peer
+    ecu = IsoTpChannel(ecu_bus, 0x7E8, 0x7E0, block_size, st_min)
+    tester = IsoTpChannel(tester_bus, 0x7E0, 0x7E8, block_size, st_min)
+    payload = bytes(i & 0xFF for i in range(size))
+    times = []
+    try:
+        for _ in range(repeats):
+            start = time.perf_counter()
+            tester.send(payload)
+            got = None
+            while got is None:
+                deadlines = _pump([ecu, tester], [ecu_bus, tester_bus], gw)
+                req = ecu.receive()
+                if req is not None:
+                    ecu.send(req)                    # echo back
+                got = tester.receive()
+                if got is None:
+                    pending = [d for d in deadlines if d is not None]
+                    if not pending and not any(b.queue for b in (ecu_bus, tester_bus, *extra_buses)):
+                        raise IsoTpError("transfer stalled")
+                    if pending and not any(b.queue for b in (ecu_bus, tester_bus, *extra_buses)):
+                        sleep_until(min(pending))
+            times.append(time.perf_counter() - start)
+            if got != payload:
+                raise IsoTpError("echoed payload differs")
+    finally:
+        for b in (ecu_bus, tester_bus, *extra_buses):
+            b.shutdown()
+    frames = (ecu.stats["frames_tx"] + tester.stats["frames_tx"]) // repeats
+    return sum(times) / len(times), frames
+
+
+def main():
+    parser = argparse.ArgumentParser(description="ISO-TP throughput benchmark (echo round trips)")
+    sub = parser.add_subparsers(dest="cmd", required=True)
+    p = sub.add_parser("bench")
+    p.add_argument("--size", type=int, default=MAX_PAYLOAD, help="payload bytes (<= 4095)")
+    p.add_argument("--bs", type=int, nargs="+", default=[0, 8, 32], help="block sizes")
+    p.add_argument("--stmin", type=float, nargs="+", default=[0, 0.5, 1],
+                   help="STmin values in ms (fractions map to the 100-900 us codes)")
+    p.add_argument("--gateway", action="store_true", help="route through gateway_task (PT <-> DIAG)")
+    p.add_argument("--repeats", type=int, default=3)
+    args = parser.parse_args()
+
+    path = "tester -> gateway -> ECU -> gateway -> tester" if args.gateway else "tester <-> ECU"
+    print(f"ISO-TP echo of {args.size} bytes each way ({path}, in-process MemoryBus)")
+    print(f"{'BS':>4} {'STmin':>8} {'round trip':>12} {'payload rate':>14} {'frames/trip':>12}")
+    for bs in args.bs:
+        for st_ms in args.stmin:
+            st = stmin_byte(st_ms / 1000.0)
+            try:
+                secs, frames = bench_transfer(args.size, bs, st, args.gateway, args.repeats)
+            except IsoTpError as e:
+                print(f"{bs:>4} {st_ms:>6g}ms  failed: {e}")
+                continue
+            rate = 2 * args.size / secs / 1024
+            print(f"{bs:>4} {st_ms:>6g}ms {secs * 1000:>10.1f}ms {rate:>10.1f} KiB/s {frames:>12}")
+
+
+if __name__ == "__main__":
+    main()
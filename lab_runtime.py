@@ -0,0 +1,214 @@
+"""Single-process multi-ECU runtime on an in-memory CAN bus.
+
+This module hosts the whole lab in one process:
+- Engine, transmission, ABS, OBD and gateway ECUs run as cooperative tasks
+  (the engine_task() / trans_task() / ... generators from each ECU script).
+- A dashboard stand-in sends the driver profile as DriverInputs (0x400) on
+  vcan1, so pedals and mode reach the ECUs through the gateway exactly as
+  from gui_dashboard.py.
+- vcan0 (PT) and vcan1 (DIAG) are MemoryBus channels, so there are no kernel
+  round-trips and no vcan module or root is needed.
+- A deterministic scheduler advances a virtual clock in TCU_DT ticks: due
+  periodic tasks run first, then reactive tasks run until every bus is idle.
+  Runs are repeatable (seeded) and, unless --realtime is given, go as fast
+  as the CPU allows.
+
+The ECU scripts still run standalone on SocketCAN; this is for CI and for
+laptops without vcan.
+
+Usage:
+    python lab_runtime.py --duration 120
+    python lab_runtime.py --realtime --driver launch -v
+"""
+
+import argparse
+import random
+import sys
+import time
+
+import dbc_codec
+import sim_core
+from sim_core import ENGINE_DT, TCU_DT
+from mem_bus import MemoryBus
+from scheduler import FixedRateScheduler
+import control_plane
+import driver_inputs
+
+import engine_ecu
+import trans_ecu
+import abs_ecu
+import obd_ecu
+import gateway_ecu
+
+# Upper bound on reactive passes per tick (guards against forwarding loops)
+MAX_SETTLE_ROUNDS = 100
+
+
+class LabRuntime:
+    """Deterministic cooperative scheduler with a virtual clock."""
+
+    def __init__(self, tick=TCU_DT):
+        self.tick = tick
+        self.ticks = 0
+        self.now = 0.0
+        self.epoch = time.time()
+        self.periodic = []   # (name, task, period_ticks)
+        self.reactive = []   # (name, task, buses)
+        self.buses = []
+
+    def clock(self):
+        """Wall-clock style timestamp for frames: start time + virtual time."""
+        return self.epoch + self.now
+
+    def bus(self, channel):
+        b = MemoryBus(channel, clock=self.clock)
+        self.buses.append(b)
+        return b
+
+    def add_periodic(self, name, task, period):
+        self.periodic.append((name, task, max(1, int(round(period / self.tick)))))
+
+    def add_reactive(self, name, task, buses):
+        self.reactive.append((name, task, tuple(buses)))
+
+    def step(self):
+        """Advance the virtual clock by one tick."""
+        for name, task, every in self.periodic:
+            if self.ticks % every == 0:
+                next(task)
+        self.settle()
+        self.ticks += 1
+        self.now = self.ticks * self.tick
+
+    def settle(self):
+        """Run reactive tasks until no bus they listen on has frames waiting."""
+        for _ in range(MAX_SETTLE_ROUNDS):
+            busy = False
+            for name, task, buses in self.reactive:
+                while any(b.queue for b in buses):
+                    next(task)
+                    busy = True
+            if not busy:
+                return
+        print(f"[runtime] bus did not settle after {MAX_SETTLE_ROUNDS} rounds")
+
+    def run(self, duration, realtime=False, control=None):
+        """
+        Run `duration` simulated seconds.  With a control_plane.ControlState,
+        pause / step / time scale from master_control.py apply as well.
+        """
+        n = int(round(duration / self.tick))
+        sched = FixedRateScheduler(self.tick, name="Lab runtime") if realtime else None
+        done = 0
+        while done < n:
+            if control is not None and control.paused:
+                if sched:
+                    sched.reset()
+                if not control.take_step(self.tick, timeout=1.0):
+                    continue
+            self.step()
+            done += 1
+            if sched:
+                if control is not None:
+                    sched.time_scale = control.time_scale
+                sched.wait()
+        return sched
+
+    def frames_sent(self):
+        return sum(b.tx_count for b in self.buses)
+
+    def shutdown(self):
+        for b in self.buses:
+            b.shutdown()
+
+
+def monitor_task(bus, latest):
+    """Drain a bus and keep the newest decoded value of every DBC signal."""
+    while True:
+        msg = bus.recv(0.0)
+        if msg is not None:
+            try:
+                latest.update(dbc_codec.decode_message(msg.arbitration_id, msg.data))
+            except (KeyError, ValueError):
+                pass
+            latest["frames"] = latest.get("frames", 0) + 1
+        yield
+
+
+def build_lab(rt, driver="city", verbose=False):
+    """Create every ECU on the runtime's in-memory vcan0 / vcan1."""
+    if driver == "launch":
+        profile = sim_core.launch_profile(100, "S")
+    else:
+        profile = sim_core.cycle_profile(sim_core.CITY_HIGHWAY)
+
+    # Dashboard stand-in: driver profile -> DriverInputs frames on DIAG
+    rt.add_periodic("driver", driver_inputs.driver_task(
+        rt.bus("vcan1"), profile, clock=lambda: rt.now), driver_inputs.CYCLE)
+
+    rt.add_periodic("engine", engine_ecu.engine_task(
+        rt.bus("vcan0"), verbose=verbose), ENGINE_DT)
+    rt.add_periodic("trans", trans_ecu.trans_task(
+        rt.bus("vcan0"), verbose=verbose), TCU_DT)
+
+    abs_bus = rt.bus("vcan0")
+    rt.add_reactive("abs", abs_ecu.abs_task(abs_bus, timeout=0.0, verbose=verbose), [abs_bus])
+
+    obd_bus = rt.bus("vcan0")
+    rt.add_reactive("obd", obd_ecu.obd_task(
+        obd_bus, timeout=0.0, verbose=verbose, clock=lambda: rt.now), [obd_bus])
+
+    gw_pt, gw_diag = rt.bus("vcan0"), rt.bus("vcan1")
+    rt.add_reactive("gateway", gateway_ecu.gateway_task(
+        gw_pt, gw_diag, verbose=verbose), [gw_pt, gw_diag])
+
+    # Stand-in for the dashboards: watches the diagnostic side of the gateway
+    latest = {}
+    mon_bus = rt.bus("vcan1")
+    rt.add_reactive("monitor", monitor_task(mon_bus, latest), [mon_bus])
+    return latest
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run all ECUs in one process on an in-memory bus")
+    parser.add_argument("--duration", type=float, default=60.0, help="simulated seconds")
+    parser.add_argument("--driver", choices=("city", "launch"), default="city",
+                        help="driver profile sent as DriverInputs frames")
+    parser.add_argument("--realtime", action="store_true", help="pace ticks to the wall clock")
+    parser.add_argument("--control", action="store_true",
+                        help="follow pause / step / time scale from master_control.py")
+    parser.add_argument("--seed", type=int, default=1, help="random seed (wheel / oil noise)")
+    parser.add_argument("-v", "--verbose", action="store_true", help="per-frame ECU prints")
+    args = parser.parse_args()
+
+    random.seed(args.seed)
+    rt = LabRuntime()
+    latest = build_lab(rt, driver=args.driver, verbose=args.verbose)
+    control = control_plane.subscribe("Lab runtime") if args.control else None
+
+    print("Lab runtime: engine, trans, ABS, OBD, gateway on in-memory vcan0/vcan1")
+    print(f"Simulating {args.duration:.0f} s ({'real time' if args.realtime else 'as fast as possible'})")
+
+    start = time.perf_counter()
+    try:
+        sched = rt.run(args.duration, realtime=args.realtime, control=control)
+    except KeyboardInterrupt:
+        sched = None
+        print("\nLab runtime stopped.")
+    finally:
+        rt.shutdown()
+    elapsed = time.perf_counter() - start
+
+    frames = rt.frames_sent()
+    print(f"Simulated {rt.now:.1f} s in {elapsed:.2f} s wall "
+          f"({rt.now / elapsed:.1f}x), {frames} frames ({frames / elapsed:.0f} frames/s)")
+    if latest:
+        print(f"DIAG side saw {latest.get('frames', 0)} frames; last: "
+              f"RPM={latest.get('RPM', 0):.0f} Speed={latest.get('Speed', 0):.0f} km/h "
+              f"Gear={latest.get('Gear', 0)}")
+    if sched:
+        print(sched.report())
+
+
+if __name__ == "__main__":
+    sys.exit(main())
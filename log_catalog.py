@@ -0,0 +1,518 @@
+"""SQLite catalog and sparse time index for the lab's logs.
+
+Every dbc_log / engine_log CSV, .canlog (binlog.py, flight-recorder
+captures) and .colog (colog.py) gets:
+- a `logs` row: format, size, mtime, time span, frame count;
+- `signals` rows: samples, min/max, first/last time per signal;
+- `time_index` rows: a sparse time -> byte offset index, one entry per
+  BLOCK_SECONDS slice (CSV row / .canlog record where the slice starts);
+- `blocks` rows: the value range of every signal in every slice (for
+  .colog: one row per chunk, with the chunk's own offset and stats).
+
+So "RPM>6000 in any run last week" is an index lookup, and reading
+seconds 120-130 of a log seeks straight to the right offset instead of
+scanning the file.  Indexing is incremental: unchanged files are skipped,
+and a file that grew (a log still being written) is re-indexed from its
+last block instead of from the start.  The loggers index each log as
+they close it.
+
+Usage:
+    python log_catalog.py update [DIR ...]         # index new / changed logs
+    python log_catalog.py list
+    python log_catalog.py find 'RPM>6000' [--since 7d]
+    python log_catalog.py window LOG 120 130 [--signals RPM,Speed]
+"""
+
+import argparse
+import glob
+import os
+import re
+import sqlite3
+import time
+
+import numpy as np
+
+import binlog
+import colog
+import dbc_codec
+
+LAB_DIR = os.path.dirname(os.path.abspath(__file__))
+CATALOG_PATH = os.environ.get("CAN_LAB_CATALOG", os.path.join(LAB_DIR, "log_catalog.sqlite"))
+LOG_PATTERNS = ("dbc_log_*.csv", "engine_log_*.csv", "*.canlog", "*.colog")
+BLOCK_SECONDS = 5.0
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS logs (
+    id          INTEGER PRIMARY KEY,
+    path        TEXT UNIQUE NOT NULL,
+    format      TEXT NOT NULL,
+    size        INTEGER NOT NULL,
+    mtime_ns    INTEGER NOT NULL,
+    t_start     REAL,
+    t_end       REAL,
+    frames      INTEGER NOT NULL DEFAULT 0,
+    indexed_at  REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS signals (
+    log_id      INTEGER NOT NULL REFERENCES logs(id) ON DELETE CASCADE,
+    name        TEXT NOT NULL,
+    samples     INTEGER NOT NULL,
+    vmin        REAL,
+    vmax        REAL,
+    t_first     REAL,
+    t_last      REAL,
+    PRIMARY KEY (log_id, name)
+);
+CREATE TABLE IF NOT EXISTS time_index (
+    log_id      INTEGER NOT NULL REFERENCES logs(id) ON DELETE CASCADE,
+    t0          REAL NOT NULL,
+    t1          REAL NOT NULL,
+    offset      INTEGER NOT NULL,
+    rows        INTEGER NOT NULL
+);
+CREATE TABLE IF NOT EXISTS blocks (
+    log_id      INTEGER NOT NULL REFERENCES logs(id) ON DELETE CASCADE,
+    name        TEXT NOT NULL,
+    t0          REAL NOT NULL,
+    t1          REAL NOT NULL,
+    vmin        REAL NOT NULL,
+    vmax        REAL NOT NULL,
+    offset      INTEGER NOT NULL,
+    samples     INTEGER NOT NULL
+);
+CREATE INDEX IF NOT EXISTS blocks_by_signal ON blocks (name, vmax, vmin);
+CREATE INDEX IF NOT EXISTS blocks_by_log ON blocks (log_id, t0);
+CREATE INDEX IF NOT EXISTS time_index_by_log ON time_index (log_id, t0);
+"""
+
+
+def connect(path=None):
+    db = sqlite3.connect(path or CATALOG_PATH)
+    db.execute("PRAGMA foreign_keys = ON")
+    db.executescript(SCHEMA)
+    return db
+
+
+def log_format(path):
+    if path.endswith(".canlog"):
+        return "canlog"
+    if path.endswith(".colog"):
+        return "colog"
+    return "csv"
+
+
+# ============================================
+# SCANNERS
+# ============================================
+# Each scanner yields (offset, timestamp, {signal: value}) per frame/row,
+# starting at byte `start` (0 = beginning of data).
+
+def scan_canlog(path, start=0):
+    size = binlog.RECORD.size
+    base = binlog.HEADER.size
+    with open(path, "rb") as f:
+        binlog.read_header(f)
+        if start > base:
+            f.seek(start)
+        offset = f.tell()
+        while True:
+            chunk = f.read(size * 4096)
+            if len(chunk) < size:
+                return
+            usable = len(chunk) - len(chunk) % size
+            for ts, can_id, dlc, flags, data in binlog.RECORD.iter_unpack(chunk[:usable]):
+                values = {}
+                decoder = dbc_codec.DECODERS.get(can_id)
+                if decoder is not None:
+                    try:
+                        values = dict(zip(dbc_codec.SIGNALS[can_id], decoder(data[:dlc])))
+                    except ValueError:
+                        pass
+                yield offset, ts, values
+                offset += size
+            f.seek(offset)
+
+
+def scan_csv(path, start=0):
+    with open(path, "rb") as f:
+        header = f.readline().decode().rstrip("\r\n").split(",")
+        if start > f.tell():
+            f.seek(start)
+        if "can_id" in header:
+            columns = [(j, name) for j, name in enumerate(header) if name not in colog.FRAME_COLUMNS]
+        else:
+            columns = [(j, colog.ENGINE_LOG_COLUMNS.get(name, name))
+                       for j, name in enumerate(header) if name != "timestamp"]
+        ts_col = header.index("timestamp")
+        offset = f.tell()
+        for line in f:
+            if not line.endswith(b"\n"):
+                return      # torn last row of a log still being written
+            cells = line.decode().rstrip("\r\n").split(",")
+            here = offset
+            offset += len(line)
+            if len(cells) <= ts_col or cells[ts_col] == "":
+                continue
+            values = {name: float(cells[j]) for j, name in columns
+                      if j < len(cells) and cells[j] != ""}
+            yield here, float(cells[ts_col]), values
+
+
+# ============================================
+# INDEXING
+# ============================================
+def _index_stream(db, log_id, rows, block_seconds):
+    """Write time_index + blocks for scanner rows; returns (rows, t_first, t_last)."""
+    count = 0
+    t_first = t_last = None
+    block_t0 = block_off = None
+    block_rows = 0
+    block = {}          # name -> [vmin, vmax, samples]
+
+    def flush():
+        db.execute("INSERT INTO time_index (log_id, t0, t1, offset, rows) VALUES (?, ?, ?, ?, ?)",
+                   (log_id, block_t0, t_last, block_off, block_rows))
+        db.executemany(
+            "INSERT INTO blocks (log_id, name, t0, t1, vmin, vmax, offset, samples) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+            [(log_id, name, block_t0, t_last, s[0], s[1], block_off, s[2])
+             for name, s in block.items()])
+        block.clear()
+
+    for offset, ts, values in rows:
+        if block_t0 is None or ts >= block_t0 + block_seconds:
+            if block_t0 is not None:
+                flush()
+            block_t0, block_off, block_rows = ts, offset, 0
+        block_rows += 1
+        count += 1
+        if t_first is None:
+            t_first = ts
+        t_last = ts
+        for name, v in values.items():
+            s = block.get(name)
+            if s is None:
+                block[name] = [v, v, 1]
+                continue
+            if v < s[0]:
+                s[0] = v
+            elif v > s[1]:
+                s[1] = v
+            s[2] += 1
+    if block_t0 is not None:
+        flush()
+    return count, t_first, t_last
+
+
+def _index_colog(db, log_id, path):
+    """A .colog already has per-chunk offsets and stats: copy them."""
+    log = colog.ColumnarLog(path)
+    db.executemany(
+        "INSERT INTO blocks (log_id, name, t0, t1, vmin, vmax, offset, samples) "
+        "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+        [(log_id, name, c["t0"], c["t1"], c["min"], c["max"], c["offset"], c["n"])
+         for name in log.signals for c in log.chunks(name)])
+    t0, t1 = log.time_range()
+    samples = max((log.stats(s)[0] for s in log.signals), default=0)
+    return samples, t0, t1
+
+
+def _scanner(fmt):
+    return scan_canlog if fmt == "canlog" else scan_csv
+
+
+def index_log(path, db=None, block_seconds=BLOCK_SECONDS, force=False):
+    """
+    Add or refresh one log; returns "skipped", "indexed" or "extended".
+
+    A CSV / .canlog that only grew since it was last indexed is resumed
+    from its last time_index entry (that slice may have been partial).
+    """
+    own = db is None
+    db = db or connect()
+    try:
+        path = os.path.abspath(path)
+        st = os.stat(path)
+        fmt = log_format(path)
+        row = db.execute("SELECT id, size, mtime_ns, frames, t_start FROM logs WHERE path = ?",
+                         (path,)).fetchone()
+        if row and not force and (row[1], row[2]) == (st.st_size, st.st_mtime_ns):
+            return "skipped"
+
+        last = None
+        if row and not force and fmt != "colog" and st.st_size > row[1]:
+            last = db.execute("SELECT t0, offset FROM time_index WHERE log_id = ? "
+                              "ORDER BY t0 DESC LIMIT 1", (row[0],)).fetchone()
+
+        if last is not None:
+            log_id = row[0]
+            db.execute("DELETE FROM time_index WHERE log_id = ? AND t0 >= ?", (log_id, last[0]))
+            db.execute("DELETE FROM blocks WHERE log_id = ? AND t0 >= ?", (log_id, last[0]))
+            kept = db.execute("SELECT COALESCE(SUM(rows), 0) FROM time_index WHERE log_id = ?",
+                              (log_id,)).fetchone()[0]
+            frames, t_first, t_last = _index_stream(
+                db, log_id, _scanner(fmt)(path, last[1]), block_seconds)
+            frames += kept
+            t_first = row[4] if row[4] is not None else t_first
+            status = "extended"
+        else:
+            if row:
+                db.execute("DELETE FROM logs WHERE id = ?", (row[0],))
+            log_id = db.execute(
+                "INSERT INTO logs (path, format, size, mtime_ns, indexed_at) VALUES (?, ?, ?, ?, ?)",
+                (path, fmt, st.st_size, st.st_mtime_ns, time.time())).lastrowid
+            if fmt == "colog":
+                frames, t_first, t_last = _index_colog(db, log_id, path)
+            else:
+                frames, t_first, t_last = _index_stream(
+                    db, log_id, _scanner(fmt)(path), block_seconds)
+            status = "indexed"
+
+        db.execute("DELETE FROM signals WHERE log_id = ?", (log_id,))
+        db.execute(
+            "INSERT INTO signals (log_id, name, samples, vmin, vmax, t_first, t_last) "
+            "SELECT log_id, name, SUM(samples), MIN(vmin), MAX(vmax), MIN(t0), MAX(t1) "
+            "FROM blocks WHERE log_id = ? GROUP BY name", (log_id,))
+        db.execute("UPDATE logs SET size = ?, mtime_ns = ?, t_start = ?, t_end = ?, frames = ?, "
+                   "indexed_at = ? WHERE id = ?",
+                   (st.st_size, st.st_mtime_ns, t_first, t_last, frames, time.time(), log_id))
+        db.commit()
+        return status
+    except BaseException:
+        # A scanner error must not leave a stub logs row (it would look unchanged next time)
+        db.rollback()
+        raise
+    finally:
+        if own:
+            db.close()
+
+
+def index_closed_log(path):
+    """Hook for the loggers: index a log they just closed, never raise."""
+    try:
+        status = index_log(path)
+    except (OSError, ValueError, sqlite3.Error) as e:
+        print(f"[catalog] could not index {path}: {e}")
+        return None
+    print(f"[catalog] {status} {path}")
+    return status
+
+
+def update(dirs=(".",), db=None, verbose=True):
+    """Index new / changed logs under dirs and forget logs that were deleted."""
+    own = db is None
+    db = db or connect()
+    counts = {"indexed": 0, "extended": 0, "skipped": 0, "removed": 0}
+    try:
+        for d in dirs:
+            for pattern in LOG_PATTERNS:
+                for path in sorted(glob.glob(os.path.join(d, pattern))):
+                    try:
+                        status = index_log(path, db)
+                    except (OSError, ValueError, sqlite3.Error) as e:
+                        print(f"[catalog] skipping {path}: {e}")
+                        continue
+                    counts[status] += 1
+                    if verbose and status != "skipped":
+                        print(f"[catalog] {status} {path}")
+        for log_id, path in db.execute("SELECT id, path FROM logs").fetchall():
+            if not os.path.exists(path):
+                db.execute("DELETE FROM logs WHERE id = ?", (log_id,))
+                counts["removed"] += 1
+        db.commit()
+    finally:
+        if own:
+            db.close()
+    return counts
+
+
+# ============================================
+# QUERIES
+# ============================================
+_CONDITION = re.compile(r"^\s*(\w+)\s*(>=|<=|==|>|<)\s*([-+]?[\d.]+)\s*$")
+
+# Block predicate for each operator: true iff some sample in the block matches
+# (exact for the inequalities, since blocks store the true min/max).
+_BLOCK_SQL = {
+    ">": "b.vmax > ?",
+    ">=": "b.vmax >= ?",
+    "<": "b.vmin < ?",
+    "<=": "b.vmin <= ?",
+    "==": "b.vmin <= ? AND b.vmax >= ?",
+}
+
+
+def parse_since(text):
+    """'7d', '12h', '30m' or '90s' -> epoch seconds; None passes through."""
+    if text is None:
+        return None
+    units = {"s": 1, "m": 60, "h": 3600, "d": 86400}
+    if text[-1:] not in units:
+        raise ValueError(f"bad --since {text!r} (want e.g. 7d, 12h, 30m)")
+    return time.time() - float(text[:-1]) * units[text[-1]]
+
+
+def find(condition, since=None, db=None):
+    """
+    Logs and time spans where `condition` (e.g. "RPM>6000") holds.
+    Returns [(path, t_start, [(t0, t1), ...])] with absolute span times;
+    adjacent matching slices are merged.  Resolution is one block.
+    """
+    m = _CONDITION.match(condition)
+    if m is None:
+        raise ValueError(f"bad condition {condition!r} (want e.g. RPM>6000)")
+    name, op, value = m[1], m[2], float(m[3])
+    own = db is None
+    db = db or connect()
+    try:
+        where = _BLOCK_SQL[op]
+        params = [name] + [value] * where.count("?")
+        sql = ("SELECT l.path, l.t_start, b.t0, b.t1 FROM blocks b JOIN logs l ON l.id = b.log_id "
+               f"WHERE b.name = ? AND {where}")
+        if since is not None:
+            sql += " AND l.t_end >= ?"
+            params.append(since)
+        sql += " ORDER BY l.t_start, l.id, b.t0"
+        out = []
+        for path, t_start, t0, t1 in db.execute(sql, params):
+            if not out or out[-1][0] != path:
+                out.append((path, t_start, []))
+            spans = out[-1][2]
+            if spans and t0 - spans[-1][1] <= BLOCK_SECONDS:
+                spans[-1] = (spans[-1][0], max(spans[-1][1], t1))
+            else:
+                spans.append((t0, t1))
+        return out
+    finally:
+        if own:
+            db.close()
+
+
+def read_window(path, t_start, t_end, signals=None, relative=True, db=None):
+    """
+    {signal: (t, v)} for [t_start, t_end] of one log (seconds from the log's
+    start when relative).  The time index gives the byte offset to seek to,
+    so only the requested slice is read.
+    """
+    own = db is None
+    db = db or connect()
+    try:
+        path = os.path.abspath(path)
+        index_log(path, db)
+        log_id, fmt, base = db.execute("SELECT id, format, t_start FROM logs WHERE path = ?",
+                                       (path,)).fetchone()
+        if base is None:
+            return {}
+        if relative:
+            t_start, t_end = base + t_start, base + t_end
+        if fmt == "colog":
+            log = colog.ColumnarLog(path)
+            return {s: log.read(s, t_start, t_end) for s in log.signals
+                    if signals is None or s in signals}
+        hit = db.execute("SELECT offset FROM time_index WHERE log_id = ? AND t1 >= ? "
+                         "ORDER BY t0 LIMIT 1", (log_id, t_start)).fetchone()
+    finally:
+        if own:
+            db.close()
+    if hit is None:
+        return {}
+    series = {}
+    for offset, ts, values in _scanner(fmt)(path, hit[0]):
+        if ts > t_end:
+            break
+        if ts < t_start:
+            continue
+        for name, v in values.items():
+            if signals is None or name in signals:
+                t, vs = series.setdefault(name, ([], []))
+                t.append(ts)
+                vs.append(v)
+    return {name: (np.asarray(t), np.asarray(v, dtype=np.float64)) for name, (t, v) in series.items()}
+
+
+def latest(prefix="", formats=("csv", "colog", "canlog"), db=None):
+    """Newest cataloged log whose file name starts with prefix (or None)."""
+    own = db is None
+    db = db or connect()
+    try:
+        marks = ",".join("?" * len(formats))
+        for path, in db.execute(f"SELECT path FROM logs WHERE format IN ({marks}) "
+                                "ORDER BY COALESCE(t_end, 0) DESC, mtime_ns DESC", formats):
+            if os.path.basename(path).startswith(prefix) and os.path.exists(path):
+                return path
+        return None
+    finally:
+        if own:
+            db.close()
+
+
+def list_logs(db=None):
+    own = db is None
+    db = db or connect()
+    try:
+        lines = []
+        for log_id, path, fmt, size, t0, t1, frames in db.execute(
+                "SELECT id, path, format, size, t_start, t_end, frames FROM logs ORDER BY t_start"):
+            names = [n for n, in db.execute("SELECT name FROM signals WHERE log_id = ? "
+                                            "ORDER BY name", (log_id,))]
+            when = time.strftime("%Y-%m-%d %H:%M", time.localtime(t0)) if t0 else "-"
+            span = f"{t1 - t0:8.1f} s" if t0 is not None else "       - s"
+            lines.append(f"{when}  {span}  {frames:>8} rows  {size / 1e6:7.2f} MB  {fmt:6}  "
+                         f"{os.path.relpath(path)}  [{len(names)} signals]")
+        return "\n".join(lines)
+    finally:
+        if own:
+            db.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Catalog and query the lab's logs")
+    sub = parser.add_subparsers(dest="cmd", required=True)
+    p = sub.add_parser("update", help="index new / changed logs")
+    p.add_argument("dirs", nargs="*", default=["."])
+    sub.add_parser("list", help="list cataloged logs")
+    p = sub.add_parser("find", help="logs and spans where a condition holds")
+    p.add_argument("condition", help="e.g. 'RPM>6000', 'Gear==6'")
+    p.add_argument("--since", help="only logs that end after now - SINCE (7d, 12h, 30m)")
+    p.add_argument("--no-update", action="store_true", help="query without indexing first")
+    p = sub.add_parser("window", help="read seconds A..B of one log via the time index")
+    p.add_argument("log")
+    p.add_argument("start", type=float)
+    p.add_argument("end", type=float)
+    p.add_argument("--signals", help="comma-separated signal names")
+    args = parser.parse_args()
+
+    if args.cmd == "update":
+        start = time.perf_counter()
+        counts = update(args.dirs)
+        print(", ".join(f"{k}={v}" for k, v in counts.items()) +
+              f" ({time.perf_counter() - start:.2f} s) -> {CATALOG_PATH}")
+    elif args.cmd == "list":
+        print(list_logs() or "Catalog is empty (run: python log_catalog.py update)")
+    elif args.cmd == "find":
+        if not args.no_update:
+            update(verbose=False)
+        start = time.perf_counter()
+        try:
+            hits = find(args.condition, since=parse_since(args.since))
+        except ValueError as e:
+            parser.error(str(e))
+        elapsed = time.perf_counter() - start
+        for path, t0, spans in hits:
+            print(os.path.relpath(path))
+            for a, b in spans:
+                print(f"  {a - t0:8.1f} .. {b - t0:8.1f} s")
+        print(f"{len(hits)} logs, {sum(len(s) for _, _, s in hits)} spans ({elapsed * 1000:.1f} ms)")
+    else:
+        signals = set(args.signals.split(",")) if args.signals else None
+        start = time.perf_counter()
+        series = read_window(args.log, args.start, args.end, signals)
+        elapsed = time.perf_counter() - start
+        for name in sorted(series):
+            t, v = series[name]
+            print(f"  {name:16} n={len(t):<6} min={v.min():g} max={v.max():g}")
+        print(f"{args.log} {args.start:g}..{args.end:g} s read in {elapsed * 1000:.1f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -4,48 +4,71 @@ Entry point that can be used to:
 - Bring up virtual CAN interfaces (if desired).
 - Start Engine ECU, Transmission ECU, Gateway, and GUI processes.
 - Coordinate the multi-ECU simulation from one place.
+
+Hosts the control plane server (control_plane.py): every command is pushed
+to all subscribed ECUs and dashboards immediately, nothing polls a file.
 """
 
 import sys
-import os
 
-STATE_FILE = "/home/jathin/Desktop/CAN_LAB/global_state.txt"
+from control_plane import ControlServer, STEP_TICK
 
-def set_state(value: str):
-    value = value.strip().lower()
-    with open(STATE_FILE, "w") as f:
-        f.write(value + "\n")
-    print(f"Global state set to: {value.upper()}")
+def print_state(state):
+    mode = "PAUSE" if state["paused"] else "RUN"
+    print(f"Global state: {mode} | time scale x{state['time_scale']:g}")
 
 def main():
+    server = ControlServer()
+    try:
+        server.start()
+    except OSError as e:
+        print(f"Cannot start control server at {server.path}: {e}")
+        sys.exit(1)
+
     print("Master Control")
+    print(f"Control socket: {server.path}")
     print("Commands:")
-    print("  p  -> pause all ECUs/dashboards")
-    print("  r  -> resume all")
-    print("  q  -> quit controller")
+    print("  p      -> pause all ECUs/dashboards")
+    print("  r      -> resume all")
+    print(f"  s [N]  -> pause, then single-step N ticks ({STEP_TICK * 1000:.0f} ms each, default 1)")
+    print("  t X    -> time scale X (2 = twice real time, 0.5 = half speed)")
+    print("  l      -> list subscribers")
+    print("  q      -> quit controller")
     print()
 
-    # Ensure file exists
-    if not os.path.exists(STATE_FILE):
-        set_state("run")
-
     while True:
         try:
-            cmd = input("> ").strip().lower()
-            if cmd == "p":
-                set_state("pause")
-            elif cmd == "r":
-                set_state("run")
-            elif cmd == "q":
+            cmd = input("> ").strip().lower().split()
+            if not cmd:
+                continue
+            if cmd[0] == "p":
+                server.pause()
+                print_state(server.snapshot())
+            elif cmd[0] == "r":
+                server.resume()
+                print_state(server.snapshot())
+            elif cmd[0] == "s":
+                ticks = int(cmd[1]) if len(cmd) > 1 else 1
+                server.step(ticks)
+                print(f"Stepping {ticks} tick(s) = {ticks * STEP_TICK * 1000:.0f} ms simulated")
+            elif cmd[0] == "t" and len(cmd) > 1:
+                server.scale(float(cmd[1]))
+                print_state(server.snapshot())
+            elif cmd[0] == "l":
+                subs = server.subscribers()
+                print(f"{len(subs)} subscriber(s): {', '.join(subs) or '-'}")
+            elif cmd[0] == "q":
                 print("Exiting master controller.")
                 break
-            elif cmd == "":
-                continue
             else:
-                print("Unknown command. Use p / r / q.")
+                print("Unknown command. Use p / r / s N / t X / l / q.")
+        except ValueError as e:
+            print(f"Bad argument: {e}")
         except (EOFError, KeyboardInterrupt):
             print("\nExiting master controller.")
             break
 
+    server.close()
+
 if __name__ == "__main__":
     main()
@@ -0,0 +1,93 @@
+"""In-memory CAN bus following python-can's Bus interface.
+
+This module provides MemoryBus, a can.BusABC implementation that behaves
+like a vcan interface inside one process:
+- Every MemoryBus opened on the same channel name sees the frames the others
+  send (but not its own, unless receive_own_messages=True), like sockets on
+  vcan0 / vcan1.
+- send() / recv() / set_filters() / shutdown() work exactly as on SocketCAN,
+  so ECU code written against python-can runs unchanged.
+- No kernel round-trips and no root / vcan module needed.
+
+Frames are timestamped with the bus clock (time.time by default; the lab
+runtime passes its virtual clock).
+"""
+
+import collections
+import threading
+import time
+
+import can
+
+# channel name -> list of open MemoryBus instances
+_channels = collections.defaultdict(list)
+_channels_lock = threading.Lock()
+
+
+class MemoryBus(can.BusABC):
+    """One node's connection to an in-memory CAN channel."""
+
+    def __init__(self, channel="vcan0", receive_own_messages=False,
+                 clock=time.time, **kwargs):
+        super().__init__(channel=channel, **kwargs)
+        self.channel = channel
+        self.channel_info = f"In-memory channel {channel}"
+        self.receive_own_messages = receive_own_messages
+        self.clock = clock
+        self.queue = collections.deque()
+        self._ready = threading.Condition()
+        self.tx_count = 0
+        self.rx_count = 0
+        with _channels_lock:
+            _channels[channel].append(self)
+
+    def send(self, msg, timeout=None):
+        # One copy of the frame (data too: the sender may reuse its buffer),
+        # shared by all receivers
+        out = can.Message(
+            timestamp=self.clock(),
+            arbitration_id=msg.arbitration_id,
+            is_extended_id=msg.is_extended_id,
+            is_remote_frame=msg.is_remote_frame,
+            is_error_frame=msg.is_error_frame,
+            is_fd=msg.is_fd,
+            dlc=msg.dlc,
+            data=bytes(msg.data),
+            channel=self.channel,
+            check=False,
+        )
+        self.tx_count += 1
+        # Snapshot: other threads may open / shut down buses on this channel
+        with _channels_lock:
+            peers = list(_channels[self.channel])
+        for peer in peers:
+            if peer is self and not self.receive_own_messages:
+                continue
+            peer._deliver(out)
+
+    def _deliver(self, msg):
+        with self._ready:
+            self.queue.append(msg)
+            self._ready.notify()
+
+    def _recv_internal(self, timeout):
+        if not self.queue and timeout != 0:
+            with self._ready:
+                self._ready.wait_for(lambda: self.queue, timeout)
+        try:
+            msg = self.queue.popleft()
+        except IndexError:
+            return None, False
+        self.rx_count += 1
+        return msg, False
+
+    def pending(self):
+        """Number of frames waiting to be received."""
+        return len(self.queue)
+
+    def shutdown(self):
+        with _channels_lock:
+            peers = _channels.get(self.channel, [])
+            if self in peers:
+                peers.remove(self)
+        super().shutdown()
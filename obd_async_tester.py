@@ -0,0 +1,452 @@
+"""Pipelined OBD-II tester on asyncio.
+
+This tool:
+- Reads Mode 01 PIDs with multi-PID requests (up to six PIDs per request).
+- Keeps up to --window requests in flight.  Each response is matched to
+  the oldest outstanding request for the same ECU and PID, so no request
+  waits behind a slow answer and there is no fixed receive slice.
+- With --functional sends to the broadcast ID 0x7DF and collects the
+  answers of every ECU that responds within P2 (0x7E8, 0x7E9, ...).
+- Speaks UDS to the engine as well: --dids polls ReadDataByIdentifier
+  (0x22, several DIDs per request) the same pipelined way, and --periodic
+  opens the extended session, schedules DIDs with 0x2A and just listens to
+  the 0x5E8 stream (TesterPresent keeps the session open).
+- Receives on a python-can Notifier feeding an asyncio reader.  Segmented
+  responses are reassembled per ECU by isotp.IsoTpChannel.
+- Prints the latest values, samples/s and the request round-trip
+  latency once per second.
+
+Usage:
+    python obd_async_tester.py                           # 0C 0D 05 from the engine on vcan1
+    python obd_async_tester.py --pids 0C 0D 05 A4 --ecu 7E1
+    python obd_async_tester.py --functional --pids 00    # who answers, and which PIDs
+    python obd_async_tester.py --dids F190 F205          # UDS 0x22
+    python obd_async_tester.py --periodic F205 --rate fast
+    python obd_async_tester.py --bench                   # in-process: one-at-a-time vs pipelined
+"""
+
+import argparse
+import asyncio
+import collections
+import threading
+import time
+
+import can
+
+import isotp
+import obd_pids
+import uds
+from scheduler import RollingHistogram, sleep_until
+
+FUNCTIONAL_ID = 0x7DF
+ECU_IDS = (0x7E0, 0x7E1)        # physical request IDs; responses come on ID + 8
+P2 = 0.05                       # s to collect responses to a functional request
+LATENCY_EDGES_MS = (0.1, 0.2, 0.5, 1.0, 2.0, 5.0, 10.0, 20.0, 50.0, 100.0)
+
+
+class ObdClient:
+    """Pipelined Mode 01 / UDS client for several ECUs on one bus."""
+
+    def __init__(self, bus, ecus=ECU_IDS, window=16, timeout=0.5):
+        self.bus = bus
+        self.channels = {ecu + 8: isotp.IsoTpChannel(bus, tx_id=ecu, rx_id=ecu + 8)
+                         for ecu in ecus}
+        self.slots = asyncio.Semaphore(window)
+        self.timeout = timeout
+        self.waiting = collections.defaultdict(collections.deque)   # (resp id, pid) -> futures
+        self.uds_waiting = collections.defaultdict(collections.deque)   # (resp id, SID) -> futures
+        self.collectors = []        # open functional requests, oldest first
+        self.latest = {}            # (resp id, PID or DID) -> data bytes
+        self.latency = RollingHistogram(LATENCY_EDGES_MS, window=10000)
+        self.requests = 0
+        self.samples = 0
+        self.timeouts = 0
+
+    # ------------------------------------------------------------
+    # receive side (runs on the event loop)
+    # ------------------------------------------------------------
+    def on_frame(self, msg):
+        if msg.arbitration_id == uds.PERIODIC_ID:
+            entry = uds.parse_periodic(msg.data)
+            if entry is not None:
+                self.latest[(msg.arbitration_id, entry[0])] = entry[1]
+                self.samples += 1
+            return
+        channel = self.channels.get(msg.arbitration_id)
+        if channel is None:
+            return
+        channel.on_frame(msg)           # sends flow control for segmented responses
+        while True:
+            payload = channel.receive()
+            if payload is None:
+                return
+            if payload[0] == 0x41:
+                self._dispatch(msg.arbitration_id, payload)
+            else:
+                self._dispatch_uds(msg.arbitration_id, payload)
+
+    def _dispatch(self, resp_id, payload):
+        for pid, data in obd_pids.parse_mode01(payload).items():
+            self.latest[(resp_id, pid)] = data
+            queue = self.waiting.get((resp_id, pid))
+            while queue:
+                fut = queue.popleft()
+                if not fut.done():          # skip requests that already timed out
+                    fut.set_result(data)
+                    self.samples += 1
+                    break
+            else:
+                for c in self.collectors:
+                    if pid in c["pids"] and pid not in c["values"].setdefault(resp_id, {}):
+                        c["values"][resp_id][pid] = data
+                        self.samples += 1
+                        break
+
+    def _dispatch_uds(self, resp_id, payload):
+        """The ECU answers a service's requests in order: oldest waiting request wins."""
+        if payload[0] == uds.NEGATIVE_RESPONSE:
+            if len(payload) < 3 or payload[2] == uds.NRC_RESPONSE_PENDING:
+                return                      # keep waiting for the real answer
+            sid = payload[1]
+        else:
+            sid = payload[0] - 0x40
+        queue = self.uds_waiting.get((resp_id, sid))
+        while queue:
+            fut = queue.popleft()
+            if not fut.done():
+                fut.set_result(payload)
+                return
+
+    async def receive(self, reader):
+        async for msg in reader:
+            self.on_frame(msg)
+
+    # ------------------------------------------------------------
+    # requests
+    # ------------------------------------------------------------
+    async def read(self, pids, ecu=ECU_IDS[0]):
+        """{pid: data bytes} from one physical multi-PID request; PIDs that time out are missing."""
+        resp_id = ecu + 8
+        async with self.slots:
+            loop = asyncio.get_running_loop()
+            futs = {pid: loop.create_future() for pid in pids}
+            for pid, fut in futs.items():
+                self.waiting[(resp_id, pid)].append(fut)
+            start = time.perf_counter()
+            self.channels[resp_id].send([0x01, *pids])
+            self.requests += 1
+            _, pending = await asyncio.wait(futs.values(), timeout=self.timeout)
+            for fut in pending:
+                fut.cancel()
+            self.timeouts += len(pending)
+            self.latency.add((time.perf_counter() - start) * 1000.0)
+        return {pid: fut.result() for pid, fut in futs.items() if fut not in pending}
+
+    async def read_functional(self, pids, wait=P2):
+        """{response id: {pid: data bytes}} from every ECU answering a 0x7DF request within `wait`."""
+        collector = {"pids": set(pids), "values": {}}
+        async with self.slots:
+            self.collectors.append(collector)
+            self.bus.send(can.Message(arbitration_id=FUNCTIONAL_ID,
+                                      data=isotp.single_frame([0x01, *pids]),
+                                      is_extended_id=False))
+            self.requests += 1
+            await asyncio.sleep(wait)
+            self.collectors.remove(collector)
+        return {rid: values for rid, values in collector["values"].items() if values}
+
+
+    async def uds_request(self, payload, ecu=ECU_IDS[0]):
+        """Send one UDS request; returns the positive response payload or raises NegativeResponse."""
+        resp_id = ecu + 8
+        sid = payload[0]
+        async with self.slots:
+            fut = asyncio.get_running_loop().create_future()
+            self.uds_waiting[(resp_id, sid)].append(fut)
+            start = time.perf_counter()
+            self.channels[resp_id].send(payload)
+            self.requests += 1
+            try:
+                resp = await asyncio.wait_for(fut, self.timeout)
+            except asyncio.TimeoutError:
+                self.timeouts += 1
+                return None
+            self.latency.add((time.perf_counter() - start) * 1000.0)
+        uds.check_response(resp, sid)
+        return resp
+
+    async def read_dids(self, dids, ecu=ECU_IDS[0]):
+        """{did: data bytes} from one ReadDataByIdentifier request with several DIDs."""
+        req = [uds.READ_DATA_BY_ID]
+        for did in dids:
+            req += [did >> 8, did & 0xFF]
+        resp = await self.uds_request(req, ecu)
+        values = uds.parse_read_response(resp) if resp else {}
+        for did, data in values.items():
+            self.latest[(ecu + 8, did)] = data
+        self.samples += len(values)
+        return values
+
+    async def keep_alive(self, ecu=ECU_IDS[0], every=uds.S3 / 2):
+        """TesterPresent with suppressed response, so the session outlives S3."""
+        while True:
+            self.channels[ecu + 8].send([uds.TESTER_PRESENT, uds.SUPPRESS_POSITIVE])
+            await asyncio.sleep(every)
+
+    async def start_periodic(self, dids, rate="fast", ecu=ECU_IDS[0]):
+        """Extended session + 0x2A schedule for periodic DIDs 0xF2xx."""
+        await self.uds_request([uds.SESSION_CONTROL, uds.EXTENDED_SESSION], ecu)
+        await self.uds_request([uds.READ_PERIODIC, uds.RATE_NAMES[rate]]
+                               + [did & 0xFF for did in dids], ecu)
+
+    async def stop_periodic(self, ecu=ECU_IDS[0]):
+        await self.uds_request([uds.READ_PERIODIC, uds.MODE_STOP], ecu)
+        await self.uds_request([uds.SESSION_CONTROL, uds.DEFAULT_SESSION], ecu)
+
+
+def request_groups(items, size, max_items):
+    """
+    Split PIDs / DIDs into requests of at most max_items whose response
+    still fits one CAN frame when possible: a segmented response costs a
+    flow control round trip, which is worth more than one extra request in
+    flight.  size(item) is the response bytes the item adds.
+    """
+    groups, group, used = [], [], 1
+    for item in items:
+        need = size(item)
+        if group and (used + need > 7 or len(group) == max_items):
+            groups.append(tuple(group))
+            group, used = [], 1
+        group.append(item)
+        used += need
+    if group:
+        groups.append(tuple(group))
+    return groups
+
+
+def pid_groups(pids):
+    return request_groups(pids, lambda p: 1 + obd_pids.PIDS.get(p, ("", 4))[1],
+                          obd_pids.MAX_PIDS_PER_REQUEST)
+
+
+def did_groups(dids):
+    return request_groups(dids, lambda d: 2 + (uds.did_length(d) or 4), 16)
+
+
+async def poll(client, reads, window, duration):
+    """
+    Keep `window` requests in flight until `duration` (s) is up (None =
+    forever).  reads: callables(client) -> coroutine, one per request kind.
+    """
+    end = None if duration is None else time.perf_counter() + duration
+
+    async def worker(i):
+        read = reads[i % len(reads)]
+        while end is None or time.perf_counter() < end:
+            await read(client)
+
+    await asyncio.gather(*(worker(i) for i in range(window)))
+
+
+def format_entry(key, data):
+    if key <= 0xFF:
+        return obd_pids.format_value(key, data)
+    return f"{uds.did_name(key)} {uds.decode_did(key, data)}"
+
+
+async def report(client, every=1.0):
+    last = client.samples
+    while True:
+        await asyncio.sleep(every)
+        rate = (client.samples - last) / every
+        last = client.samples
+        values = " | ".join(
+            f"{rid:03X}:{key:02X}={format_entry(key, data)}"
+            for (rid, key), data in sorted(client.latest.items())
+        )
+        print(f"{rate:7.0f} samples/s | rtt p50<{client.latency.percentile(50):g} "
+              f"p99<{client.latency.percentile(99):g} ms | timeouts={client.timeouts} | {values}")
+
+
+async def run_client(bus, reads, window, duration, periodic=None, verbose=True):
+    """
+    Run the pipelined poller on `bus`, or with periodic=(dids, rate) let the
+    engine stream those DIDs instead.  Returns the client (for its counters).
+    """
+    loop = asyncio.get_running_loop()
+    reader = can.AsyncBufferedReader()
+    notifier = can.Notifier(bus, [reader], timeout=0.1, loop=loop)
+    client = ObdClient(bus, window=window)
+    receiver = asyncio.create_task(client.receive(reader))
+    tasks = [asyncio.create_task(report(client))] if verbose else []
+    try:
+        if periodic:
+            await client.start_periodic(*periodic)
+            tasks.append(asyncio.create_task(client.keep_alive()))
+            await asyncio.sleep(duration if duration is not None else float("inf"))
+        else:
+            await poll(client, reads, window, duration)
+    finally:
+        for task in tasks:
+            task.cancel()
+        if periodic:
+            try:
+                await client.stop_periodic()
+            except uds.NegativeResponse:
+                pass
+        receiver.cancel()
+        notifier.stop()
+    return client
+
+
+# ============================================
+# BENCHMARK (in-process ECU on a MemoryBus)
+# ============================================
+class DelayedBus:
+    """Wraps a bus so every frame it sends arrives `delay` s later (ECU response time)."""
+
+    def __init__(self, bus, delay):
+        self.bus = bus
+        self.delay = delay
+        self.queue = collections.deque()
+        self.ready = threading.Condition()
+        threading.Thread(target=self._run, daemon=True).start()
+
+    def send(self, msg, timeout=None):
+        with self.ready:
+            self.queue.append((time.monotonic() + self.delay, msg))
+            self.ready.notify()
+
+    def _run(self):
+        while True:
+            with self.ready:
+                self.ready.wait_for(lambda: self.queue)
+                due, msg = self.queue.popleft()
+            sleep_until(due)
+            self.bus.send(msg)
+
+    def recv(self, timeout=None):
+        return self.bus.recv(timeout)
+
+
+def start_ecu(channel, delay):
+    """Run obd_ecu.obd_task on a MemoryBus channel in a thread; returns a stop Event."""
+    import obd_ecu
+    from mem_bus import MemoryBus
+    bus = MemoryBus(channel)
+    obd_ecu.state.update(rpm=2500, speed=80, coolant=90, gear=4)
+    halt = threading.Event()
+
+    def run():
+        task = obd_ecu.obd_task(DelayedBus(bus, delay) if delay else bus,
+                                timeout=0.05, verbose=False)
+        while not halt.is_set():
+            next(task)
+        bus.shutdown()
+
+    threading.Thread(target=run, daemon=True).start()
+    return halt
+
+
+def bench_blocking(bus, pids, duration):
+    """The old tester's pattern: one PID per request, wait for each answer."""
+    channel = isotp.IsoTpChannel(bus, tx_id=ECU_IDS[0], rx_id=ECU_IDS[0] + 8)
+    samples = 0
+    end = time.perf_counter() + duration
+    while time.perf_counter() < end:
+        for pid in pids:
+            resp = channel.request([0x01, pid], 0.5, accept=lambda r: r[:1] == b"\x41")
+            samples += pid in obd_pids.parse_mode01(resp or b"")
+    return samples / duration
+
+
+def bench(pids, windows, duration, delay, dids=(0xF205,)):
+    from mem_bus import MemoryBus
+    channel = f"obd-bench-{time.monotonic_ns()}"
+    halt = start_ecu(channel, delay)
+    bus = MemoryBus(channel)
+    print(f"PIDs {' '.join(f'{p:02X}' for p in pids)}, ECU response delay {delay * 1000:g} ms, "
+          f"requests {' / '.join(' '.join(f'{p:02X}' for p in g) for g in pid_groups(pids))}")
+
+    def run(reads, window, periodic=None):
+        frames = bus.tx_count + bus.rx_count
+        client = asyncio.run(run_client(bus, reads, window, duration, periodic, verbose=False))
+        frames = bus.tx_count + bus.rx_count - frames
+        rate = client.samples / duration
+        return rate, frames / max(1, client.samples), client
+
+    try:
+        base = bench_blocking(bus, pids, duration)
+        print(f"{'one PID per request, blocking':30}: {base:8.0f} samples/s")
+        reads = [lambda c, g=g: c.read(g) for g in pid_groups(pids)]
+        for window in windows:
+            rate, _, client = run(reads, window)
+            print(f"{f'multi-PID, window {window}':30}: {rate:8.0f} samples/s "
+                  f"({rate / base:4.1f}x, rtt p50<{client.latency.percentile(50):g} ms, "
+                  f"timeouts={client.timeouts})")
+
+        names = " ".join(f"{d:04X}" for d in dids)
+        reads = [lambda c, g=g: c.read_dids(g) for g in did_groups(dids)]
+        rate, cost, _ = run(reads, windows[-1])
+        print(f"{f'UDS 0x22 {names}, window {windows[-1]}':30}: {rate:8.0f} samples/s, "
+              f"{cost:.1f} frames/sample")
+        for name in ("medium", "fast"):
+            rate, cost, _ = run([], 1, (dids, name))
+            print(f"{f'UDS 0x2A {names} {name}':30}: {rate:8.0f} samples/s, "
+                  f"{cost:.1f} frames/sample, no requests")
+    finally:
+        halt.set()
+        bus.shutdown()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Pipelined asyncio OBD-II / UDS tester")
+    parser.add_argument("--channel", default="vcan1", help="CAN channel (DIAG side of the gateway)")
+    parser.add_argument("--interface", default="socketcan")
+    parser.add_argument("--pids", nargs="+", default=["0C", "0D", "05"], help="hex PIDs")
+    parser.add_argument("--ecu", default="7E0", help="physical request ID (hex)")
+    parser.add_argument("--functional", action="store_true", help="broadcast on 0x7DF, collect all ECUs")
+    parser.add_argument("--dids", nargs="+", help="hex DIDs to poll with UDS 0x22 instead of PIDs")
+    parser.add_argument("--periodic", nargs="+", help="hex DIDs (0xF2xx) to stream with UDS 0x2A")
+    parser.add_argument("--rate", choices=sorted(uds.RATE_NAMES), default="fast", help="--periodic rate")
+    parser.add_argument("--window", type=int, default=16, help="requests in flight")
+    parser.add_argument("--duration", type=float, default=None, help="seconds (default: until Ctrl+C)")
+    parser.add_argument("--bench", action="store_true",
+                        help="in-process ECU: blocking vs pipelined vs periodic")
+    parser.add_argument("--delay", type=float, default=2.0,
+                        help="--bench: ECU response delay in ms (bus + gateway + ECU)")
+    args = parser.parse_args()
+
+    pids = [int(p, 16) for p in args.pids]
+    if args.bench:
+        bench(pids, (1, 4, 8, 16), args.duration or 2.0, args.delay / 1000.0)
+        return
+
+    ecu = int(args.ecu, 16)
+    periodic = None
+    if args.periodic:
+        periodic = ([int(d, 16) for d in args.periodic], args.rate)
+        reads, what = [], f"periodic DIDs {' '.join(args.periodic)} ({args.rate}) on 0x{uds.PERIODIC_ID:03X}"
+    elif args.dids:
+        reads = [lambda c, g=g: c.read_dids(g, ecu) for g in did_groups([int(d, 16) for d in args.dids])]
+        what = f"DIDs {' '.join(args.dids)} -> 0x{ecu:03X}"
+    elif args.functional:
+        reads = [lambda c, g=g: c.read_functional(g) for g in pid_groups(pids)]
+        what = f"PIDs {' '.join(args.pids)} -> 0x{FUNCTIONAL_ID:03X} (functional)"
+    else:
+        reads = [lambda c, g=g: c.read(g, ecu) for g in pid_groups(pids)]
+        what = f"PIDs {' '.join(args.pids)} -> 0x{ecu:03X}"
+
+    bus = can.interface.Bus(interface=args.interface, channel=args.channel)
+    print(f"Reading {what} on {args.channel}, window {args.window}")
+    try:
+        client = asyncio.run(run_client(bus, reads, args.window, args.duration, periodic))
+        print(f"{client.requests} requests, {client.samples} samples, {client.timeouts} timeouts")
+    except KeyboardInterrupt:
+        print("\nOBD tester stopped.")
+    finally:
+        bus.shutdown()
+
+
+if __name__ == "__main__":
+    main()
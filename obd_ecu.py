@@ -1,21 +1,40 @@
 import can
+import functools
 import sys
 import time
 
-sys.stdout.write("\033]0;OBD ECU\007")
-sys.stdout.flush()
+import control_plane
+import dbc_codec
+import dtc_monitor
+import dtc_nvm
+import isotp
+import obd_pids
+import uds
 
-bus = can.interface.Bus(channel="vcan0", bustype="socketcan")
+# Physical request IDs of the emulated ECUs; each answers on its ID + 8.
+# Both also answer functional (broadcast) requests on 0x7DF.
+ENGINE_ID = 0x7E0
+TCU_ID = 0x7E1
+FUNCTIONAL_ID = 0x7DF
 
 # Live values from Engine ECU
 state = {
     "rpm": 0.0,
     "speed": 0.0,
     "coolant": 0.0,
+    "gear": 0,
 }
 
-# Simple DTC set (SAE-style codes)
-dtcs = {"P0128", "P0300"}
+# Stored DTCs (SAE-style codes) with occurrence counters and freeze frames;
+# filled by the DTC monitor.  Anonymous until obd_task() opens dtc_nvm.bin.
+nvm = dtc_nvm.DtcNvm(None)
+
+# Freeze frame of the current values, preallocated and kept up to date on
+# every EngineData/GearboxData frame; storing a DTC copies it into the NVM
+freeze_buffer = bytearray(dtc_nvm.FREEZE.size)
+
+# Mode 09 PID 02 (17 characters, sent multi-frame over ISO-TP)
+VIN = "CANLAB00000000001"
 
 def update_from_engine(msg):
     """Update live values from EngineData (0x100)."""
@@ -26,6 +45,23 @@ def update_from_engine(msg):
     state["rpm"] = rpm_raw * 4
     state["speed"] = d[2]
     state["coolant"] = d[3] - 40
+    update_freeze_buffer()
+
+def update_from_gearbox(msg):
+    """Update the current gear from GearboxData (0x300)."""
+    try:
+        state["gear"] = dbc_codec.decode_gearbox_data(msg.data)[0]
+    except ValueError:
+        return
+    update_freeze_buffer()
+
+def update_freeze_buffer():
+    """Pack the live values into freeze_buffer (OBD encoding, no allocation)."""
+    dtc_nvm.FREEZE.pack_into(freeze_buffer, 0,
+                             max(0, min(int(state["rpm"]), 16383)) * 4,
+                             max(0, min(int(state["speed"]), 255)),
+                             max(0, min(int(state["coolant"]) + 40, 255)),
+                             int(state["gear"]) & 0xFF)
 
 def encode_dtc(code):
     """
@@ -48,156 +84,404 @@ def encode_dtc(code):
     B = (d3 << 4) | d4
     return A, B
 
-def handle_mode01_request(msg):
-    """Handle Mode 01 (current data) PID requests."""
-    d = msg.data
-    if len(d) < 3:
-        return None
+def pid_coolant():
+    temp = int(state["coolant"]) + 40
+    return [max(0, min(temp, 255))]
 
-    length = d[0]
-    if length < 2:
-        return None
+def pid_rpm():
+    rpm = max(0, min(int(state["rpm"]), 16383))
+    rpm_raw = int(rpm * 4)  # OBD-II encoding: (A*256 + B)/4 = RPM
+    return [(rpm_raw >> 8) & 0xFF, rpm_raw & 0xFF]
+
+def pid_speed():
+    return [max(0, min(int(state["speed"]), 255))]
+
+def pid_gear():
+    return obd_pids.encode_gear(int(state["gear"]))
+
+# Mode 01 PIDs each emulated ECU answers (physical request ID -> PIDs)
+MODE01_PIDS = {
+    ENGINE_ID: {0x05: pid_coolant, 0x0C: pid_rpm, 0x0D: pid_speed},
+    TCU_ID: {0xA4: pid_gear},
+}
 
-    mode_req = d[1]
-    pid = d[2]
-    if mode_req != 0x01:
+def handle_mode01_request(req, pids=MODE01_PIDS[ENGINE_ID]):
+    """
+    Handle Mode 01 (current data) requests; req = [0x01, pid, ...] with up
+    to six PIDs.  The response lists every supported PID with its data in
+    request order; None if the ECU supports none of them.
+    """
+    if not 2 <= len(req) <= 1 + obd_pids.MAX_PIDS_PER_REQUEST:
         return None
 
-    mode_resp = 0x40 + mode_req  # 0x41
-
-    resp_data = [0x00] * 8
-    resp_data[1] = mode_resp
-    resp_data[2] = pid
-
-    if pid == 0x0C:  # RPM
-        rpm = max(0, min(int(state["rpm"]), 16383))
-        rpm_raw = int(rpm * 4)  # OBD-II encoding: (A*256 + B)/4 = RPM
-        A = (rpm_raw >> 8) & 0xFF
-        B = rpm_raw & 0xFF
-        resp_data[0] = 0x04
-        resp_data[3] = A
-        resp_data[4] = B
-
-    elif pid == 0x0D:  # Speed
-        spd = max(0, min(int(state["speed"]), 255))
-        resp_data[0] = 0x03
-        resp_data[3] = spd
-
-    elif pid == 0x05:  # Coolant
-        temp = int(state["coolant"]) + 40
-        temp = max(0, min(temp, 255))
-        resp_data[0] = 0x03
-        resp_data[3] = temp
-
-    else:
+    resp_data = [0x41]
+    for pid in req[1:]:
+        if obd_pids.is_range_pid(pid):
+            data = obd_pids.supported_bitmap(pids, pid)
+        elif pid in pids:
+            data = pids[pid]()
+        else:
+            continue
+        if data is not None:
+            resp_data.append(pid)
+            resp_data.extend(data)
+
+    return resp_data if len(resp_data) > 1 else None
+
+# Mode 02 PIDs served from a stored freeze frame: (DTC, FREEZE bytes) -> data
+FREEZE_PIDS = {
+    0x02: lambda code, ff: list(encode_dtc(code)),     # DTC that stored the frame
+    0x05: lambda code, ff: [ff[3]],
+    0x0C: lambda code, ff: [ff[0], ff[1]],
+    0x0D: lambda code, ff: [ff[2]],
+    0xA4: lambda code, ff: obd_pids.encode_gear(ff[4]),
+}
+
+def handle_mode02_request(req):
+    """
+    Mode 02 (freeze frame data); req = [0x02, pid, frame, pid, frame, ...].
+    The response has pid, frame and data for each pair the NVM can answer;
+    None if it answers none of them.
+    """
+    if len(req) < 3 or len(req) % 2 == 0:
         return None
 
-    return resp_data
+    frames = nvm.freeze_frames()
+    resp_data = [0x42]
+    for pid, frame in zip(req[1::2], req[2::2]):
+        if frame >= len(frames):
+            continue
+        if obd_pids.is_range_pid(pid):
+            data = obd_pids.supported_bitmap(FREEZE_PIDS, pid)
+        elif pid in FREEZE_PIDS:
+            data = FREEZE_PIDS[pid](*frames[frame])
+        else:
+            continue
+        if data is not None:
+            resp_data += [pid, frame] + data
+
+    return resp_data if len(resp_data) > 1 else None
 
 def handle_mode03_request():
     """Mode 03: request emission-related DTCs."""
-    # Response: 0x43 + list of DTCs (2 bytes each)
-    resp_data = [0x00] * 8
-    mode_resp = 0x43
-
-    if not dtcs:
-        # No codes stored – respond with zero DTCs
-        resp_data[0] = 0x02  # length: mode only
-        resp_data[1] = mode_resp
-        return resp_data
-
-    # For simplicity, only return up to 3 DTCs (fits in one frame)
-    codes = list(dtcs)[:3]
-    length = 2 + 2 * len(codes)  # mode + 2 bytes per DTC
-    resp_data[0] = length
-    resp_data[1] = mode_resp
-
-    idx = 3
-    for code in codes:
-        A, B = encode_dtc(code)
-        if idx >= 8:
-            break
-        resp_data[idx] = A
-        if idx + 1 < 8:
-            resp_data[idx + 1] = B
-        idx += 2
-
+    # Response: 0x43 + list of DTCs (2 bytes each).  More than 3 codes no
+    # longer fit one frame; ISO-TP segments the response.
+    resp_data = [0x43]
+    for code in nvm.codes("confirmed"):
+        resp_data.extend(encode_dtc(code))
     return resp_data
 
 def handle_mode04_request():
-    """Mode 04: clear DTCs."""
-    dtcs.clear()
-    resp_data = [0x00] * 8
-    resp_data[0] = 0x02  # length: mode only
-    resp_data[1] = 0x44  # response to mode 04
+    """Mode 04: clear DTCs and freeze frames."""
+    nvm.clear()
+    monitor.clear()
+    return [0x44]  # response to mode 04
+
+def handle_mode07_request():
+    """Mode 07: pending DTCs (failed, not yet confirmed)."""
+    resp_data = [0x47]
+    for code in nvm.codes("pending"):
+        resp_data.extend(encode_dtc(code))
     return resp_data
 
-def inject_faults():
-    """Simple logic to auto-create some DTCs based on live values."""
-    # Coolant below ~80°C at any reasonable speed → P0128
-    if state["coolant"] < 80 and state["speed"] > 10:
-        dtcs.add("P0128")
+def handle_mode09_request(req):
+    """Mode 09 (vehicle information): PID 02 = VIN (multi-frame)."""
+    if len(req) < 2 or req[1] != 0x02:
+        return None
+    # 0x49, PID, number of data items, 17 VIN characters
+    return [0x49, 0x02, 0x01] + list(VIN.encode("ascii"))
 
-    # RPM above 2500 at low speed → P0300
-    if state["rpm"] > 2500 and state["speed"] < 15:
-        dtcs.add("P0300")
+def on_dtc_change(rule, old, ts, verbose=True):
+    """
+    DTC monitor callback: write the DTC to the NVM (with the freeze frame
+    when it is new); a healed pending DTC is erased.  Confirmed codes are
+    reported by Mode 03, aged ones stay stored but leave Mode 03.
+    """
+    if rule.status == "ok":
+        nvm.erase(rule.dtc)
+    elif not nvm.record(rule.dtc, rule.status, rule.occurrences, freeze_buffer):
+        print(f"[DTC] NVM full, {rule.dtc} not stored")
+    if verbose and rule.status != old:
+        print(f"[DTC] {rule.dtc} {old} -> {rule.status} ({rule.name})")
+
+# Fault rules from dtc_rules.json, evaluated on every PT frame
+monitor = dtc_monitor.DtcMonitor(on_change=on_dtc_change)
+
+# UDS server state (engine only): session, S3 deadline, periodic schedule
+uds_state = {
+    "session": uds.DEFAULT_SESSION,
+    "s3_deadline": None,
+    "periodic": {},         # periodic id (low byte of 0xF2xx) -> {"rate": s, "due": t}
+}
 
-def handle_obd_request(msg):
-    """Handle any OBD request on 0x7E0 (Mode 01, 03, 04)."""
-    global dtcs
+def engine_snapshot():
+    """DID F205: RPM (2 bytes), speed, coolant + 40, gear in one record."""
+    rpm = max(0, min(int(state["rpm"]), 16383))
+    return [rpm >> 8, rpm & 0xFF] + pid_speed() + pid_coolant() + [int(state["gear"]) & 0xFF]
+
+DID_READERS = {
+    0xF186: lambda: [uds_state["session"]],
+    0xF190: lambda: list(VIN.encode("ascii")),
+    0xF201: lambda: engine_snapshot()[:2],
+    0xF202: pid_speed,
+    0xF203: pid_coolant,
+    0xF204: lambda: [int(state["gear"]) & 0xFF],
+    0xF205: engine_snapshot,
+}
 
-    if msg.arbitration_id != 0x7E0:
-        return
+def read_did(did):
+    """Data bytes of a DID (0xF4xx = Mode 01 PID xx), or None if unsupported."""
+    reader = DID_READERS.get(did)
+    if reader is None and did >> 8 == 0xF4:
+        reader = MODE01_PIDS[ENGINE_ID].get(did & 0xFF)
+    return reader() if reader else None
+
+def uds_session_control(req, now):
+    if len(req) != 2:
+        raise uds.NegativeResponse(uds.NRC_INCORRECT_LENGTH)
+    session = req[1] & ~uds.SUPPRESS_POSITIVE & 0xFF
+    if session not in (uds.DEFAULT_SESSION, uds.EXTENDED_SESSION):
+        raise uds.NegativeResponse(uds.NRC_SUBFUNCTION_NOT_SUPPORTED)
+    uds_state["session"] = session
+    if session == uds.DEFAULT_SESSION:
+        # Leaving the extended session stops every periodic DID
+        uds_state["periodic"].clear()
+    if req[1] & uds.SUPPRESS_POSITIVE:
+        return None
+    p2_star = uds.P2_STAR_MS // 10
+    return [0x50, session, uds.P2_MS >> 8, uds.P2_MS & 0xFF, p2_star >> 8, p2_star & 0xFF]
+
+def uds_tester_present(req, now):
+    if len(req) != 2:
+        raise uds.NegativeResponse(uds.NRC_INCORRECT_LENGTH)
+    if req[1] & 0x7F != 0x00:
+        raise uds.NegativeResponse(uds.NRC_SUBFUNCTION_NOT_SUPPORTED)
+    return None if req[1] & uds.SUPPRESS_POSITIVE else [0x7E, 0x00]
+
+def uds_read_data(req, now):
+    """0x22 with one or more DIDs; the response has each DID followed by its data."""
+    if len(req) < 3 or len(req) % 2 == 0:
+        raise uds.NegativeResponse(uds.NRC_INCORRECT_LENGTH)
+    resp_data = [0x62]
+    for i in range(1, len(req), 2):
+        did = (req[i] << 8) | req[i + 1]
+        data = read_did(did)
+        if data is not None:
+            resp_data += [req[i], req[i + 1]] + data
+    if len(resp_data) == 1:
+        raise uds.NegativeResponse(uds.NRC_REQUEST_OUT_OF_RANGE)
+    return resp_data
 
-    d = msg.data
-    if len(d) < 2:
-        return
+def uds_read_periodic(req, now):
+    """0x2A: schedule (slow / medium / fast) or stop periodic DIDs 0xF2xx."""
+    if len(req) < 2:
+        raise uds.NegativeResponse(uds.NRC_INCORRECT_LENGTH)
+    mode, pdids = req[1], list(req[2:])
+    periodic = uds_state["periodic"]
+    if mode == uds.MODE_STOP:
+        for pdid in pdids or list(periodic):
+            periodic.pop(pdid, None)
+        return [0x6A]
+    if uds_state["session"] != uds.EXTENDED_SESSION:
+        raise uds.NegativeResponse(uds.NRC_NOT_IN_ACTIVE_SESSION)
+    if mode not in uds.RATES:
+        raise uds.NegativeResponse(uds.NRC_REQUEST_OUT_OF_RANGE)
+    if not pdids:
+        raise uds.NegativeResponse(uds.NRC_INCORRECT_LENGTH)
+    if any(read_did(uds.PERIODIC_DID_BASE | p) is None for p in pdids):
+        raise uds.NegativeResponse(uds.NRC_REQUEST_OUT_OF_RANGE)
+    if len(set(periodic) | set(pdids)) > uds.MAX_PERIODIC:
+        raise uds.NegativeResponse(uds.NRC_REQUEST_OUT_OF_RANGE)
+    for pdid in pdids:
+        periodic[pdid] = {"rate": uds.RATES[mode], "due": now}
+    return [0x6A]
+
+UDS_SERVICES = {
+    uds.SESSION_CONTROL: uds_session_control,
+    uds.TESTER_PRESENT: uds_tester_present,
+    uds.READ_DATA_BY_ID: uds_read_data,
+    uds.READ_PERIODIC: uds_read_periodic,
+}
 
-    length = d[0]
-    if length < 1:
+def handle_uds_request(req, now):
+    """Run one UDS service; returns the response payload (None = suppressed)."""
+    sid = req[0]
+    # Any request keeps a non-default session alive
+    uds_state["s3_deadline"] = now + uds.S3
+    try:
+        return UDS_SERVICES[sid](req, now)
+    except uds.NegativeResponse as e:
+        return [uds.NEGATIVE_RESPONSE, sid, e.nrc]
+
+def send_periodic(bus, now):
+    """
+    Send every periodic DID that is due (one frame each on 0x5E8) and end
+    an idle non-default session after S3.  Returns the next due time.
+    """
+    if uds_state["session"] != uds.DEFAULT_SESSION and now > uds_state["s3_deadline"]:
+        uds_state["session"] = uds.DEFAULT_SESSION
+        uds_state["periodic"].clear()
+
+    next_due = None
+    for pdid, entry in uds_state["periodic"].items():
+        if now >= entry["due"]:
+            data = [pdid] + read_did(uds.PERIODIC_DID_BASE | pdid)
+            bus.send(can.Message(arbitration_id=uds.PERIODIC_ID, data=data, is_extended_id=False))
+            # Absolute schedule; skip missed slots instead of bursting
+            entry["due"] = max(entry["due"] + entry["rate"], now)
+        if next_due is None or entry["due"] < next_due:
+            next_due = entry["due"]
+    return next_due
+
+def handle_obd_request(channel, req, verbose=True, node=ENGINE_ID):
+    """
+    Answer one reassembled OBD request payload for one emulated ECU.  The
+    engine handles Mode 01, 02, 03, 04, 07, 09 and the UDS services; the TCU
+    only Mode 01.
+    """
+    if len(req) < 1:
         return
 
-    mode_req = d[1]
+    mode_req = req[0]
 
     resp_data = None
 
     if mode_req == 0x01:
-        resp_data = handle_mode01_request(msg)
+        resp_data = handle_mode01_request(req, MODE01_PIDS[node])
+    elif node != ENGINE_ID:
+        pass
+    elif mode_req == 0x02:
+        resp_data = handle_mode02_request(req)
     elif mode_req == 0x03:
         resp_data = handle_mode03_request()
     elif mode_req == 0x04:
         resp_data = handle_mode04_request()
+    elif mode_req == 0x07:
+        resp_data = handle_mode07_request()
+    elif mode_req == 0x09:
+        resp_data = handle_mode09_request(req)
+    elif mode_req in UDS_SERVICES:
+        resp_data = handle_uds_request(req, channel.clock())
 
     if resp_data is None:
         return
 
-    resp = can.Message(
-        arbitration_id=0x7E8,
-        data=resp_data,
-        is_extended_id=False,
-    )
-    bus.send(resp)
-
-    print(f"OBD RESP mode 0x{mode_req:02X} data={resp_data}")
+    try:
+        channel.send(resp_data)
+    except isotp.IsoTpError as e:
+        if verbose:
+            print(f"OBD RESP 0x{channel.tx_id:03X} mode 0x{mode_req:02X} dropped: {e}")
+        return
 
-print("OBD ECU running on vcan0")
-print("  Mode 01: PIDs 05,0C,0D")
-print("  Mode 03: Read DTCs (P0xxx)")
-print("  Mode 04: Clear DTCs")
-print("Ctrl+C to stop.\n")
+    if verbose:
+        print(f"OBD RESP 0x{channel.tx_id:03X} mode 0x{mode_req:02X} data={resp_data}")
 
-try:
+def obd_task(bus, timeout=0.1, verbose=True, clock=time.monotonic, nvm_path=None, control=None):
+    """
+    OBD ECU as a cooperative task: each next() handles at most one frame.
+
+    Emulates the engine (0x7E0 -> 0x7E8) and TCU (0x7E1 -> 0x7E9) OBD
+    responders, each with its own ISO-TP channel, so long responses are
+    segmented and sent at the tester's flow control pace and queued
+    pipelined requests are answered in order.  Functional requests on 0x7DF
+    (single frame only) go to both.  The engine also serves UDS and streams
+    periodic DIDs (0x2A) on 0x5E8.  With timeout=0 (lab_runtime.py, which
+    passes its virtual clock) a call never blocks; consecutive and periodic
+    frames that became due go out on the next call.
+
+    With nvm_path, stored DTCs and freeze frames live in that file and the
+    DTC monitor resumes from them; otherwise they last as long as the process.
+    With a control_plane.ControlState, the DTC monitor's clock stands still
+    while the lab is paused, so a pause is not a lost-communication fault.
+    """
+    global nvm
+    if nvm_path is not None:
+        nvm = dtc_nvm.DtcNvm(nvm_path)
+    monitor.on_change = functools.partial(on_dtc_change, verbose=verbose)
+    monitor.restore(nvm.entries(), clock())
+
+    # Paused time is left out of the DTC monitor's clock
+    paused_since = None
+    paused_total = 0.0
+
+    channels = {node: isotp.IsoTpChannel(bus, tx_id=node + 8, rx_id=node, clock=clock)
+                for node in MODE01_PIDS}
     while True:
-        msg = bus.recv(0.1)
+        # Don't sleep past the next consecutive or periodic frame that is due
+        wait = timeout
+        now = clock()
+        for due in [ch.poll() for ch in channels.values()] + [send_periodic(bus, now)]:
+            if due is not None and wait:
+                wait = min(wait, max(0.0, due - clock()))
+
+        if control is not None and control.paused:
+            if paused_since is None:
+                paused_since = now
+        else:
+            if paused_since is not None:
+                paused_total += now - paused_since
+                paused_since = None
+            monitor.tick(now - paused_total)
+
+        msg = bus.recv(wait)
         if msg is None:
+            yield
             continue
 
-        if msg.arbitration_id == 0x100:
+        aid = msg.arbitration_id
+        if aid == 0x100:
             update_from_engine(msg)
-           # inject_faults()
-
-        if msg.arbitration_id == 0x7E0:
-            handle_obd_request(msg)
-
-except KeyboardInterrupt:
-    print("\nOBD ECU stopped.")
+        elif aid == 0x300:
+            update_from_gearbox(msg)
+
+        if aid in monitor.watched:
+            # DTC rules: a few us per PT frame
+            ts = paused_since if paused_since is not None else clock()
+            monitor.on_frame(aid, msg.data, ts - paused_total)
+
+        elif aid == FUNCTIONAL_ID:
+            req = isotp.single_frame_payload(msg.data)
+            if req is not None:
+                for node, channel in channels.items():
+                    handle_obd_request(channel, req, verbose, node)
+
+        elif aid in channels:
+            channel = channels[aid]
+            channel.on_frame(msg)
+            req = channel.receive()
+            if req is not None:
+                handle_obd_request(channel, req, verbose, aid)
+
+        yield
+
+def main():
+    sys.stdout.write("\033]0;OBD ECU\007")
+    sys.stdout.flush()
+
+    bus = can.interface.Bus(channel="vcan0", bustype="socketcan")
+    # Pause / step / time scale are pushed by master_control.py
+    control = control_plane.subscribe("OBD ECU")
+
+    print("OBD ECU running on vcan0")
+    print(f"  DTC NVM: {dtc_nvm.NVM_PATH}")
+    print("  Mode 01: PIDs 05,0C,0D (engine 0x7E0), A4 (TCU 0x7E1); up to 6 per request")
+    print("  Functional requests on 0x7DF")
+    print("  Mode 02: Freeze frames (PIDs 02,05,0C,0D,A4)")
+    print(f"  Mode 03: Read DTCs ({len(monitor.rules)} rules from dtc_rules.json)")
+    print("  Mode 04: Clear DTCs")
+    print("  Mode 07: Pending DTCs")
+    print("  Mode 09: VIN (ISO-TP multi-frame)")
+    print("  UDS: 0x10 session, 0x3E tester present, 0x22 DIDs, 0x2A periodic DIDs on 0x5E8")
+    print("Ctrl+C to stop.\n")
+
+    try:
+        for _ in obd_task(bus, nvm_path=dtc_nvm.NVM_PATH, control=control):
+            pass
+
+    except KeyboardInterrupt:
+        print("\nOBD ECU stopped.")
+        print(monitor.report())
+        nvm.close()
+
+if __name__ == "__main__":
+    main()
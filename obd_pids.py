@@ -0,0 +1,121 @@
+"""OBD-II Mode 01 PID table shared by the OBD ECU and the testers.
+
+This module provides:
+- PIDS: pid -> (name, data bytes, decoder) for the PIDs the lab uses.
+- supported_bitmap(): the answer to the "PIDs supported" PIDs 0x00, 0x20, ...
+- parse_mode01(): splits a (multi-PID) Mode 01 response payload
+  [0x41, pid, data.., pid, data..] into {pid: data bytes}.  Mode 01 allows
+  up to six PIDs per request; the response carries each PID that the ECU
+  supports, in request order.
+- parse_mode02(): the same for a Mode 02 (freeze frame) response
+  [0x42, pid, frame, data.., ...].
+- encode_gear(): PID A4 data, shared by the TCU responder and the gateway's
+  OBD proxy.
+"""
+
+from sim_core import GEAR_RATIOS
+
+MAX_PIDS_PER_REQUEST = 6
+
+
+def _supported(d):
+    """Offsets 1..32 (relative to the range PID) whose bits are set."""
+    return [i + 1 for i in range(32) if d[i // 8] & (0x80 >> (i % 8))]
+
+
+def _dtc(d):
+    """SAE J2012 code ('P0217') from the two DTC bytes."""
+    return f"{'PCBU'[d[0] >> 6]}{(d[0] >> 4) & 0x03}{d[0] & 0x0F:X}{d[1] >> 4:X}{d[1] & 0x0F:X}"
+
+
+PIDS = {
+    0x00: ("PIDs supported 01-20", 4, _supported),
+    0x02: ("Freeze frame DTC", 2, _dtc),
+    0x05: ("Coolant", 1, lambda d: d[0] - 40),
+    0x0C: ("RPM", 2, lambda d: ((d[0] << 8) | d[1]) / 4),
+    0x0D: ("Speed", 1, lambda d: d[0]),
+    0x20: ("PIDs supported 21-40", 4, _supported),
+    0x40: ("PIDs supported 41-60", 4, _supported),
+    0x60: ("PIDs supported 61-80", 4, _supported),
+    0x80: ("PIDs supported 81-A0", 4, _supported),
+    0xA0: ("PIDs supported A1-C0", 4, _supported),
+    0xA4: ("Gear", 4, lambda d: d[1] >> 4 if d[0] & 0x02 else None),
+}
+
+UNITS = {0x05: "°C", 0x0C: "rpm", 0x0D: "km/h"}
+
+
+def is_range_pid(pid):
+    """PIDs 0x00, 0x20, ... 0xE0 report which of the next 32 PIDs exist."""
+    return pid % 0x20 == 0
+
+
+def supported_bitmap(pids, base):
+    """
+    4-byte "PIDs supported" answer for base+1 .. base+0x20 given the PIDs an
+    ECU implements.  Bit 0x20 (the next range PID) is set when the ECU has
+    PIDs beyond this range.  None when the range is unreachable (not 0x00
+    and nothing at or above it), so the ECU stays silent as J1979 wants.
+    """
+    if base and not any(p > base for p in pids if not is_range_pid(p)):
+        return None
+    bits = 0
+    for pid in pids:
+        if base < pid <= base + 0x20 and not is_range_pid(pid):
+            bits |= 1 << (base + 0x20 - pid)
+    if any(p > base + 0x20 for p in pids if not is_range_pid(p)):
+        bits |= 1
+    return list(bits.to_bytes(4, "big"))
+
+
+def encode_gear(gear):
+    """PID A4: A bit 1 = gear supported, B high nibble = gear, C:D = ratio x 1000."""
+    ratio = int(GEAR_RATIOS.get(gear, 0) * 1000)
+    return [0x02, (gear & 0x0F) << 4, (ratio >> 8) & 0xFF, ratio & 0xFF]
+
+
+def parse_mode01(payload):
+    """{pid: data bytes} from a Mode 01 response payload; stops at an unknown PID."""
+    if not payload or payload[0] != 0x41:
+        return {}
+    out = {}
+    i = 1
+    while i < len(payload):
+        pid = payload[i]
+        entry = PIDS.get(pid)
+        if entry is None or i + 1 + entry[1] > len(payload):
+            break
+        out[pid] = bytes(payload[i + 1:i + 1 + entry[1]])
+        i += 1 + entry[1]
+    return out
+
+
+def parse_mode02(payload, frame=0):
+    """{pid: data bytes} of one freeze frame from a Mode 02 response payload."""
+    if not payload or payload[0] != 0x42:
+        return {}
+    out = {}
+    i = 1
+    while i + 1 < len(payload):
+        pid = payload[i]
+        entry = PIDS.get(pid)
+        if entry is None or i + 2 + entry[1] > len(payload):
+            break
+        if payload[i + 1] == frame:
+            out[pid] = bytes(payload[i + 2:i + 2 + entry[1]])
+        i += 2 + entry[1]
+    return out
+
+
+def decode(pid, data):
+    return PIDS[pid][2](data)
+
+
+def format_value(pid, data):
+    value = decode(pid, data)
+    if pid == 0x0C:
+        return f"{value:.0f} rpm"
+    if is_range_pid(pid):
+        return " ".join(f"{pid + p:02X}" for p in value) or "-"
+    unit = UNITS.get(pid)
+    return f"{value} {unit}" if unit else f"{value}"
@@ -2,103 +2,46 @@ import can
 import sys
 import time
 
+import isotp
+import obd_pids
+
 sys.stdout.write("\033]0;OBD Tester\007")
 sys.stdout.flush()
 
 # NOTE: on gateway setup, this should be vcan1
 bus = can.interface.Bus(channel="vcan1", bustype="socketcan")
 
-def send_pid(pid):
-    data = [0x02, 0x01, pid, 0, 0, 0, 0, 0]
-    msg = can.Message(arbitration_id=0x7E0, data=data, is_extended_id=False)
-    bus.send(msg)
-
-def wait_for_pid_response(pid, timeout=0.5):
-    end_time = time.time() + timeout
-    while time.time() < end_time:
-        msg = bus.recv(0.05)
-        if msg is None:
-            continue
-        if msg.arbitration_id != 0x7E8:
-            continue
-        d = msg.data
-        if len(d) < 3:
-            continue
-        if d[1] != 0x41 or d[2] != pid:
-            continue
-        return d
-    return None
-
-def decode_pid(pid, data):
-    if pid == 0x0C:  # RPM
-        A = data[3]
-        B = data[4]
-        rpm = ((A * 256) + B) / 4
-        return f"{rpm:.0f} rpm"
-    if pid == 0x0D:
-        spd = data[3]
-        return f"{spd} km/h"
-    if pid == 0x05:
-        temp = data[3] - 40
-        return f"{temp} °C"
-    return f"raw={data}"
-
-def send_mode03():
-    data = [0x01, 0x03, 0, 0, 0, 0, 0, 0]
-    msg = can.Message(arbitration_id=0x7E0, data=data, is_extended_id=False)
-    bus.send(msg)
-
-def send_mode04():
-    data = [0x01, 0x04, 0, 0, 0, 0, 0, 0]
-    msg = can.Message(arbitration_id=0x7E0, data=data, is_extended_id=False)
-    bus.send(msg)
-
-def wait_for_mode03_response(timeout=0.5):
-    end_time = time.time() + timeout
-    while time.time() < end_time:
-        msg = bus.recv(0.05)
-        if msg is None:
-            continue
-        if msg.arbitration_id != 0x7E8:
-            continue
-        d = msg.data
-        if len(d) < 2:
-            continue
-        if d[1] != 0x43:
-            continue
-        return d
-    return None
-
-def wait_for_mode04_response(timeout=0.5):
-    end_time = time.time() + timeout
-    while time.time() < end_time:
-        msg = bus.recv(0.05)
-        if msg is None:
-            continue
-        if msg.arbitration_id != 0x7E8:
-            continue
-        d = msg.data
-        if len(d) < 2:
-            continue
-        if d[1] != 0x44:
-            continue
-        return d
-    return None
+# ISO-TP: requests on 0x7E0, responses on 0x7E8 (multi-frame responses are
+# reassembled here; we ask for BS=8, STmin=1 ms in our flow control)
+channel = isotp.IsoTpChannel(bus, tx_id=0x7E0, rx_id=0x7E8, block_size=8, st_min=1)
+
+def request(payload, response_mode, timeout=0.5):
+    """Send an OBD request; returns the response payload (starts with response_mode)."""
+    return channel.request(payload, timeout, accept=lambda r: r and r[0] == response_mode)
+
+def read_pids(pids):
+    """One multi-PID Mode 01 request (up to six PIDs); returns {pid: data bytes}."""
+    resp = request([0x01, *pids], 0x41)
+    return obd_pids.parse_mode01(resp) if resp is not None else {}
+
+def read_freeze_frame(pids=(0x02, 0x0C, 0x0D, 0x05), frame=0):
+    """Mode 02: {pid: data bytes} of one stored freeze frame ({} if none)."""
+    req = [0x02]
+    for pid in pids:
+        req += [pid, frame]
+    resp = request(req, 0x42)
+    return obd_pids.parse_mode02(resp, frame) if resp is not None else {}
+
+def read_vin():
+    resp = request([0x09, 0x02], 0x49, timeout=1.0)
+    if resp is None or len(resp) < 4 or resp[1] != 0x02:
+        return None
+    return bytes(resp[3:]).decode("ascii", errors="replace")
 
 def decode_dtcs(data):
-    """Decode DTC bytes from a Mode 03 response."""
-    if len(data) < 3:
-        return []
-    length = data[0]
-    # no codes
-    if length <= 2:
-        return []
-
+    """Decode DTC bytes from a Mode 03 response payload (0x43, A, B, A, B, ...)."""
     dtcs = []
-    # DTC bytes start at index 3
-    bytes_left = length - 2
-    idx = 3
-    while bytes_left >= 2 and idx + 1 < len(data):
+    for idx in range(1, len(data) - 1, 2):
         A = data[idx]
         B = data[idx + 1]
         if A == 0 and B == 0:
@@ -114,28 +57,28 @@ def decode_dtcs(data):
         code = f"{sys_char}{d1}{d2}{d3}{d4}"
         dtcs.append(code)
 
-        idx += 2
-        bytes_left -= 2
-
     return dtcs
 
-print("Simple OBD-II tester on vcan1 (via gateway)")
-print("Polling: PIDs 0C (RPM), 0D (Speed), 05 (Coolant)")
-print("Every few cycles: Mode 03 (DTCs). Ctrl+C to stop.\n")
+print("Simple OBD-II tester on vcan1 (via gateway, ISO-TP)")
+print("Polling: PIDs 0C (RPM), 0D (Speed), 05 (Coolant) in one multi-PID request")
+print("Every few cycles: Mode 03 (DTCs) and the Mode 02 freeze frame. Ctrl+C to stop.\n")
+
+vin = read_vin()
+print(f"VIN: {vin or 'No resp'}\n")
 
 cycle = 0
 
 try:
     while True:
+        # All three PIDs in one request / one response
+        values = read_pids((0x0C, 0x0D, 0x05))
         results = {}
 
         for pid in (0x0C, 0x0D, 0x05):
-            send_pid(pid)
-            resp = wait_for_pid_response(pid)
-            if resp is None:
+            if pid not in values:
                 results[pid] = "No resp"
             else:
-                results[pid] = decode_pid(pid, resp)
+                results[pid] = obd_pids.format_value(pid, values[pid])
 
         line = (
             f"RPM: {results[0x0C]:>10} | "
@@ -147,12 +90,15 @@ try:
         # Every 5 cycles, query DTCs
         cycle += 1
         if cycle % 5 == 0:
-            send_mode03()
-            resp = wait_for_mode03_response()
+            resp = request([0x03], 0x43)
             if resp is not None:
                 codes = decode_dtcs(resp)
                 if codes:
                     print("  DTCs:", ", ".join(codes))
+                    ff = read_freeze_frame()
+                    if 0x02 in ff:
+                        print("  Freeze frame 0:", ", ".join(
+                            obd_pids.format_value(pid, data) for pid, data in ff.items()))
                 else:
                     print("  DTCs: none")
 
@@ -160,3 +106,4 @@ try:
 
 except KeyboardInterrupt:
     print("\nOBD tester stopped.")
+    print(f"ISO-TP: {dict(channel.stats)}")
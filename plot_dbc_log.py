@@ -1,93 +1,73 @@
-import matplotlib
-matplotlib.use("TkAgg")
+"""Plot a dbc_log (CSV or .colog) recorded by dbc_logger.py.
 
-import csv
-import sys
-import os
+Loading and downsampling live in log_loader.py: columns are parsed in bulk
+with NumPy, each series is reduced to about one min/max pair per pixel
+column (or LTTB with --method lttb) before matplotlib sees it, and the
+result is cached, so re-opening a multi-hour log is instant.
+"""
+
+import argparse
 import glob
-import matplotlib.pyplot as plt
+import os
+import sqlite3
+import sys
+import time
+
+import log_catalog
+import log_loader
+
+ENGINE_SIGNALS = ["RPM", "Speed"]
+WHEEL_SIGNALS = ["WheelSpeed_FL", "WheelSpeed_FR", "WheelSpeed_RL", "WheelSpeed_RR"]
 
 def find_latest_log():
-    files = glob.glob("dbc_log_*.csv")
-    if not files:
-        print("No dbc_log_*.csv files found.")
+    """Newest dbc_log by recorded time, from the log catalog (indexing new logs first)."""
+    try:
+        log_catalog.update(verbose=False)
+        path = log_catalog.latest("dbc_log_", formats=("csv", "colog"))
+    except sqlite3.Error as e:
+        print(f"Log catalog unavailable ({e}); falling back to newest file")
+        files = glob.glob("dbc_log_*.csv") + glob.glob("dbc_log_*.colog")
+        path = max(files, key=os.path.getmtime) if files else None
+    if path is None:
+        print("No dbc_log_*.csv / *.colog files found.")
         sys.exit(1)
-    return max(files, key=os.path.getmtime)
+    return os.path.relpath(path)
 
 def main():
-    if len(sys.argv) > 1:
-        filename = sys.argv[1]
-    else:
-        filename = find_latest_log()
-
+    parser = argparse.ArgumentParser(description="Plot engine and wheel speeds from a DBC log")
+    parser.add_argument("filename", nargs="?", help="log file (default: newest dbc_log_*)")
+    parser.add_argument("--method", choices=sorted(log_loader.DOWNSAMPLERS), default="minmax",
+                        help="downsampler (minmax = per-pixel envelope, lttb = shape-preserving)")
+    parser.add_argument("--points", type=int, default=log_loader.DEFAULT_POINTS,
+                        help="buckets per series (about the plot width in pixels)")
+    parser.add_argument("--no-cache", action="store_true", help="ignore and do not write the plot cache")
+    args = parser.parse_args()
+
+    filename = args.filename or find_latest_log()
     print(f"Loading {filename}")
 
-    # Separate time arrays per signal (only where signal exists)
-    t_rpm, rpm = [], []
-    t_speed, speed = [], []
-    t_fl, fl = [], []
-    t_fr, fr = [], []
-    t_rl, rl = [], []
-    t_rr, rr = [], []
-
-    with open(filename) as f:
-        reader = csv.DictReader(f)
-        t0 = None
-
-        for row in reader:
-            if row.get("timestamp", "") == "":
-                continue
-
-            ts = float(row["timestamp"])
-            if t0 is None:
-                t0 = ts
-            t_rel = ts - t0
-
-            def has_val(name):
-                v = row.get(name, "")
-                return v not in ("", None)
-
-            # Engine signals
-            if has_val("RPM"):
-                t_rpm.append(t_rel)
-                rpm.append(float(row["RPM"]))
-
-            if has_val("Speed"):
-                t_speed.append(t_rel)
-                speed.append(float(row["Speed"]))
-
-            # ABS / wheel speeds
-            if has_val("WheelSpeed_FL"):
-                t_fl.append(t_rel)
-                fl.append(float(row["WheelSpeed_FL"]))
-
-            if has_val("WheelSpeed_FR"):
-                t_fr.append(t_rel)
-                fr.append(float(row["WheelSpeed_FR"]))
-
-            if has_val("WheelSpeed_RL"):
-                t_rl.append(t_rel)
-                rl.append(float(row["WheelSpeed_RL"]))
-
-            if has_val("WheelSpeed_RR"):
-                t_rr.append(t_rel)
-                rr.append(float(row["WheelSpeed_RR"]))
-
-    print(f"Points: RPM={len(rpm)}, Speed={len(speed)}, "
-          f"FL={len(fl)}, FR={len(fr)}, RL={len(rl)}, RR={len(rr)}")
+    start = time.perf_counter()
+    series, counts = log_loader.load_plot_series(
+        filename, ENGINE_SIGNALS + WHEEL_SIGNALS,
+        method=args.method, points=args.points, use_cache=not args.no_cache)
+    print(f"Loaded in {time.perf_counter() - start:.2f} s; points (raw -> plotted): " +
+          ", ".join(f"{s}={counts[s]}->{len(series[s][0])}" for s in series))
 
     # If nothing decoded, tell the user and exit
-    if not any([rpm, speed, fl, fr, rl, rr]):
+    if not series:
         print("No decoded signal data found in this log.")
         sys.exit(0)
 
+    import matplotlib
+    matplotlib.use("TkAgg")
+    import matplotlib.pyplot as plt
+
     # ---- Engine plot ----
     plt.figure()
     plt.title("Engine RPM & Vehicle Speed")
-    if rpm:
-        plt.plot(t_rpm, rpm, label="RPM")
-    if speed:
-        plt.plot(t_speed, speed, label="Speed (km/h)")
+    for name, label in (("RPM", "RPM"), ("Speed", "Speed (km/h)")):
+        if name in series:
+            plt.plot(*series[name], label=label)
     plt.xlabel("Time (s)")
     plt.legend()
     plt.grid(True)
@@ -95,14 +75,9 @@ def main():
     # ---- ABS plot ----
     plt.figure()
     plt.title("Wheel Speeds (ABS)")
-    if fl:
-        plt.plot(t_fl, fl, label="FL")
-    if fr:
-        plt.plot(t_fr, fr, label="FR")
-    if rl:
-        plt.plot(t_rl, rl, label="RL")
-    if rr:
-        plt.plot(t_rr, rr, label="RR")
+    for name in WHEEL_SIGNALS:
+        if name in series:
+            plt.plot(*series[name], label=name.split("_")[1])
     plt.xlabel("Time (s)")
     plt.ylabel("km/h")
     plt.legend()
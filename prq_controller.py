@@ -1,33 +1,51 @@
-import os
+from control_plane import send_command, CONTROL_SOCKET
 
-STATE_FILE = "/home/jathin/Desktop/CAN_LAB/global_state.txt"
+# Remote for a running master_control.py (which hosts the control server)
 
-def set_state(value: str):
-    value = value.strip().lower()
-    with open(STATE_FILE, "w") as f:
-        f.write(value)
-    print(f"Global state set to: {value}")
+def run(cmd, **params):
+    try:
+        state = send_command(cmd, **params)
+    except OSError:
+        print(f"No control server at {CONTROL_SOCKET} (start master_control.py)")
+        return
+    if "error" in state:
+        print(f"Rejected: {state['error']}")
+        return
+    mode = "pause" if state["paused"] else "run"
+    print(f"Global state set to: {mode} (x{state['time_scale']:g})")
 
 def main():
     print("P = pause all ECUs")
     print("R = resume all ECUs")
+    print("S N = single-step N engine ticks (100 ms each)")
+    print("T X = time scale X")
     print("Q = quit controller")
     print()
 
-    # Default to run
-    set_state("run")
-
     while True:
-        cmd = input("[p/r/q] > ").strip().lower()
-        if cmd == "p":
-            set_state("pause")
-        elif cmd == "r":
-            set_state("run")
-        elif cmd == "q":
-            print("Exiting PRQ controller.")
+        try:
+            cmd = input("[p/r/s/t/q] > ").strip().lower().split()
+        except (EOFError, KeyboardInterrupt):
+            print("\nExiting PRQ controller.")
             break
-        else:
-            print("Use: p = pause, r = run, q = quit")
+        if not cmd:
+            continue
+        try:
+            if cmd[0] == "p":
+                run("pause")
+            elif cmd[0] == "r":
+                run("resume")
+            elif cmd[0] == "s":
+                run("step", ticks=int(cmd[1]) if len(cmd) > 1 else 1)
+            elif cmd[0] == "t" and len(cmd) > 1:
+                run("scale", factor=float(cmd[1]))
+            elif cmd[0] == "q":
+                print("Exiting PRQ controller.")
+                break
+            else:
+                print("Use: p = pause, r = run, s N = step, t X = scale, q = quit")
+        except ValueError:
+            print("Use: p = pause, r = run, s N = step, t X = scale, q = quit")
 
 if __name__ == "__main__":
     main()
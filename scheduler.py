@@ -0,0 +1,142 @@
+"""Drift-free fixed-rate scheduling for the ECU loops.
+
+This module provides:
+- FixedRateScheduler: sleeps to absolute deadlines on the monotonic clock,
+  so the loop period stays nominal no matter how long the work takes.
+- A time_scale factor (set from the control plane) that runs the loop
+  faster or slower than real time without changing the nominal period.
+- Overrun counting (work finished after its deadline) and resyncs (fell so
+  far behind that the schedule was restarted instead of bursting).
+- RollingHistogram: a fixed-bucket histogram over the last N samples, used
+  for wake-up jitter here and for latency elsewhere in the lab.
+"""
+
+import collections
+import time
+from bisect import bisect_left
+
+# Bucket upper edges in milliseconds; the last bucket catches everything else
+JITTER_EDGES_MS = (0.05, 0.1, 0.2, 0.5, 1.0, 2.0, 5.0, 10.0, 20.0, 50.0)
+
+
+def sleep_until(deadline, clock=time.monotonic):
+    """Sleep until the monotonic `deadline`; returns immediately if it passed."""
+    remaining = deadline - clock()
+    if remaining > 0:
+        time.sleep(remaining)
+
+
+class RollingHistogram:
+    """Histogram of the last `window` samples over fixed bucket edges."""
+
+    def __init__(self, edges=JITTER_EDGES_MS, window=1000):
+        self.edges = tuple(edges)
+        self.counts = [0] * (len(self.edges) + 1)
+        self.samples = collections.deque(maxlen=window)
+        self.total = 0.0
+
+    def add(self, value):
+        if len(self.samples) == self.samples.maxlen:
+            old_value, old_bucket = self.samples[0]
+            self.counts[old_bucket] -= 1
+            self.total -= old_value
+        bucket = bisect_left(self.edges, value)
+        self.samples.append((value, bucket))
+        self.counts[bucket] += 1
+        self.total += value
+
+    def __len__(self):
+        return len(self.samples)
+
+    @property
+    def max(self):
+        """Largest sample in the window (a scan; meant for reports, not per sample)."""
+        return max((v for v, _ in self.samples), default=0.0)
+
+    def mean(self):
+        return self.total / len(self.samples) if self.samples else 0.0
+
+    def percentile(self, pct):
+        """Upper bucket edge below which `pct` % of the window falls."""
+        n = len(self.samples)
+        if n == 0:
+            return 0.0
+        need = n * pct / 100.0
+        seen = 0
+        for i, c in enumerate(self.counts):
+            seen += c
+            if seen >= need:
+                return self.edges[i] if i < len(self.edges) else float("inf")
+        return float("inf")
+
+    def share_below(self, limit):
+        """Fraction of the window in buckets whose upper edge is <= `limit`."""
+        n = len(self.samples)
+        if n == 0:
+            return 1.0
+        i = bisect_left(self.edges, limit)
+        if i < len(self.edges) and self.edges[i] == limit:
+            i += 1
+        return sum(self.counts[:i]) / n
+
+    def format(self, unit="ms"):
+        labels = [f"<{e:g}" for e in self.edges] + [f">{self.edges[-1]:g}"]
+        cells = [f"{lab}:{c}" for lab, c in zip(labels, self.counts) if c]
+        return " ".join(cells) + f" ({unit})"
+
+
+class FixedRateScheduler:
+    """
+    Keep a loop on a nominal period using absolute deadlines.
+
+    Call wait() once at the end of every iteration.  The next deadline is the
+    previous deadline plus one period (never "now + period"), so work time
+    does not accumulate into drift.  If a tick runs long the following ticks
+    catch up on the same grid; if the loop falls more than `max_lag` periods
+    behind, the grid restarts from now and the event is counted as a resync.
+    """
+
+    def __init__(self, period, name="loop", window=1000, max_lag=5,
+                 clock=time.monotonic):
+        self.period = period
+        self.name = name
+        self.max_lag = max_lag
+        self.clock = clock
+        self.time_scale = 1.0
+        self.next_deadline = None
+        self.ticks = 0
+        self.overruns = 0
+        self.resyncs = 0
+        self.jitter = RollingHistogram(JITTER_EDGES_MS, window)
+
+    def reset(self):
+        """Restart the schedule on the next wait() (e.g. after a pause)."""
+        self.next_deadline = None
+
+    def wait(self):
+        period = self.period / self.time_scale
+        now = self.clock()
+        if self.next_deadline is None:
+            self.next_deadline = now + period
+        elif now > self.next_deadline:
+            # This tick's work finished after the deadline it was due by
+            self.overruns += 1
+            if now - self.next_deadline > self.max_lag * period:
+                self.resyncs += 1
+                self.next_deadline = now
+
+        sleep_until(self.next_deadline, self.clock)
+        woke = self.clock()
+        self.jitter.add(max(0.0, woke - self.next_deadline) * 1000.0)
+
+        self.ticks += 1
+        self.next_deadline += period
+
+    def report(self):
+        j = self.jitter
+        return (
+            f"[{self.name}] period={self.period * 1000:.1f} ms x{self.time_scale:g} ticks={self.ticks} "
+            f"overruns={self.overruns} resyncs={self.resyncs} | "
+            f"jitter mean={j.mean():.3f} p99<{j.percentile(99):g} max={j.max:.3f} ms | "
+            f"{j.format()}"
+        )
@@ -0,0 +1,129 @@
+"""Latest-value signal store fed from a background CAN receive thread.
+
+For GUIs that must not do CAN work on their event-loop thread:
+- SignalStore keeps the newest value of every DBC signal behind a lock,
+  with a per-signal sequence number that counts updates, so a reader can
+  tell what changed since its last snapshot and how many updates were
+  coalesced in between.
+- StoreListener is a python-can Listener: run it under a can.Notifier and
+  every frame is decoded (dbc_codec) and written to the store on the
+  Notifier's thread.
+- The GUI thread only calls snapshot(), which copies the dicts under the
+  lock and never blocks on the bus.
+- Optionally the store also keeps every sample of selected signals in a
+  fixed-size NumPy SignalRing (for strip charts), so history is recorded
+  at the full bus rate while memory stays flat.
+"""
+
+import threading
+
+import can
+import numpy as np
+
+import dbc_codec
+
+
+class SignalRing:
+    """Fixed-capacity (timestamp, value) ring in two preallocated NumPy arrays."""
+
+    def __init__(self, capacity):
+        self.capacity = capacity
+        self.t = np.zeros(capacity)
+        self.v = np.zeros(capacity)
+        self.head = 0           # next slot to write
+        self.count = 0
+
+    def append(self, t, v):
+        i = self.head
+        self.t[i] = t
+        self.v[i] = v
+        self.head = (i + 1) % self.capacity
+        if self.count < self.capacity:
+            self.count += 1
+
+    def window(self, t_start=None):
+        """Copies of (t, v), oldest first, limited to t >= t_start."""
+        if self.count < self.capacity:
+            t, v = self.t[:self.count].copy(), self.v[:self.count].copy()
+        else:
+            h = self.head
+            t = np.concatenate((self.t[h:], self.t[:h]))
+            v = np.concatenate((self.v[h:], self.v[:h]))
+        if t_start is not None:
+            i = np.searchsorted(t, t_start)
+            t, v = t[i:], v[i:]
+        return t, v
+
+
+class SignalStore:
+    """Newest value + update sequence number per signal; safe from any thread."""
+
+    def __init__(self, history=(), capacity=4096):
+        self._lock = threading.Lock()
+        # Full-rate sample history for these signals (strip charts)
+        self._rings = {name: SignalRing(capacity) for name in history}
+        self._values = {}
+        self._seq = {}
+        self._stamp = {}            # signal -> timestamp of the frame it came from
+        self.frames = 0             # frames decoded into the store
+        self.errors = 0             # frames that failed to decode
+
+    def update(self, names, values, timestamp):
+        """Store all signals of one frame at once (one lock round-trip)."""
+        with self._lock:
+            for name, value in zip(names, values):
+                self._values[name] = value
+                self._seq[name] = self._seq.get(name, 0) + 1
+                self._stamp[name] = timestamp
+                ring = self._rings.get(name)
+                if ring is not None:
+                    ring.append(timestamp, value)
+            self.frames += 1
+
+    def snapshot(self):
+        """(values, seqs, timestamps, frames): copies, consistent with each other."""
+        with self._lock:
+            return dict(self._values), dict(self._seq), dict(self._stamp), self.frames
+
+    def history(self, name, t_start=None):
+        """(t, v) copies of a signal's ring (see SignalStore(history=...))."""
+        with self._lock:
+            return self._rings[name].window(t_start)
+
+    def get(self, name, default=None):
+        with self._lock:
+            return self._values.get(name, default)
+
+
+class StoreListener(can.Listener):
+    """Decode every received frame into a SignalStore (runs on the Notifier thread)."""
+
+    def __init__(self, store, decoders=None):
+        self.store = store
+        self.decoders = decoders if decoders is not None else dbc_codec.DECODERS
+
+    def on_message_received(self, msg):
+        decoder = self.decoders.get(msg.arbitration_id)
+        if decoder is None:
+            return
+        try:
+            values = decoder(msg.data)
+        except ValueError:
+            self.store.errors += 1
+            return
+        self.store.update(dbc_codec.SIGNALS[msg.arbitration_id], values, msg.timestamp)
+
+    def on_error(self, exc):
+        print(f"[store] receive error: {exc}")
+
+
+def changed(seqs, previous):
+    """Signals whose sequence number moved since `previous` (a seqs dict)."""
+    return {name for name, seq in seqs.items() if previous.get(name) != seq}
+
+
+def start(bus, store=None, timeout=0.1):
+    """Start a Notifier feeding `store` (created if None); returns (store, notifier)."""
+    store = store or SignalStore()
+    notifier = can.Notifier(bus, [StoreListener(store)], timeout=timeout)
+    return store, notifier
@@ -0,0 +1,491 @@
+"""Headless simulation core for the virtual powertrain.
+
+This module holds the vehicle physics from engine_ecu.py and the shift logic
+from trans_ecu.py as plain functions with no CAN, no files and no sleeps:
+- engine_step() advances speed, RPM and coolant by one engine tick.
+- tcu_step() advances the TCU shift state machine by one TCU tick.
+- simulate() runs both in lock-step against a driver profile, so a long
+  drive can be evaluated far faster than real time.
+
+The ECU scripts import their constants and step functions from here, so a
+calibration change made in this file is what both the live nodes and the
+headless runs see.
+"""
+
+import sys
+import time
+
+# ============================================
+# ENGINE CONSTANTS
+# ============================================
+BASE_IDLE_RPM = 800.0       # idle speed
+REDLINE_RPM   = 7000.0      # new redline
+
+# amount of torque-converter slip at full throttle
+MAX_SLIP_RPM  = 3000.0
+
+# physics
+ENGINE_DT = 0.1
+A_MAX = 4.0      # was 2.0 → stronger acceleration
+B_MAX = 6.0
+DRAG = 0.058     # was 0.1 → allows ~250 km/h top speed
+
+# drivetrain
+GEAR_RATIOS = {1:3.6, 2:2.1, 3:1.4, 4:1.0, 5:0.8, 6:0.7}
+FINAL_DRIVE = 3.2
+TIRE_CIRC_M = 2.05
+
+# ============================
+# MODE & SHIFTING CONSTANTS
+# ============================
+TCU_DT = 0.01
+
+ENGINE_BRAKE_THROTTLE = 2          # treat 0–2% as "off throttle"
+
+# DRIVE: engine-brake factor (your 1.5)
+ENGINE_BRAKE_DOWNSHIFT_FAC_DRIVE = 2.2
+
+# DRIVE: extra aggression only in high gears (5 & 6) during lift-off
+DRIVE_HIGH_GEAR_EXTRA_FAC = 1.0   # ~15% earlier downshift in 5/6 when coasting
+
+# SPORT: more aggressive engine braking (earlier downshift on lift-off)
+ENGINE_BRAKE_DOWNSHIFT_FAC_SPORT = 3.0   # try 2.0–2.5 range
+
+# SPORT: hold gears longer (later upshifts)
+SPORT_UPSHIFT_FAC = 1.25                 # 25% higher speed before upshift
+
+# SPORT: “kickdown” feel – earlier downshifts at high throttle
+SPORT_KICKDOWN_THROTTLE = 80             # % throttle to trigger kickdown logic
+SPORT_KICKDOWN_FAC = 1.5                 # downshift earlier when flooring it
+
+# SPORT: RPM-based downshift threshold while coasting
+SPORT_HIGH_RPM_DOWNSHIFT = 4000          # rpm threshold for extra sport downshift
+
+SHIFT_TIME = 0.30      # 300ms shift duration
+
+# ============================
+# REALISTIC SHIFT POINT TABLES
+# ============================
+
+UPSHIFT = {
+    1: [12, 18, 30],
+    2: [22, 30, 45],
+    3: [32, 42, 65],
+    4: [45, 60, 85],
+    5: [58, 75, 105],
+}
+
+DOWNSHIFT = {
+    2: [7, 12, 20],
+    3: [12, 20, 35],
+    4: [20, 32, 50],
+    5: [32, 45, 70],
+    6: [45, 60, 85],
+}
+
+# Everything a calibration sweep may want to override.  Step functions take
+# one of these dicts; anything missing falls back to the constants above.
+DEFAULT_CALIBRATION = {
+    "A_MAX": A_MAX,
+    "B_MAX": B_MAX,
+    "DRAG": DRAG,
+    "GEAR_RATIOS": GEAR_RATIOS,
+    "FINAL_DRIVE": FINAL_DRIVE,
+    "TIRE_CIRC_M": TIRE_CIRC_M,
+    "ENGINE_BRAKE_DOWNSHIFT_FAC_DRIVE": ENGINE_BRAKE_DOWNSHIFT_FAC_DRIVE,
+    "DRIVE_HIGH_GEAR_EXTRA_FAC": DRIVE_HIGH_GEAR_EXTRA_FAC,
+    "ENGINE_BRAKE_DOWNSHIFT_FAC_SPORT": ENGINE_BRAKE_DOWNSHIFT_FAC_SPORT,
+    "SPORT_UPSHIFT_FAC": SPORT_UPSHIFT_FAC,
+    "SPORT_KICKDOWN_THROTTLE": SPORT_KICKDOWN_THROTTLE,
+    "SPORT_KICKDOWN_FAC": SPORT_KICKDOWN_FAC,
+    "UPSHIFT": UPSHIFT,
+    "DOWNSHIFT": DOWNSHIFT,
+}
+
+
+def make_calibration(**overrides):
+    """Return a full calibration dict with the given keys overridden."""
+    unknown = set(overrides) - set(DEFAULT_CALIBRATION)
+    if unknown:
+        raise KeyError(f"unknown calibration keys: {sorted(unknown)}")
+    cal = dict(DEFAULT_CALIBRATION)
+    cal.update(overrides)
+    return cal
+
+
+# ============================================
+# HELPERS
+# ============================================
+def clamp(x, lo, hi):
+    return max(lo, min(x, hi))
+
+
+# Torque converter slip curve (PATCH A)
+def torque_converter_slip(throttle):
+    """
+    Returns slip RPM based on throttle.
+    0%   → 0 rpm slip
+    10%  → ~200 rpm slip (light creep)
+    50%  → ~1500 rpm slip
+    100% → MAX_SLIP_RPM (e.g. 3000 rpm)
+    """
+    t = throttle / 100.0
+    if t <= 0.0:
+        return 0.0
+    if t < 0.10:
+        # small slip so the car can creep at low throttle
+        return t * 2000.0
+    # from 10% to 100% throttle, ramp up to MAX_SLIP_RPM
+    return 200.0 + (t - 0.10) * (MAX_SLIP_RPM - 200.0) / 0.90
+
+
+def get_band(throttle):
+    if throttle < 20:
+        return 0  # low load
+    if throttle < 50:
+        return 1  # medium
+    return 2      # high load
+
+
+# ============================================
+# ENGINE MODEL
+# ============================================
+class EngineState:
+    """Engine / vehicle state carried between engine ticks."""
+
+    __slots__ = ("rpm", "speed_kph", "cool", "mode", "rpm_from_speed", "target_rpm")
+
+    def __init__(self, rpm=900.0, speed_kph=0.0, cool=70.0):
+        self.rpm = rpm
+        self.speed_kph = speed_kph
+        self.cool = cool
+        # Diagnostics from the last step (what the debug print shows)
+        self.mode = "IDLE REGION"
+        self.rpm_from_speed = 0.0
+        self.target_rpm = rpm
+
+
+def engine_step(es, gear, throttle, brake, dt=ENGINE_DT, cal=DEFAULT_CALIBRATION):
+    """Advance the engine / vehicle model by one tick of length dt."""
+    speed_ms = es.speed_kph / 3.6
+
+    # -------------------------
+    # SPEED PHYSICS
+    # -------------------------
+    accel = (throttle / 100.0) * cal["A_MAX"]
+    accel -= (brake / 100.0) * cal["B_MAX"]
+    accel -= cal["DRAG"] * speed_ms
+    speed_ms = max(0.0, speed_ms + accel * dt)
+    speed_kph = speed_ms * 3.6
+
+    # -------------------------
+    # RPM FROM GEARING
+    # -------------------------
+    gear_ratio = cal["GEAR_RATIOS"].get(gear, 1.0)
+    overall_ratio = gear_ratio * cal["FINAL_DRIVE"]
+    wheel_rps = speed_ms / cal["TIRE_CIRC_M"]
+    rpm_from_speed = wheel_rps * 60.0 * overall_ratio
+
+    base_idle = BASE_IDLE_RPM
+
+    # -------------------------
+    # ENGINE / MODE LOGIC
+    # -------------------------
+    if speed_kph > 10.0:
+        # Normal driving / high-speed engine braking
+        if throttle <= 2:
+            mode = "ENGINE BRAKING"
+            # follow wheel speed directly
+            target_rpm = rpm_from_speed
+        else:
+            mode = "DRIVING"
+            # PATCH B: add torque converter slip so RPM can flare above wheel speed
+            slip = torque_converter_slip(throttle)
+            target_rpm = rpm_from_speed + slip
+            # never below idle
+            target_rpm = max(target_rpm, base_idle)
+
+    elif speed_kph > 3.0:
+        # Transitional low-speed region
+        if throttle <= 2:
+            mode = "LOW-SPEED BRAKING"
+            # Blend from wheel RPM to idle between 10 km/h and 3 km/h
+            blend = (speed_kph - 3.0) / 7.0   # 10 → 1.0, 3 → 0.0
+            blend = clamp(blend, 0.0, 1.0)
+            rpm_blend = base_idle + (rpm_from_speed - base_idle) * blend
+            # IMPORTANT: no max(...) here so it can actually drop to idle
+            target_rpm = rpm_blend
+        else:
+            mode = "DRIVING"
+            slip = torque_converter_slip(throttle)
+            target_rpm = rpm_from_speed + slip
+            target_rpm = max(target_rpm, base_idle)
+
+    else:
+        # Nearly stopped → just idle behaviour
+        mode = "IDLE REGION"
+        # tiny "rev" with throttle even while stationary
+        target_rpm = base_idle + throttle * 10.0
+
+    # -------------------------
+    # RPM DYNAMICS
+    # -------------------------
+    alpha = 0.35
+    rpm = es.rpm + alpha * (target_rpm - es.rpm)
+    rpm = clamp(rpm, 600.0, REDLINE_RPM)
+
+    # -------------------------
+    # COOLANT
+    # -------------------------
+    cool = es.cool
+    if throttle > 10:
+        cool += 0.03
+    elif speed_kph > 10:
+        cool += 0.01
+    else:
+        cool -= 0.02
+    cool = clamp(cool, 60.0, 110.0)
+
+    es.rpm = rpm
+    es.speed_kph = speed_kph
+    es.cool = cool
+    es.mode = mode
+    es.rpm_from_speed = rpm_from_speed
+    es.target_rpm = target_rpm
+    return es
+
+
+# ============================================
+# TCU MODEL
+# ============================================
+class TcuState:
+    """Gear / shift state carried between TCU ticks."""
+
+    __slots__ = ("gear", "target_gear", "shift_progress", "shift_timer")
+
+    def __init__(self, gear=1):
+        self.gear = gear
+        self.target_gear = gear
+        self.shift_progress = 0
+        self.shift_timer = 0.0
+
+
+def tcu_step(ts, speed, throttle, is_sport, dt=TCU_DT, cal=DEFAULT_CALIBRATION):
+    """
+    Advance the TCU by one tick.
+
+    Returns (gear, target_gear, c1, c2, shifting) for the GearboxData frame,
+    or None on the tick a new shift is requested (the TCU sends nothing then).
+    """
+    # If currently shifting:
+    if ts.shift_progress:
+        ts.shift_timer += dt
+
+        # Simple clutch ramps
+        c1 = max(0, 100 - (ts.shift_timer / SHIFT_TIME) * 100)
+        c2 = min(100, (ts.shift_timer / SHIFT_TIME) * 100)
+
+        if ts.shift_timer >= SHIFT_TIME:
+            # Finish shift
+            ts.gear = ts.target_gear
+            ts.shift_progress = 0
+            ts.shift_timer = 0.0
+            c1, c2 = 100, 0
+
+        return ts.gear, ts.target_gear, int(c1), int(c2), ts.shift_progress
+
+    gear = ts.gear
+    band = get_band(throttle)
+
+    # ==========================
+    # UPSHIFT
+    # ==========================
+    if gear < 6:
+        base_up = cal["UPSHIFT"][gear][band]
+
+        if is_sport:
+            # SPORT: hold gears longer -> upshift at higher speed
+            up_limit = base_up * cal["SPORT_UPSHIFT_FAC"]
+        else:
+            up_limit = base_up
+
+        # Block upshifts completely when we're in engine braking (off throttle)
+        if throttle > ENGINE_BRAKE_THROTTLE and speed > up_limit:
+            ts.target_gear = gear + 1
+            ts.shift_progress = 1
+            ts.shift_timer = 0.0
+            return None
+
+    # ==========================
+    # DOWNSHIFT
+    # ==========================
+    if gear > 1:
+        base_down = cal["DOWNSHIFT"][gear][band]
+
+        # LIFT-OFF / ENGINE BRAKING
+        if throttle <= ENGINE_BRAKE_THROTTLE:
+            if is_sport:
+                # SPORT: aggressive engine braking (earlier downshift)
+                limit = base_down * cal["ENGINE_BRAKE_DOWNSHIFT_FAC_SPORT"]
+            else:
+                # DRIVE: your 1.5 factor
+                limit = base_down * cal["ENGINE_BRAKE_DOWNSHIFT_FAC_DRIVE"]
+
+                # In Drive, a little extra aggression only in high gears
+                if gear >= 5:
+                    limit *= cal["DRIVE_HIGH_GEAR_EXTRA_FAC"]
+
+        # SOME THROTTLE
+        else:
+            if is_sport and throttle >= cal["SPORT_KICKDOWN_THROTTLE"]:
+                # SPORT kickdown: earlier downshift when you floor it
+                limit = base_down * cal["SPORT_KICKDOWN_FAC"]
+            else:
+                # Normal driving: original map
+                limit = base_down
+
+        if speed < limit:
+            ts.target_gear = gear - 1
+            ts.shift_progress = 1
+            ts.shift_timer = 0.0
+            return None
+
+    # NO SHIFT
+    return gear, gear, 100, 0, 0
+
+
+# ============================================
+# DRIVER PROFILES
+# ============================================
+# A driver profile is a callable t -> (throttle %, brake %, mode 'D'/'S').
+
+def launch_profile(throttle=100, mode="D"):
+    """Hold a fixed throttle from standstill (0-100 / top speed runs)."""
+    def driver(t):
+        return throttle, 0, mode
+    return driver
+
+
+def cycle_profile(steps, repeat=True):
+    """
+    Piecewise-constant profile from (duration_s, throttle, brake, mode) steps.
+    With repeat=True the sequence loops for as long as the run lasts.
+    """
+    steps = list(steps)
+    total = sum(s[0] for s in steps)
+
+    def driver(t):
+        if repeat and total > 0:
+            t = t % total
+        for duration, throttle, brake, mode in steps:
+            if t < duration:
+                return throttle, brake, mode
+            t -= duration
+        _, throttle, brake, mode = steps[-1]
+        return throttle, brake, mode
+    return driver
+
+
+# Mixed city / highway loop used by the CLI and as a default smoke test
+CITY_HIGHWAY = [
+    (10.0, 60, 0, "D"),
+    (20.0, 25, 0, "D"),
+    (8.0, 0, 40, "D"),
+    (4.0, 0, 0, "D"),
+    (25.0, 100, 0, "S"),
+    (30.0, 35, 0, "S"),
+    (12.0, 0, 0, "S"),
+    (10.0, 0, 70, "D"),
+    (5.0, 0, 0, "D"),
+]
+
+
+# ============================================
+# LOCK-STEP RUNNER
+# ============================================
+def simulate(driver, duration, cal=DEFAULT_CALIBRATION, record=False):
+    """
+    Run engine + TCU in lock-step for `duration` seconds of simulated time.
+
+    The TCU ticks every TCU_DT and the engine every ENGINE_DT, exactly like the
+    live nodes.  As on the bus, the TCU only sees what the last EngineData
+    frame carried (speed truncated to km/h, RPM in 4 rpm steps), and the
+    engine only sees the gear from the last GearboxData frame.  The driver
+    profile is sampled once per engine tick.
+
+    Returns a summary dict; with record=True it also contains "trace", a list
+    of (t, speed_kph, rpm, gear, target_gear, throttle, brake, mode) tuples
+    sampled at the engine rate.
+    """
+    es = EngineState()
+    ts = TcuState()
+
+    ticks_per_engine = int(round(ENGINE_DT / TCU_DT))
+    n_engine = int(duration / ENGINE_DT)
+
+    frame_gear = ts.gear
+    frame_speed = 0
+    shifts = 0
+    top_speed = 0.0
+    t_100 = None
+    trace = [] if record else None
+
+    for k in range(n_engine):
+        t = k * ENGINE_DT
+        throttle, brake, mode = driver(t)
+        is_sport = (mode == "S")
+
+        engine_step(es, frame_gear, throttle, brake, ENGINE_DT, cal)
+        frame_speed = clamp(int(es.speed_kph), 0, 255)
+
+        for _ in range(ticks_per_engine):
+            out = tcu_step(ts, frame_speed, throttle, is_sport, TCU_DT, cal)
+            if out is None:
+                shifts += 1
+            else:
+                frame_gear = out[0]
+
+        if es.speed_kph > top_speed:
+            top_speed = es.speed_kph
+        if t_100 is None and es.speed_kph >= 100.0:
+            t_100 = t + ENGINE_DT
+
+        if record:
+            trace.append((t + ENGINE_DT, es.speed_kph, es.rpm, ts.gear,
+                          ts.target_gear, throttle, brake, mode))
+
+    result = {
+        "duration": n_engine * ENGINE_DT,
+        "time_0_100": t_100,
+        "shift_count": shifts,
+        "top_speed": top_speed,
+        "final_speed": es.speed_kph,
+        "final_rpm": es.rpm,
+        "final_gear": ts.gear,
+        "final_coolant": es.cool,
+    }
+    if record:
+        result["trace"] = trace
+    return result
+
+
+def main():
+    duration = float(sys.argv[1]) if len(sys.argv) > 1 else 1800.0
+
+    print(f"Headless simulation: {duration:.0f} s of city/highway cycle")
+    start = time.perf_counter()
+    result = simulate(cycle_profile(CITY_HIGHWAY), duration)
+    elapsed = time.perf_counter() - start
+
+    t100 = result["time_0_100"]
+    print(f"  0-100 km/h : {t100:.1f} s" if t100 is not None else "  0-100 km/h : not reached")
+    print(f"  Shifts     : {result['shift_count']}")
+    print(f"  Top speed  : {result['top_speed']:.1f} km/h")
+    print(f"  Final      : {result['final_speed']:.1f} km/h, "
+          f"{result['final_rpm']:.0f} rpm, gear {result['final_gear']}")
+    print(f"Wall time {elapsed * 1000:.0f} ms "
+          f"({duration / elapsed:.0f}x real time)")
+
+
+if __name__ == "__main__":
+    main()
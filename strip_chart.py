@@ -0,0 +1,108 @@
+"""Live scrolling strip charts on a Tk canvas.
+
+Each StripChart:
+- Draws its frame, grid, scale labels and legend once; every signal is one
+  persistent canvas line item.
+- On refresh() takes the last `seconds` of each signal from a SignalStore
+  ring (signal_store.py), reduces it to at most a min/max pair per pixel
+  column in NumPy, and moves the existing line with canvas.coords().
+  Nothing is deleted or recreated, and a line whose samples and time
+  window did not change (e.g. the bus went quiet) is not touched at all.
+
+Used by gui_dashboard.py to watch shift transients while calibrating.
+"""
+
+import tkinter as tk
+
+import numpy as np
+
+BG = "#181c21"
+GRID = "#30363d"
+TEXT = "#8b949e"
+
+PAD_LEFT = 34       # room for the y labels
+PAD = 6
+
+
+def pixel_envelope(x, y, width):
+    """
+    Reduce points already in pixel space to first/min/max/last per pixel
+    column (in time order), so a line of N samples costs O(width) items.
+    """
+    if len(x) <= 4 * width:
+        return x, y
+    col = x.astype(np.int64)
+    starts = np.flatnonzero(np.diff(col, prepend=col[0] - 1))
+    stops = np.append(starts[1:], len(x))
+    keep = []
+    for a, b in zip(starts, stops):
+        seg = y[a:b]
+        keep.extend(sorted({a, a + int(seg.argmin()), a + int(seg.argmax()), b - 1}))
+    keep = np.asarray(keep)
+    return x[keep], y[keep]
+
+
+class StripChart:
+    """Scrolling chart of a few signals over the last `seconds`."""
+
+    def __init__(self, parent, title, signals, vmin, vmax, seconds=20.0,
+                 width=240, height=120, steps=False):
+        """signals: [(signal name, colour, legend text)]; steps draws a staircase."""
+        self.canvas = tk.Canvas(parent, width=width, height=height, bg=BG, highlightthickness=0)
+        self.width, self.height = width, height
+        self.vmin, self.vmax = vmin, vmax
+        self.seconds = seconds
+        self.steps = steps
+        self.signals = signals
+        self.x0, self.x1 = PAD_LEFT, width - PAD
+        self.y0, self.y1 = PAD + 12, height - PAD      # top, bottom of the plot area
+        self.last = {}          # signal -> (n, newest t, now) drawn last time
+        self.redraws = 0
+
+        c = self.canvas
+        c.create_rectangle(self.x0, self.y0, self.x1, self.y1, outline=GRID)
+        for frac in (0.25, 0.5, 0.75):
+            y = self.y1 - frac * (self.y1 - self.y0)
+            c.create_line(self.x0, y, self.x1, y, fill=GRID, dash=(2, 3))
+        for value in (vmin, (vmin + vmax) / 2, vmax):
+            c.create_text(self.x0 - 3, self._y(value), text=f"{value:g}", anchor="e",
+                          fill=TEXT, font=("Arial", 7))
+        c.create_text(self.x0, PAD, text=title, anchor="w", fill="white", font=("Arial", 8, "bold"))
+        x = self.x1
+        self.lines = {}
+        for name, colour, legend in reversed(signals):
+            item = c.create_text(x, PAD, text=legend, anchor="e", fill=colour, font=("Arial", 7))
+            x = c.bbox(item)[0] - 6
+            self.lines[name] = c.create_line(self.x0, self.y1, self.x0, self.y1,
+                                             fill=colour, width=1)
+
+    def grid(self, **kw):
+        self.canvas.grid(**kw)
+
+    def _y(self, v):
+        frac = (np.clip(v, self.vmin, self.vmax) - self.vmin) / (self.vmax - self.vmin)
+        return self.y1 - frac * (self.y1 - self.y0)
+
+    def refresh(self, store, now):
+        """Move each line to the last `seconds` before `now` (a frame timestamp)."""
+        t_start = now - self.seconds
+        scale = (self.x1 - self.x0) / self.seconds
+        for name, _, _ in self.signals:
+            t, v = store.history(name, t_start)
+            key = (len(t), t[-1] if len(t) else None, now)
+            if key == self.last.get(name):
+                continue
+            self.last[name] = key
+            if len(t) < 2:
+                self.canvas.coords(self.lines[name], self.x0, self.y1, self.x0, self.y1)
+                continue
+            x = self.x0 + (t - t_start) * scale
+            y = self._y(v)
+            if self.steps:
+                x = np.repeat(x, 2)[1:]
+                y = np.repeat(y, 2)[:-1]
+            x, y = pixel_envelope(x, y, self.x1 - self.x0)
+            flat = np.empty(2 * len(x))
+            flat[0::2], flat[1::2] = x, y
+            self.canvas.coords(self.lines[name], *np.round(flat, 1).tolist())
+            self.redraws += 1
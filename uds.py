@@ -0,0 +1,138 @@
+"""UDS (ISO 14229) definitions shared by the OBD ECU and the testers.
+
+This module provides:
+- Service IDs, sessions, negative response codes and NegativeResponse, the
+  exception a server handler raises to answer [0x7F, SID, NRC].
+- DIDS: data identifier -> (name, data bytes, decoder).  0xF2xx DIDs can be
+  streamed with ReadDataByPeriodicIdentifier (0x2A); their periodic
+  identifier is the low byte.  0xF4xx is Mode 01 PID xx (obd_pids.py).
+- parse_read_response(): splits a multi-DID 0x62 response into {did: data}.
+- Periodic data: one single CAN frame [periodic id, data...] on PERIODIC_ID
+  per scheduled DID, no ISO-TP and no request per sample.  The rates of
+  transmission modes slow / medium / fast are in RATES.
+"""
+
+import obd_pids
+
+# Services (positive response = SID + 0x40)
+SESSION_CONTROL = 0x10
+READ_DATA_BY_ID = 0x22
+READ_PERIODIC = 0x2A
+TESTER_PRESENT = 0x3E
+NEGATIVE_RESPONSE = 0x7F
+SUPPRESS_POSITIVE = 0x80        # sub-function bit: no positive response
+
+# Sessions
+DEFAULT_SESSION = 0x01
+EXTENDED_SESSION = 0x03
+
+# Negative response codes
+NRC_SERVICE_NOT_SUPPORTED = 0x11
+NRC_SUBFUNCTION_NOT_SUPPORTED = 0x12
+NRC_INCORRECT_LENGTH = 0x13
+NRC_CONDITIONS_NOT_CORRECT = 0x22
+NRC_REQUEST_OUT_OF_RANGE = 0x31
+NRC_RESPONSE_PENDING = 0x78
+NRC_NOT_IN_ACTIVE_SESSION = 0x7F
+
+NRC_NAMES = {
+    0x11: "serviceNotSupported",
+    0x12: "subFunctionNotSupported",
+    0x13: "incorrectMessageLengthOrInvalidFormat",
+    0x22: "conditionsNotCorrect",
+    0x31: "requestOutOfRange",
+    0x78: "responsePending",
+    0x7F: "serviceNotSupportedInActiveSession",
+}
+
+# Timing
+P2_MS = 50                      # server response time (reported by 0x50)
+P2_STAR_MS = 5000               # extended response time (0x78 pending)
+S3 = 5.0                        # s a non-default session survives without requests
+
+# ReadDataByPeriodicIdentifier
+PERIODIC_ID = 0x5E8             # CAN ID the engine streams periodic DIDs on
+PERIODIC_DID_BASE = 0xF200
+MODE_STOP = 0x04
+RATES = {0x01: 1.0, 0x02: 0.1, 0x03: 0.01}      # slow / medium / fast (s)
+RATE_NAMES = {"slow": 0x01, "medium": 0x02, "fast": 0x03}
+MAX_PERIODIC = 8                # scheduled periodic DIDs at once
+
+
+class NegativeResponse(Exception):
+    """Raised by a server handler (or returned to a client) for [0x7F, SID, NRC]."""
+
+    def __init__(self, nrc, sid=None):
+        self.nrc = nrc
+        self.sid = sid
+        super().__init__(f"NRC 0x{nrc:02X} {NRC_NAMES.get(nrc, '')}".rstrip())
+
+
+def _snapshot(d):
+    return {"rpm": (d[0] << 8) | d[1], "speed": d[2], "coolant": d[3] - 40, "gear": d[4]}
+
+
+DIDS = {
+    0xF186: ("ActiveSession", 1, lambda d: d[0]),
+    0xF190: ("VIN", 17, lambda d: bytes(d).decode("ascii", "replace")),
+    0xF201: ("RPM", 2, lambda d: (d[0] << 8) | d[1]),
+    0xF202: ("Speed", 1, lambda d: d[0]),
+    0xF203: ("Coolant", 1, lambda d: d[0] - 40),
+    0xF204: ("Gear", 1, lambda d: d[0]),
+    0xF205: ("EngineSnapshot", 5, _snapshot),
+}
+
+
+def did_length(did):
+    """Data bytes of a DID, or None if unknown."""
+    if did in DIDS:
+        return DIDS[did][1]
+    if did >> 8 == 0xF4 and did & 0xFF in obd_pids.PIDS:
+        return obd_pids.PIDS[did & 0xFF][1]
+    return None
+
+
+def decode_did(did, data):
+    if did in DIDS:
+        return DIDS[did][2](data)
+    return obd_pids.decode(did & 0xFF, data)
+
+
+def did_name(did):
+    if did in DIDS:
+        return DIDS[did][0]
+    return obd_pids.PIDS[did & 0xFF][0]
+
+
+def parse_read_response(payload):
+    """{did: data bytes} from a 0x62 response; stops at an unknown DID."""
+    if not payload or payload[0] != READ_DATA_BY_ID + 0x40:
+        return {}
+    out = {}
+    i = 1
+    while i + 2 <= len(payload):
+        did = (payload[i] << 8) | payload[i + 1]
+        n = did_length(did)
+        if n is None or i + 2 + n > len(payload):
+            break
+        out[did] = bytes(payload[i + 2:i + 2 + n])
+        i += 2 + n
+    return out
+
+
+def parse_periodic(data):
+    """(did, data bytes) from one periodic frame, or None."""
+    if not data:
+        return None
+    did = PERIODIC_DID_BASE | data[0]
+    n = did_length(did)
+    if n is None or len(data) < 1 + n:
+        return None
+    return did, bytes(data[1:1 + n])
+
+
+def check_response(payload, sid):
+    """Raise NegativeResponse for [0x7F, sid, NRC]; True for a positive response to sid."""
+    if len(payload) >= 3 and payload[0] == NEGATIVE_RESPONSE and payload[1] == sid:
+        raise NegativeResponse(payload[2], sid)
+    return bool(payload) and payload[0] == sid + 0x40